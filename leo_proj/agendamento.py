@@ -0,0 +1,105 @@
+"""Conflitos de horário e horários livres por profissional e sala.
+
+Um atendimento ocupa [data_atendimento, data_atendimento + duracao_minutos).
+Como a duração é limitada a DURACAO_MAXIMA, os atendimentos que podem
+cruzar um intervalo [inicio, fim) estão todos em
+data_atendimento ∈ (inicio - DURACAO_MAXIMA, fim): uma busca por faixa nos
+índices (profissional, data_atendimento) e (sala, data_atendimento), que lê
+só os atendimentos daquele dia, e não o histórico inteiro.
+"""
+from datetime import datetime, time, timedelta
+
+from models import db, Atendimento
+
+DURACAO_PADRAO = 60      # minutos
+DURACAO_MAXIMA = 480
+PASSO_HORARIOS = 30      # intervalo entre os horários sugeridos
+
+# Horário de funcionamento da clínica
+ABERTURA = time(8, 0)
+FECHAMENTO = time(19, 0)
+
+
+def validar_duracao(valor):
+    """Converte a duração do formulário; ValueError se estiver fora de 5..DURACAO_MAXIMA"""
+    if not str(valor or '').strip():
+        return DURACAO_PADRAO
+    try:
+        duracao = int(valor)
+    except ValueError:
+        raise ValueError('Duração inválida.')
+    if not 5 <= duracao <= DURACAO_MAXIMA:
+        raise ValueError(f'A duração deve ficar entre 5 e {DURACAO_MAXIMA} minutos.')
+    return duracao
+
+
+def fim_do_atendimento(atendimento):
+    return atendimento.data_atendimento + timedelta(minutes=atendimento.duracao_minutos or DURACAO_PADRAO)
+
+
+def ocupacoes(inicio, fim, profissional=None, sala=None, ignorar_id=None):
+    """Atendimentos (não cancelados) do profissional ou da sala que cruzam [inicio, fim)"""
+    filtros = []
+    if profissional:
+        filtros.append(Atendimento.profissional == profissional)
+    if sala:
+        filtros.append(Atendimento.sala == sala)
+    if not filtros:
+        return []
+
+    # Uma consulta por índice; o OR das duas colunas não usaria nenhum deles
+    encontrados = {}
+    for filtro in filtros:
+        consulta = Atendimento.query.options(db.joinedload(Atendimento.paciente)).filter(
+            filtro,
+            Atendimento.data_atendimento > inicio - timedelta(minutes=DURACAO_MAXIMA),
+            Atendimento.data_atendimento < fim,
+            Atendimento.status != 'cancelado'
+        )
+        if ignorar_id:
+            consulta = consulta.filter(Atendimento.id != ignorar_id)
+        for atendimento in consulta:
+            if fim_do_atendimento(atendimento) > inicio:
+                encontrados[atendimento.id] = atendimento
+    return sorted(encontrados.values(), key=lambda a: a.data_atendimento)
+
+
+def conflitos(inicio, duracao, profissional, sala=None, ignorar_id=None):
+    """Atendimentos que impedem marcar `profissional`/`sala` em [inicio, inicio + duracao)"""
+    return ocupacoes(inicio, inicio + timedelta(minutes=duracao), profissional, sala, ignorar_id)
+
+
+def conflitos_em_serie(inicios, duracao, profissional, sala=None):
+    """Atendimentos que cruzam alguma das sessões, com uma consulta por faixa para a série inteira"""
+    if not inicios:
+        return []
+    duracao = timedelta(minutes=duracao)
+    existentes = ocupacoes(min(inicios), max(inicios) + duracao, profissional, sala)
+    return [a for a in existentes
+            if any(a.data_atendimento < inicio + duracao and inicio < fim_do_atendimento(a) for inicio in inicios)]
+
+
+def horarios_livres(dia, profissional, duracao=DURACAO_PADRAO, sala=None, passo=PASSO_HORARIOS, agora=None):
+    """Inícios possíveis (datetime) no dia, a cada `passo` minutos, dentro do expediente"""
+    abertura = datetime.combine(dia, ABERTURA)
+    fechamento = datetime.combine(dia, FECHAMENTO)
+    ocupados = [(a.data_atendimento, fim_do_atendimento(a))
+                for a in ocupacoes(abertura, fechamento, profissional, sala)]
+
+    agora = agora or datetime.now()
+    livres = []
+    candidato = abertura
+    duracao = timedelta(minutes=duracao)
+    while candidato + duracao <= fechamento:
+        fim = candidato + duracao
+        if candidato >= agora and not any(inicio < fim and candidato < termino for inicio, termino in ocupados):
+            livres.append(candidato)
+        candidato += timedelta(minutes=passo)
+    return livres
+
+
+def descrever_conflito(atendimento):
+    paciente = atendimento.paciente.nome if atendimento.paciente else f'paciente {atendimento.paciente_id}'
+    local = f' na sala {atendimento.sala}' if atendimento.sala else ''
+    return (f"{atendimento.data_atendimento:%d/%m %H:%M}–{fim_do_atendimento(atendimento):%H:%M} "
+            f"{atendimento.profissional}{local} com {paciente}")
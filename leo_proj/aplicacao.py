@@ -0,0 +1,185 @@
+"""Criação do app: create_app() monta a configuração, o banco, as extensões e os blueprints.
+
+    flask --app aplicacao run                # ou app2:app / app:app, que chamam create_app()
+    GOOGLE_CALENDAR=0 flask --app aplicacao run
+
+Configuração por variáveis de ambiente (ou pelo dicionário `config`):
+
+    GOOGLE_CALENDAR=0         sobe sem a integração com o Google Calendar
+    GOOGLE_CALENDAR_API_URL   endereço alternativo da API (servidor local de testes)
+    CALENDAR_WORKER=0         não roda a fila do Calendar no processo web
+    GOOGLE_SIMULTANEOS        requisições que podem esperar o Google ao mesmo tempo
+    CACHE_REDIS_URL           cache de respostas compartilhado entre processos
+    CACHE_VERSAO_ARQUIVO      sem Redis, arquivo com a versão dos dados que invalida
+                              o cache de todos os processos (padrão instance/cache_versao)
+    PERFIL_LENTAS=1           perfil por amostragem das requisições lentas
+    DATABASE_URL              banco (padrão sqlite:///pacientes.db)
+
+Lembretes de atendimento (lembretes.py), ligados quando há algum canal:
+
+    LEMBRETES_SMTP_HOST       servidor SMTP (e LEMBRETES_SMTP_PORTA, _USUARIO,
+                              _SENHA, LEMBRETES_SMTP_TLS=1, LEMBRETES_REMETENTE)
+    LEMBRETES_WEBHOOK_URL     recebe os lembretes por POST em JSON
+    LEMBRETES_ANTECEDENCIA_HORAS  antes do atendimento (padrão 24)
+    LEMBRETES_SIMULTANEOS     lotes enviados ao mesmo tempo (padrão 4)
+    LEMBRETES_WORKER=0        não envia no processo web; use `flask worker-lembretes`
+
+Várias clínicas, cada uma com o seu banco (clinicas.py):
+
+    CLINICAS_ARQUIVO          catálogo JSON das clínicas; sem ele, uma clínica só
+    CLINICAS_CABECALHO        cabeçalho com a clínica, definido pelo proxy que
+                              autentica os usuários (obrigatório com CLINICAS_ARQUIVO)
+    CLINICAS_PASTA            onde ficam os bancos sem URI no catálogo
+                              (padrão instance/clinicas)
+    CLINICAS_MAXIMO_ENGINES   bancos abertos ao mesmo tempo (padrão 32)
+    CLINICAS_POOL             conexões mantidas por banco (padrão 4)
+    CLINICAS_SIMULTANEAS      clínicas consultadas em paralelo (padrão 8)
+    CLINICA                   clínica dos comandos `flask ...` que usam o banco
+"""
+import os
+
+from flask import Flask
+
+import busca
+import clinicas as bancos_clinicas
+import database
+import duplicados
+import lembretes as fila_lembretes
+import metricas
+import migracoes
+import rotas_atendimentos
+import rotas_clinicas
+import rotas_pacientes
+import rotas_relatorios
+from extensoes import cache, calendar, clinicas, lembretes, dados_alterados
+from models import db, CalendarJob
+
+
+def configuracao_padrao():
+    return {
+        'GOOGLE_CALENDAR': os.environ.get('GOOGLE_CALENDAR', '1') == '1',
+        'GOOGLE_CALENDAR_API_URL': os.environ.get('GOOGLE_CALENDAR_API_URL'),
+        'CALENDAR_WORKER': os.environ.get('CALENDAR_WORKER', '1') == '1',
+        'GOOGLE_SIMULTANEOS': int(os.environ.get('GOOGLE_SIMULTANEOS', 2)),
+        'CACHE_REDIS_URL': os.environ.get('CACHE_REDIS_URL'),
+        'CACHE_VERSAO_ARQUIVO': os.environ.get('CACHE_VERSAO_ARQUIVO'),
+        'PERFIL_LENTAS': os.environ.get('PERFIL_LENTAS') == '1',
+        'LEMBRETES_SMTP_HOST': os.environ.get('LEMBRETES_SMTP_HOST'),
+        'LEMBRETES_SMTP_PORTA': int(os.environ.get('LEMBRETES_SMTP_PORTA', 25)),
+        'LEMBRETES_SMTP_USUARIO': os.environ.get('LEMBRETES_SMTP_USUARIO'),
+        'LEMBRETES_SMTP_SENHA': os.environ.get('LEMBRETES_SMTP_SENHA'),
+        'LEMBRETES_SMTP_TLS': os.environ.get('LEMBRETES_SMTP_TLS') == '1',
+        'LEMBRETES_REMETENTE': os.environ.get('LEMBRETES_REMETENTE'),
+        'LEMBRETES_WEBHOOK_URL': os.environ.get('LEMBRETES_WEBHOOK_URL'),
+        'LEMBRETES_ANTECEDENCIA_HORAS': int(os.environ.get('LEMBRETES_ANTECEDENCIA_HORAS', 24)),
+        'LEMBRETES_SIMULTANEOS': int(os.environ.get('LEMBRETES_SIMULTANEOS', 4)),
+        'LEMBRETES_WORKER': os.environ.get('LEMBRETES_WORKER', '1') == '1',
+        'CLINICAS_ARQUIVO': os.environ.get('CLINICAS_ARQUIVO'),
+        'CLINICAS_CABECALHO': os.environ.get('CLINICAS_CABECALHO'),
+        'CLINICAS_PASTA': os.environ.get('CLINICAS_PASTA'),
+        'CLINICAS_MAXIMO_ENGINES': int(os.environ.get('CLINICAS_MAXIMO_ENGINES', 32)),
+        'CLINICAS_POOL': int(os.environ.get('CLINICAS_POOL', 4)),
+        'CLINICAS_SIMULTANEAS': int(os.environ.get('CLINICAS_SIMULTANEAS', 8)),
+        'CLINICA': os.environ.get('CLINICA'),
+        # Índice full-text de pacientes disponível (SQLite com FTS5), com um banco só;
+        # None até preparar_banco() ou a primeira busca (ver busca.fts_ativa)
+        'BUSCA_FTS': None,
+    }
+
+
+def preparar_banco():
+    """Cria as tabelas, aplica as migrações e prepara os índices de busca e de duplicados"""
+    # No banco da sessão, que com várias clínicas é o da clínica atual
+    db.metadata.create_all(db.session.get_bind())
+    migracoes.aplicar_migracoes(db.session)
+    bancos_clinicas.estado_do_banco()['BUSCA_FTS'] = busca.criar_indice(db.session)
+    duplicados.criar_indice(db.session)
+
+
+def preparar_bancos(app):
+    """preparar_banco() no banco único ou no de cada clínica"""
+    for slug in bancos_clinicas.slugs(app):
+        with bancos_clinicas.contexto(app, slug):
+            preparar_banco()
+
+
+def contar_filas():
+    """(jobs do Calendar por status, lembretes por status) do banco atual"""
+    jobs = dict(db.session.query(CalendarJob.status, db.func.count()).group_by(CalendarJob.status).all())
+    return jobs, fila_lembretes.resumo()
+
+
+def coletar_metricas():
+    """Métricas do app calculadas na hora do /metrics (cache, fila do Calendar e lembretes)"""
+    if clinicas.ativas:
+        # Um rótulo clinica="..." por banco, consultados em paralelo
+        por_banco = {slug: filas for slug, filas in clinicas.para_cada(contar_filas).items()
+                     if not isinstance(filas, Exception)}
+    else:
+        por_banco = {None: contar_filas()}
+    linhas = [
+        '# HELP crm_cache_respostas_total Consultas ao cache de respostas',
+        '# TYPE crm_cache_respostas_total counter',
+        f'crm_cache_respostas_total{{resultado="acerto"}} {cache.acertos}',
+        f'crm_cache_respostas_total{{resultado="falha"}} {cache.falhas}',
+        '# HELP crm_fila_calendar_jobs Jobs da fila do Google Calendar por status',
+        '# TYPE crm_fila_calendar_jobs gauge',
+    ]
+    for slug, (jobs, _) in por_banco.items():
+        rotulo = f',clinica="{slug}"' if slug else ''
+        for status, total in jobs.items():
+            linhas.append(f'crm_fila_calendar_jobs{{status="{status}"{rotulo}}} {total}')
+    linhas += [
+        '# HELP crm_lembretes Lembretes de atendimento por status',
+        '# TYPE crm_lembretes gauge',
+    ]
+    for slug, (_, lembretes_por_status) in por_banco.items():
+        rotulo = f',clinica="{slug}"' if slug else ''
+        for status, total in lembretes_por_status.items():
+            linhas.append(f'crm_lembretes{{status="{status}"{rotulo}}} {total}')
+    return linhas
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', 'sua_chave_secreta_muito_forte_aqui')
+    app.config.update(configuracao_padrao())
+    app.config.update(config or {})
+
+    # Banco SQLite (DATABASE_URL substitui o arquivo padrão)
+    database.configurar(app)
+    db.init_app(app)
+    with app.app_context():
+        database.registrar_pragmas(db.engine)
+        metricas.instrumentar_engine(db.engine)
+
+    # Tempo das requisições, consultas por requisição e /metrics
+    metricas.instrumentar_app(app, perfil_lentas=app.config['PERFIL_LENTAS'])
+    if coletar_metricas not in metricas.REGISTRO.coletores:
+        metricas.REGISTRO.coletores.append(coletar_metricas)
+
+    # Um banco por clínica (CLINICAS_ARQUIVO); sem ele, nada muda
+    clinicas.init_app(app)
+    if clinicas.ativas:
+        app.register_blueprint(rotas_clinicas.bp)
+
+    cache.init_app(app)
+    app.register_blueprint(rotas_pacientes.bp)
+    app.register_blueprint(rotas_atendimentos.bp)
+    app.register_blueprint(rotas_relatorios.bp)
+    if app.config['GOOGLE_CALENDAR']:
+        calendar.init_app(app)
+    lembretes.init_app(app)
+
+    @app.context_processor
+    def integracoes():
+        return {'calendar_ativo': calendar.ativa, 'lembretes_ativos': lembretes.ativos,
+                'clinicas_ativas': clinicas.ativas, 'clinica_atual': clinicas.nome(bancos_clinicas.atual())}
+
+    @app.before_first_request
+    def create_tables():
+        preparar_bancos(app)
+        calendar.iniciar_worker(ao_processar=dados_alterados)
+        lembretes.iniciar_worker()
+
+    return app
@@ -0,0 +1,6 @@
+"""Benchmarks do sistema de pacientes.
+
+Execute a partir da pasta leo_proj, por exemplo:
+
+    python -m benchmarks.bench_busca --pacientes 100000
+"""
@@ -0,0 +1,203 @@
+"""Carga nas rotas principais do app com dados sintéticos e Google Calendar falso.
+
+Gera um banco com `--pacientes` pacientes e `--atendimentos` atendimentos por
+paciente, sobe o Google Calendar falso (benchmarks.fake_calendar) e mede as
+rotas /, /buscar, /api/pacientes, /paciente/<id> e /novo_atendimento:
+
+    python -m benchmarks.bench_app --pacientes 10000 --modo cliente --requisicoes 2000
+    python -m benchmarks.bench_app --pacientes 100000 --modo http --concorrencia 16 --segundos 30
+
+No fim, mede também o /sync_calendar com os atendimentos pendentes. Cada
+execução é acrescentada a benchmarks/resultados.jsonl com o commit atual;
+`--comparar` mostra as execuções lado a lado.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+from benchmarks import carga
+from benchmarks.dados import popular_banco
+from benchmarks.fake_calendar import iniciar_servidor
+
+ARQUIVO_RESULTADOS = os.path.join(os.path.dirname(__file__), 'resultados.jsonl')
+
+
+def commit_atual():
+    """Hash curto do commit, com '+' se houver alterações não commitadas"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        alterado = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                  capture_output=True, text=True).stdout.strip()
+        return commit + ('+' if alterado else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+
+def preparar_banco(caminho, pacientes, atendimentos):
+    if os.path.exists(caminho):
+        print(f'Usando o banco existente {caminho}')
+        return
+    print(f'Gerando {pacientes} pacientes e {pacientes * atendimentos} atendimentos...')
+    inicio = time.perf_counter()
+    engine = create_engine(f'sqlite:///{caminho}')
+    popular_banco(engine, pacientes, atendimentos)
+    engine.dispose()
+    print(f'Dados gerados em {time.perf_counter() - inicio:.1f}s')
+
+
+def carregar_app(caminho, url_calendar):
+    """Cria o app apontando para o banco e o Calendar do benchmark"""
+    from aplicacao import create_app
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}',
+        'GOOGLE_CALENDAR_API_URL': url_calendar,
+    })
+
+    # O primeiro request cria índices, migrações e o índice de busca
+    inicio = time.perf_counter()
+    app.test_client().get('/api/pacientes')
+    print(f'Preparação do app (migrações e índice de busca) em {time.perf_counter() - inicio:.1f}s')
+    return app
+
+
+def subir_servidor(app):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class HandlerSilencioso(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server('127.0.0.1', 0, app, threaded=True, request_handler=HandlerSilencioso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://127.0.0.1:{servidor.server_port}'
+
+
+def medir_sync(app, calendario, limite=300):
+    """Tempo até o /sync_calendar esvaziar a fila e quantas requisições HTTP foram feitas ao Google"""
+    import outbox
+    from models import Atendimento
+
+    cliente = app.test_client()
+    antes = calendario.requisicoes_batch
+    with app.app_context():
+        pendentes = outbox.resumo_fila()['pendentes']
+    inicio = time.perf_counter()
+    cliente.get('/sync_calendar')
+    resposta = cliente.get('/api/sync_calendar/progresso').json
+    while resposta['em_andamento'] and time.perf_counter() - inicio < limite:
+        time.sleep(0.05)
+        resposta = cliente.get('/api/sync_calendar/progresso').json
+    duracao = time.perf_counter() - inicio
+    with app.app_context():
+        enviados = Atendimento.query.filter(Atendimento.evento_calendar_id.isnot(None)).count()
+    return {
+        'segundos': round(duracao, 3),
+        'eventos': enviados,
+        'pendentes_antes': pendentes,
+        'requisicoes_batch': calendario.requisicoes_batch - antes,
+    }
+
+
+def imprimir(resumo):
+    print(f"{'rota':18s} {'n':>7s} {'req/s':>8s} {'erros':>6s} {'p50':>8s} {'p90':>8s} {'p99':>8s} {'max':>8s}")
+    for rota, linha in resumo.items():
+        print(f"{rota:18s} {linha['n']:7d} {linha['req_s']:8.1f} {linha['erros']:6d} "
+              f"{linha['p50']:8.2f} {linha['p90']:8.2f} {linha['p99']:8.2f} {linha['max']:8.2f}")
+
+
+def comparar(arquivo):
+    """Uma linha por execução: commit, parâmetros e os números do total"""
+    if not os.path.exists(arquivo):
+        raise SystemExit(f'Nenhum resultado em {arquivo}')
+    print(f"{'data':16s} {'commit':10s} {'modo':8s} {'pacientes':>9s} {'req/s':>8s} "
+          f"{'p50':>8s} {'p99':>8s} {'sync (s)':>8s}")
+    with open(arquivo) as entrada:
+        for linha in entrada:
+            r = json.loads(linha)
+            total = r['rotas']['total']
+            sync = r.get('sync') or {}
+            print(f"{r['data'][:16]:16s} {r['commit']:10s} {r['modo']:8s} {r['pacientes']:9d} "
+                  f"{total['req_s']:8.1f} {total['p50']:8.2f} {total['p99']:8.2f} {sync.get('segundos', 0):8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pacientes', type=int, default=10000)
+    parser.add_argument('--atendimentos', type=int, default=5, help='atendimentos por paciente')
+    parser.add_argument('--banco', help='arquivo do banco (reaproveitado se já existir)')
+    parser.add_argument('--modo', choices=('cliente', 'http'), default='cliente')
+    parser.add_argument('--requisicoes', type=int, default=2000, help='total, no modo cliente')
+    parser.add_argument('--concorrencia', type=int, default=8, help='threads, no modo http')
+    parser.add_argument('--segundos', type=float, default=20, help='duração, no modo http')
+    parser.add_argument('--atraso-calendar', type=float, default=0.05, help='latência do Google falso (s)')
+    parser.add_argument('--agendar-google', action='store_true', help='novos atendimentos vão para a fila do Calendar')
+    parser.add_argument('--sem-cache', action='store_true', help='desliga o cache de respostas')
+    parser.add_argument('--sem-sync', action='store_true', help='não mede o /sync_calendar')
+    parser.add_argument('--saida', default=ARQUIVO_RESULTADOS)
+    parser.add_argument('--comparar', action='store_true', help='só mostra os resultados gravados')
+    args = parser.parse_args()
+
+    if args.comparar:
+        return comparar(args.saida)
+
+    pasta = tempfile.mkdtemp(prefix='bench_app_')
+    caminho = os.path.abspath(args.banco or os.path.join(pasta, 'bench.db'))
+    preparar_banco(caminho, args.pacientes, args.atendimentos)
+
+    servidor_calendar, calendario, url_calendar = iniciar_servidor(atraso=args.atraso_calendar)
+    app = carregar_app(caminho, url_calendar)
+    if args.sem_cache:
+        from cache_respostas import BackendLRU
+        from extensoes import cache
+        cache.backend = BackendLRU(maximo=0)
+
+    cenario = carga.Cenario(args.pacientes, agendar_google=args.agendar_google)
+    if args.modo == 'cliente':
+        resultado = carga.executar_test_client(app, cenario, args.requisicoes)
+    else:
+        servidor, url = subir_servidor(app)
+        resultado = carga.executar_http(url, cenario, args.concorrencia, args.segundos)
+        servidor.shutdown()
+
+    resumo = resultado.resumo()
+    imprimir(resumo)
+
+    sync = None
+    if not args.sem_sync:
+        sync = medir_sync(app, calendario)
+        print(f"/sync_calendar (até esvaziar a fila): {sync['eventos']} eventos em {sync['segundos']}s "
+              f"({sync['requisicoes_batch']} requisições de batch)")
+    servidor_calendar.shutdown()
+
+    registro = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'python': sys.version.split()[0],
+        'modo': args.modo,
+        'pacientes': args.pacientes,
+        'atendimentos_por_paciente': args.atendimentos,
+        'concorrencia': args.concorrencia if args.modo == 'http' else 1,
+        'cache': not args.sem_cache,
+        'agendar_google': args.agendar_google,
+        'rotas': resumo,
+        'sync': sync,
+    }
+    with open(args.saida, 'a') as saida:
+        saida.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    print(f'Resultado acrescentado a {args.saida}')
+    shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
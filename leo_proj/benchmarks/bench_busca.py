@@ -0,0 +1,133 @@
+"""Compara a busca antiga (LIKE '%q%') com o índice FTS5 da busca de pacientes.
+
+    python -m benchmarks.bench_busca --pacientes 100000 --consultas 500
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import busca
+from benchmarks.dados import gerar_pacientes, SOBRENOMES, PRIMEIROS_NOMES
+
+DDL_PACIENTE = """
+CREATE TABLE paciente (
+    id INTEGER NOT NULL PRIMARY KEY,
+    nome VARCHAR(100) NOT NULL,
+    telefone VARCHAR(20) NOT NULL,
+    email VARCHAR(100),
+    endereco TEXT,
+    observacoes_medicas TEXT,
+    data_cadastro DATETIME
+)
+"""
+
+
+def popular(session, quantidade):
+    session.execute(text(DDL_PACIENTE))
+    lote = []
+    for paciente in gerar_pacientes(quantidade):
+        lote.append(paciente)
+        if len(lote) == 10000:
+            session.execute(text(
+                "INSERT INTO paciente (nome, telefone, email, endereco, observacoes_medicas, data_cadastro) "
+                "VALUES (:nome, :telefone, :email, :endereco, :observacoes_medicas, :data_cadastro)"), lote)
+            lote = []
+    if lote:
+        session.execute(text(
+            "INSERT INTO paciente (nome, telefone, email, endereco, observacoes_medicas, data_cadastro) "
+            "VALUES (:nome, :telefone, :email, :endereco, :observacoes_medicas, :data_cadastro)"), lote)
+    session.commit()
+
+
+def gerar_consultas(session, quantidade, semente=7):
+    """Consultas como as digitadas na busca ao vivo: prefixos de nomes, telefones, emails e erros de digitação"""
+    rng = random.Random(semente)
+    amostra = session.execute(
+        text("SELECT telefone, email FROM paciente WHERE email IS NOT NULL ORDER BY RANDOM() LIMIT :n"),
+        {'n': quantidade}
+    ).fetchall()
+    consultas = []
+    for i in range(quantidade):
+        telefone, email = amostra[i % len(amostra)]
+        tipo = i % 6
+        if tipo == 0:
+            nome = rng.choice(PRIMEIROS_NOMES)
+            consultas.append(nome[:rng.randint(2, len(nome))])
+        elif tipo == 1:
+            consultas.append(f'{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)[:4]}')
+        elif tipo == 2:
+            consultas.append(rng.choice(SOBRENOMES).lower())
+        elif tipo == 3:
+            consultas.append(busca.normalizar_telefone(telefone)[-9:-3])
+        elif tipo == 4:
+            consultas.append(email.split('@')[0])
+        else:
+            consultas.append(rng.choice(SOBRENOMES)[::-1].lower())
+    return consultas
+
+
+def busca_like(session, consulta):
+    padrao = f'%{consulta}%'
+    return session.execute(
+        text("SELECT id, nome, telefone, email FROM paciente "
+             "WHERE nome LIKE :p OR telefone LIKE :p OR email LIKE :p LIMIT 10"),
+        {'p': padrao}
+    ).fetchall()
+
+
+def busca_fts(session, consulta):
+    ids = busca.buscar_ids(session, consulta, limite=10)
+    if not ids:
+        return []
+    marcadores = ', '.join(str(int(i)) for i in ids)
+    return session.execute(
+        text(f"SELECT id, nome, telefone, email FROM paciente WHERE id IN ({marcadores})")
+    ).fetchall()
+
+
+def medir(funcao, session, consultas):
+    tempos = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        funcao(session, consulta)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        'p50': statistics.median(tempos),
+        'p99': tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))],
+        'max': tempos[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pacientes', type=int, default=100000)
+    parser.add_argument('--consultas', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = create_engine(f"sqlite:///{os.path.join(pasta, 'bench.db')}")
+        with Session(engine) as session:
+            print(f'Gerando {args.pacientes} pacientes...')
+            popular(session, args.pacientes)
+
+            inicio = time.perf_counter()
+            if not busca.criar_indice(session):
+                raise SystemExit('SQLite sem suporte a FTS5')
+            print(f'Índice criado em {time.perf_counter() - inicio:.1f}s')
+
+            consultas = gerar_consultas(session, args.consultas)
+            for nome, funcao in (('LIKE', busca_like), ('FTS5', busca_fts)):
+                r = medir(funcao, session, consultas)
+                print(f"{nome:5} p50={r['p50']:.2f}ms p99={r['p99']:.2f}ms max={r['max']:.2f}ms")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""Várias clínicas: um banco por clínica (clinicas.py) contra todas no mesmo arquivo.
+
+    python -m benchmarks.bench_clinicas --clinicas 16 --atendimentos 50000
+
+Monta um banco por clínica (cópias de um banco com pacientes, atendimentos
+e as migrações aplicadas) e mede:
+
+    gravação   processos gravando atendimentos (com o job do Calendar e o
+               lembrete, como o formulário de atendimento), todos no mesmo
+               arquivo ou cada um no banco da sua clínica
+    resumo     o resumo de `flask resumo-clinicas` e uma varredura dos atendimentos
+               em todas as clínicas, uma por vez e com para_cada()
+    engines    requisições espalhadas por muitas clínicas, com o LRU de
+               engines (CLINICAS_MAXIMO_ENGINES) e sem limite: conexões
+               abertas e tempo de uma consulta quando o engine já existe
+               ou precisa ser criado
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.dados import popular_banco
+
+GRAVACOES = (
+    text("INSERT INTO atendimento (paciente_id, data_atendimento, profissional, tratamento, status, duracao_minutos) "
+         "VALUES (:paciente, :data, 'Dra. Teste', 'Consulta', 'agendado', 60)"),
+    text("INSERT INTO calendar_job (atendimento_id, status, tentativas, proxima_tentativa, criado_em) "
+         "VALUES (last_insert_rowid(), 'pendente', 0, :agora, :agora)"),
+    text("INSERT INTO lembrete (atendimento_id, canal, enviar_em, antecedencia_minutos, status, tentativas) "
+         "SELECT MAX(id), 'webhook', :agora, 1440, 'pendente', 0 FROM atendimento"),
+)
+
+VARREDURA = text("SELECT profissional, COUNT(*), SUM(duracao_minutos) FROM atendimento "
+                 "WHERE status != 'cancelado' GROUP BY profissional")
+
+
+def criar_app(pasta, catalogo, **config):
+    from aplicacao import create_app
+
+    arquivo = os.path.join(pasta, f'clinicas-{len(catalogo)}.json')
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump(catalogo, f)
+    return create_app(dict({'CLINICAS_ARQUIVO': arquivo, 'CLINICAS_CABECALHO': 'X-Clinica', 'CLINICAS_PASTA': pasta,
+                            'GOOGLE_CALENDAR': False, 'LEMBRETES_WORKER': False}, **config))
+
+
+def gravar(slug, fim, pacientes, semente):
+    """Grava atendimentos no banco da clínica até `fim` (time.time()); retorna as latências"""
+    from extensoes import clinicas
+    from models import db
+
+    rng = random.Random(semente)
+    latencias = []
+    with clinicas.usar(slug):
+        while time.time() < fim:
+            agora = datetime.now()
+            parametros = {'paciente': rng.randint(1, pacientes), 'agora': agora,
+                          'data': agora + timedelta(days=rng.randint(1, 60))}
+            inicio = time.perf_counter()
+            for gravacao in GRAVACOES:
+                db.session.execute(gravacao, parametros)
+            db.session.commit()
+            latencias.append(time.perf_counter() - inicio)
+    return latencias
+
+
+def medir_gravacao(destinos, segundos, pacientes):
+    """Um processo por destino (como os workers do gunicorn), gravando por `segundos`.
+
+    Os processos são cópias (fork) deste, com o app já criado.
+
+    Retorna (gravações/s, latências ordenadas).
+    """
+    contexto = multiprocessing.get_context('fork')
+    fim = time.time() + 1 + segundos
+    with contexto.Pool(len(destinos)) as processos:
+        resultados = processos.starmap(gravar, [(slug, fim, pacientes, i) for i, slug in enumerate(destinos)])
+    latencias = sorted(l for resultado in resultados for l in resultado)
+    return len(latencias) / segundos, latencias
+
+
+def cronometrar(funcao, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+def conexoes_abertas(clinicas):
+    return sum(engine.pool.checkedin() + engine.pool.checkedout() for engine, _ in clinicas._engines.values())
+
+
+def medir_engines(pasta, modelo, quantidade, maximo, requisicoes):
+    """Requisições em clínicas sorteadas (algumas bem mais ativas que outras)"""
+    from extensoes import clinicas
+    from models import db
+
+    catalogo = {}
+    for i in range(quantidade):
+        caminho = os.path.join(pasta, f'lru{i}.db')
+        if not os.path.exists(caminho):
+            shutil.copy(modelo, caminho)
+        catalogo[f'lru{i}'] = {'nome': f'Clínica {i}', 'banco': f'sqlite:///{caminho}'}
+    app = criar_app(pasta, catalogo, CLINICAS_MAXIMO_ENGINES=maximo)
+    rng = random.Random(5)
+    pesos = [1 / (i + 1) for i in range(quantidade)]
+    tempos = {'existente': [], 'novo': []}
+    pico = 0
+    for slug in rng.choices(list(catalogo), weights=pesos, k=requisicoes):
+        novo = slug not in clinicas._engines
+        inicio = time.perf_counter()
+        with clinicas.usar(slug):
+            db.session.execute(text('SELECT COUNT(*) FROM paciente')).scalar()
+        tempos['novo' if novo else 'existente'].append(time.perf_counter() - inicio)
+        pico = max(pico, conexoes_abertas(clinicas))
+    abertas = conexoes_abertas(clinicas)
+    clinicas.fechar_engines()
+    return tempos, pico, abertas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clinicas', type=int, default=16)
+    parser.add_argument('--atendimentos', type=int, default=50000, help='por clínica')
+    parser.add_argument('--por-paciente', type=int, default=5)
+    parser.add_argument('--processos', type=int, default=8, help='processos gravando')
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--simultaneas', type=int, default=8, help='clínicas consultadas ao mesmo tempo')
+    parser.add_argument('--lru-clinicas', type=int, default=200)
+    parser.add_argument('--lru-maximo', type=int, default=32)
+    parser.add_argument('--requisicoes', type=int, default=5000)
+    args = parser.parse_args()
+
+    pacientes = max(1, args.atendimentos // args.por_paciente)
+    pasta = tempfile.mkdtemp(prefix='bench_clinicas_')
+    modelo = os.path.join(pasta, 'modelo.db')
+
+    inicio = time.perf_counter()
+    engine = create_engine(f'sqlite:///{modelo}')
+    popular_banco(engine, pacientes, args.por_paciente)
+    engine.dispose()
+    app = criar_app(pasta, {'modelo': {'nome': 'Modelo', 'banco': f'sqlite:///{modelo}'}})
+    from aplicacao import preparar_bancos
+    from extensoes import clinicas
+    preparar_bancos(app)
+    clinicas.fechar_engines()
+    print(f'banco modelo: {pacientes} pacientes e {pacientes * args.por_paciente} atendimentos, '
+          f'{os.path.getsize(modelo) / 2 ** 20:.0f}MB em {time.perf_counter() - inicio:.1f}s')
+
+    catalogo = {}
+    for i in range(args.clinicas):
+        caminho = os.path.join(pasta, f'clinica{i}.db')
+        shutil.copy(modelo, caminho)
+        catalogo[f'clinica{i}'] = {'nome': f'Clínica {i}', 'banco': f'sqlite:///{caminho}'}
+    app = criar_app(pasta, catalogo, CLINICAS_SIMULTANEAS=args.simultaneas,
+                    CLINICAS_POOL=max(4, args.processos))
+    slugs = list(catalogo)
+
+    print(f'gravação, {args.processos} processos por {args.segundos:.0f}s:')
+    for nome, destinos in (('um arquivo', [slugs[0]] * args.processos),
+                           ('um por clínica', [slugs[i % len(slugs)] for i in range(args.processos)])):
+        por_segundo, latencias = medir_gravacao(destinos, args.segundos, pacientes)
+        print(f'  {nome:16s} {por_segundo:7.0f} gravações/s, p50 {statistics.median(latencias) * 1000:6.2f}ms, '
+              f'p99 {latencias[int(len(latencias) * 0.99) - 1] * 1000:7.2f}ms')
+
+    from models import db
+    from rotas_clinicas import resumo_da_clinica
+
+    def varredura():
+        return db.session.execute(VARREDURA).all()
+
+    def uma_por_vez(funcao):
+        resultados = {}
+        for slug in slugs:
+            with clinicas.usar(slug):
+                resultados[slug] = funcao()
+        return resultados
+
+    print(f'{len(slugs)} clínicas, {args.simultaneas} simultâneas no para_cada():')
+    for nome, funcao in (('resumo (admin)', resumo_da_clinica), ('varredura', varredura)):
+        sequencial, esperado = cronometrar(lambda: uma_por_vez(funcao))
+        paralelo, obtido = cronometrar(lambda: clinicas.para_cada(funcao))
+        print(f'  {nome:16s} uma por vez {sequencial * 1000:7.1f}ms, para_cada {paralelo * 1000:7.1f}ms '
+              f'({sequencial / paralelo:.1f}x; {"iguais" if obtido == esperado else "DIFERENTES"})')
+    clinicas.fechar_engines()
+
+    print(f'engines: {args.requisicoes} requisições em {args.lru_clinicas} clínicas:')
+    for nome, maximo in ((f'LRU de {args.lru_maximo}', args.lru_maximo), ('sem limite', args.lru_clinicas)):
+        tempos, pico, abertas = medir_engines(pasta, modelo, args.lru_clinicas, maximo, args.requisicoes)
+        novos = tempos['novo']
+        print(f"  {nome:16s} {len(novos):5d} engines criados, conexões abertas {abertas} (pico {pico}); "
+              f"consulta com engine existente {statistics.median(tempos['existente']) * 1000:.2f}ms, "
+              f"criando {statistics.median(novos) * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Leituras e gravações simultâneas no SQLite, com e sem a configuração de database.py.
+
+Várias threads disputam o mesmo arquivo: a maioria lê o histórico de um
+paciente e as demais gravam atendimentos, como na recepção da clínica.
+
+    python -m benchmarks.bench_concorrencia --threads 16 --segundos 10
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import database
+from benchmarks.dados import gerar_pacientes
+from models import db
+
+LEITURA = text(
+    "SELECT id, data_atendimento, tratamento FROM atendimento "
+    "WHERE paciente_id = :paciente ORDER BY data_atendimento DESC LIMIT 20"
+)
+GRAVACAO = text(
+    "INSERT INTO atendimento (paciente_id, data_atendimento, profissional, tratamento, status) "
+    "VALUES (:paciente, :data, 'Dra. Teste', 'Consulta', 'agendado')"
+)
+
+
+def criar_engine(caminho, ajustado):
+    url = f'sqlite:///{caminho}'
+    if not ajustado:
+        return create_engine(url)
+    engine = create_engine(url, **database.opcoes_engine())
+    database.registrar_pragmas(engine)
+    return engine
+
+
+def popular(caminho, pacientes):
+    engine = create_engine(f'sqlite:///{caminho}')
+    db.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        conexao.execute(text(
+            "INSERT INTO paciente (nome, telefone, email, endereco, observacoes_medicas, data_cadastro) "
+            "VALUES (:nome, :telefone, :email, :endereco, :observacoes_medicas, :data_cadastro)"),
+            list(gerar_pacientes(pacientes)))
+        conexao.execute(text(
+            "CREATE INDEX ix_atendimento_paciente_data ON atendimento (paciente_id, data_atendimento)"))
+    engine.dispose()
+
+
+def executar(engine, threads, segundos, pacientes, proporcao_escrita):
+    fim = time.perf_counter() + segundos
+    tempos = {'leitura': [], 'gravacao': []}
+    erros = []
+    lock = threading.Lock()
+
+    def trabalhador(semente):
+        rng = random.Random(semente)
+        locais = {'leitura': [], 'gravacao': []}
+        falhas = []
+        while time.perf_counter() < fim:
+            paciente = rng.randint(1, pacientes)
+            tipo = 'gravacao' if rng.random() < proporcao_escrita else 'leitura'
+            inicio = time.perf_counter()
+            try:
+                if tipo == 'gravacao':
+                    with engine.begin() as conexao:
+                        conexao.execute(GRAVACAO, {
+                            'paciente': paciente,
+                            'data': datetime(2025, 1, 1) + timedelta(minutes=rng.randint(0, 500000)),
+                        })
+                else:
+                    with engine.connect() as conexao:
+                        conexao.execute(LEITURA, {'paciente': paciente}).fetchall()
+            except OperationalError as e:
+                falhas.append(str(e.orig))
+                continue
+            locais[tipo].append((time.perf_counter() - inicio) * 1000)
+        with lock:
+            for chave in tempos:
+                tempos[chave].extend(locais[chave])
+            erros.extend(falhas)
+
+    lista = [threading.Thread(target=trabalhador, args=(i,)) for i in range(threads)]
+    for thread in lista:
+        thread.start()
+    for thread in lista:
+        thread.join()
+    return tempos, erros
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    return statistics.quantiles(valores, n=100)[p - 1] if len(valores) > 1 else valores[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--pacientes', type=int, default=5000)
+    parser.add_argument('--escrita', type=float, default=0.2, help='proporção de gravações (0 a 1)')
+    args = parser.parse_args()
+
+    for nome, ajustado in (('padrão', False), ('ajustado (WAL + pragmas + pool)', True)):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'bench.db')
+            popular(caminho, args.pacientes)
+            engine = criar_engine(caminho, ajustado)
+            tempos, erros = executar(engine, args.threads, args.segundos, args.pacientes, args.escrita)
+            engine.dispose()
+
+        total = len(tempos['leitura']) + len(tempos['gravacao'])
+        print(f'{nome}: {total / args.segundos:.0f} op/s, {len(erros)} erros '
+              f'({sum("locked" in e for e in erros)} "database is locked")')
+        for tipo, valores in tempos.items():
+            print(f'  {tipo:8s} n={len(valores):6d}  p50={percentil(valores, 50):7.2f} ms  '
+                  f'p99={percentil(valores, 99):7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Detecção de duplicados: chaves de bloqueio (duplicados.py) contra a comparação com a tabela inteira.
+
+    python -m benchmarks.bench_duplicados --pacientes 100000 --duplicados 3000
+
+Gera pacientes sintéticos e recadastra alguns com variações comuns na
+recepção (sem acento, sem o nome do meio, z/s, telefone em outro formato,
+sem email). Mede:
+
+    chaves       criação das chaves de todos os pacientes
+    candidatos   consulta do cadastro (duplicados.candidatos) contra comparar
+                 com todos os pacientes, e quantos recadastros ela mostra
+    lote         duplicados.encontrar_grupos contra a estimativa das n²/2
+                 comparações, com precisão e revocação dos grupos
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.dados import gerar_pacientes, inserir_em_lotes
+
+TROCAS_GRAFIA = (('z', 's'), ('s', 'z'), ('ph', 'f'), ('y', 'i'), ('ss', 's'), ('th', 't'))
+
+
+def variar_nome(rng, nome):
+    import busca
+
+    partes = nome.split()
+    sorteio = rng.random()
+    if sorteio < 0.3:
+        return busca.normalizar_texto(nome).title()
+    if sorteio < 0.5 and len(partes) > 2:
+        return f'{partes[0]} {partes[-1]}'
+    if sorteio < 0.8:
+        for de, para in TROCAS_GRAFIA:
+            if de in nome:
+                return nome.replace(de, para, 1)
+    return nome.lower()
+
+
+def variar_telefone(rng, telefone):
+    import busca
+
+    digitos = busca.normalizar_telefone(telefone)
+    if digitos.startswith('55') and len(digitos) >= 12:
+        digitos = digitos[2:]
+    formato = rng.randint(0, 2)
+    if formato == 0:
+        return f'({digitos[:2]}) {digitos[2:7]}-{digitos[7:]}'
+    if formato == 1:
+        return digitos[2:]
+    return f'+55{digitos}'
+
+
+def gerar_duplicados(rng, originais, quantidade):
+    """Recadastros de pacientes sorteados: (índice do original, dados do novo cadastro)"""
+    for indice in rng.sample(range(len(originais)), quantidade):
+        original = originais[indice]
+        yield indice, dict(original,
+                           nome=variar_nome(rng, original['nome']),
+                           telefone=variar_telefone(rng, original['telefone']),
+                           email=original['email'] if rng.random() < 0.5 else None)
+
+
+def comparar_com_todos(todos, nome, telefone, email):
+    """O jeito ingênuo: compara o novo cadastro com cada paciente da tabela"""
+    import duplicados
+
+    novo = (nome, telefone, email)
+    return [paciente_id for paciente_id, *dados in todos if duplicados.comparar(novo, dados)[1]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pacientes', type=int, default=100000)
+    parser.add_argument('--duplicados', type=int, default=3000)
+    parser.add_argument('--consultas', type=int, default=500)
+    parser.add_argument('--consultas-ingenuas', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    originais = list(gerar_pacientes(args.pacientes))
+    recadastros = list(gerar_duplicados(rng, originais, args.duplicados))
+
+    pasta = tempfile.mkdtemp(prefix='bench_duplicados_')
+    caminho = os.path.join(pasta, 'duplicados.db')
+    engine = create_engine(f'sqlite:///{caminho}')
+    from models import db, Paciente
+    db.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        inserir_em_lotes(conexao, Paciente.__table__, originais + [dados for _, dados in recadastros])
+    engine.dispose()
+    # Ids: originais 1..n na ordem gerada, recadastros n+1.. em seguida
+    verdade = {args.pacientes + 1 + posicao: indice + 1 for posicao, (indice, _) in enumerate(recadastros)}
+    print(f'{args.pacientes} pacientes e {args.duplicados} recadastros')
+
+    from aplicacao import create_app, preparar_banco
+    import duplicados
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'GOOGLE_CALENDAR': False})
+    with app.app_context():
+        inicio = time.perf_counter()
+        preparar_banco()
+        print(f'Migrações, índice de busca e chaves em {time.perf_counter() - inicio:.1f}s '
+              f"({db.session.execute(text('SELECT COUNT(*) FROM paciente_chave')).scalar()} chaves)")
+
+        # Consulta do cadastro: o recadastro procura o original, como se ainda não estivesse gravado
+        amostra = rng.sample(sorted(verdade), min(args.consultas, len(verdade)))
+        tempos, achados = [], 0
+        for recadastro_id in amostra:
+            p = db.session.get(Paciente, recadastro_id)
+            inicio = time.perf_counter()
+            encontrados = duplicados.candidatos(p.nome, p.telefone, p.email, ignorar_id=recadastro_id)
+            tempos.append(time.perf_counter() - inicio)
+            achados += verdade[recadastro_id] in {c[0].id for c in encontrados}
+        tempos.sort()
+        print(f'candidatos: p50 {statistics.median(tempos) * 1000:.2f}ms, '
+              f'p99 {tempos[int(len(tempos) * 0.99) - 1] * 1000:.2f}ms; '
+              f'original encontrado em {achados}/{len(amostra)} recadastros')
+
+        todos = db.session.execute(text('SELECT id, nome, telefone, email FROM paciente')).all()
+        inicio = time.perf_counter()
+        for recadastro_id in amostra[:args.consultas_ingenuas]:
+            p = db.session.get(Paciente, recadastro_id)
+            comparar_com_todos(todos, p.nome, p.telefone, p.email)
+        ingenua = (time.perf_counter() - inicio) / args.consultas_ingenuas
+        print(f'comparação com todos: {ingenua * 1000:.0f}ms por cadastro (com a tabela já em memória)')
+
+        inicio = time.perf_counter()
+        grupos = duplicados.encontrar_grupos(db.session)
+        lote = time.perf_counter() - inicio
+        pares = {(g[0], outro) for g in grupos for outro in g[1:]}
+        certos = sum(1 for principal, outro in pares if verdade.get(outro) == principal)
+        print(f'lote: {len(grupos)} grupos em {lote:.2f}s; precisão {certos}/{len(pares)}, '
+              f'revocação {certos}/{len(verdade)}')
+        por_par = ingenua / len(todos)
+        print(f'lote ingênuo (n²/2 comparações): ~{por_par * len(todos) ** 2 / 2 / 3600:.1f}h estimadas')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Tempo de subida do app: importação dos módulos e create_app(), em processos novos.
+
+    python -m benchmarks.bench_inicializacao --repeticoes 10
+
+Cenários:
+
+    calendar          GOOGLE_CALENDAR=1 (padrão): rotas registradas, Google não importado
+    sem_calendar      GOOGLE_CALENDAR=0
+    google_na_subida  como era antes: bibliotecas do Google importadas junto com o app
+
+Cada processo importa o app, chama create_app() e responde uma requisição
+(/api/pacientes, que prepara o banco) em um banco temporário.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PASTA_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTS_GOOGLE = (
+    'import googleapiclient.discovery, googleapiclient.http, googleapiclient.errors, '
+    'google_auth_httplib2, google.oauth2.credentials, google.auth.transport.requests, '
+    'google_auth_oauthlib.flow'
+)
+
+SCRIPT = '''
+import json, sys, time
+inicio = time.perf_counter()
+{pre_imports}
+from aplicacao import create_app
+importado = time.perf_counter()
+app = create_app({{'SQLALCHEMY_DATABASE_URI': {uri!r}}})
+criado = time.perf_counter()
+app.test_client().get('/api/pacientes')
+pronto = time.perf_counter()
+print(json.dumps({{
+    'importacao_ms': (importado - inicio) * 1000,
+    'create_app_ms': (criado - importado) * 1000,
+    'primeira_requisicao_ms': (pronto - criado) * 1000,
+    'total_ms': (pronto - inicio) * 1000,
+    'google_importado': any(m.startswith('googleapiclient') for m in sys.modules),
+}}))
+'''
+
+CENARIOS = {
+    'calendar': ({'GOOGLE_CALENDAR': '1'}, ''),
+    'sem_calendar': ({'GOOGLE_CALENDAR': '0'}, ''),
+    'google_na_subida': ({'GOOGLE_CALENDAR': '1'}, IMPORTS_GOOGLE),
+}
+
+
+def medir(cenario, pasta):
+    ambiente, pre_imports = CENARIOS[cenario]
+    uri = f"sqlite:///{os.path.join(pasta, cenario + '.db')}"
+    saida = subprocess.run(
+        [sys.executable, '-c', SCRIPT.format(pre_imports=pre_imports, uri=uri)],
+        cwd=PASTA_APP, env={**os.environ, **ambiente, 'CALENDAR_WORKER': '0'},
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--cenarios', nargs='+', choices=sorted(CENARIOS), default=list(CENARIOS))
+    args = parser.parse_args()
+
+    print(f"{'cenário':18s} {'importação':>11s} {'create_app':>11s} {'1ª req.':>9s} {'total':>9s}  google")
+    with tempfile.TemporaryDirectory(prefix='bench_inicializacao_') as pasta:
+        for cenario in args.cenarios:
+            medicoes = [medir(cenario, pasta) for _ in range(args.repeticoes)]
+            mediana = {chave: statistics.median(m[chave] for m in medicoes)
+                       for chave in ('importacao_ms', 'create_app_ms', 'primeira_requisicao_ms', 'total_ms')}
+            print(f"{cenario:18s} {mediana['importacao_ms']:9.0f}ms {mediana['create_app_ms']:9.0f}ms "
+                  f"{mediana['primeira_requisicao_ms']:7.0f}ms {mediana['total_ms']:7.0f}ms  "
+                  f"{'sim' if medicoes[-1]['google_importado'] else 'não'}")
+
+
+if __name__ == '__main__':
+    main()
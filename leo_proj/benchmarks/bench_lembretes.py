@@ -0,0 +1,202 @@
+"""Lembretes: janela pelo índice + heap (lembretes.py) e envio em lotes com concorrência limitada.
+
+    python -m benchmarks.bench_lembretes --atendimentos 500000
+
+Gera atendimentos de um mês atrás até um ano à frente, cada um com um
+lembrete por webhook, e mede:
+
+    janela       AgendaLembretes.carregar (próximos 5 min, pelo índice) contra
+                 varrer os atendimentos futuros e calcular o horário de cada um
+    envio        lembretes vencidos por um canal falso com latência por
+                 chamada: um por vez, em lotes, e em lotes simultâneos
+    precisão     atraso de envio com o worker rodando (lembretes espalhados
+                 pelos próximos segundos), com um reinício no meio
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.dados import gerar_pacientes, gerar_atendimentos, inserir_em_lotes
+
+
+class CanalFalso:
+    """Canal com `latencia` segundos por chamada e `por_mensagem` por lembrete do lote"""
+    nome = 'webhook'
+
+    def __init__(self, latencia, por_mensagem=0.0005):
+        self.latencia = latencia
+        self.por_mensagem = por_mensagem
+        self.enviados = {}
+        self.trava = threading.Lock()
+
+    def destino(self, paciente):
+        return paciente.telefone
+
+    def enviar(self, mensagens):
+        time.sleep(self.latencia + self.por_mensagem * len(mensagens))
+        agora = datetime.now()
+        with self.trava:
+            for mensagem in mensagens:
+                self.enviados.setdefault(mensagem['id'], []).append(agora)
+        return {}
+
+
+def criar_lembretes(db, quantidade, inicio, passo):
+    """`quantidade` atendimentos futuros (do paciente 1) com lembrete vencendo a partir de `inicio`"""
+    from models import Atendimento, Lembrete
+
+    ids = []
+    for i in range(quantidade):
+        enviar_em = inicio + passo * i
+        atendimento = Atendimento(paciente_id=1, data_atendimento=enviar_em + timedelta(hours=24),
+                                  profissional='Bench', tratamento='RPG')
+        db.session.add(atendimento)
+        ids.append((atendimento, enviar_em))
+    db.session.flush()
+    db.session.execute(Lembrete.__table__.insert(), [
+        {'atendimento_id': a.id, 'canal': 'webhook', 'enviar_em': enviar_em,
+         'antecedencia_minutos': 1440, 'status': 'pendente', 'tentativas': 0}
+        for a, enviar_em in ids])
+    db.session.commit()
+    return [a.id for a, _ in ids]
+
+
+def varrer_atendimentos(db, agora, janela):
+    """O jeito ingênuo: lê todos os atendimentos futuros com lembrete e calcula o horário de envio"""
+    vencem = []
+    for lembrete_id, data, antecedencia in db.session.execute(text(
+            "SELECT l.id, a.data_atendimento, l.antecedencia_minutos FROM atendimento a "
+            "JOIN lembrete l ON l.atendimento_id = a.id "
+            "WHERE a.data_atendimento >= :agora AND l.status = 'pendente'"), {'agora': agora}):
+        enviar_em = datetime.fromisoformat(data) - timedelta(minutes=antecedencia)
+        if enviar_em < agora + janela:
+            vencem.append(lembrete_id)
+    return vencem
+
+
+def medir_envio(db, lembretes, canal, quantidade, tamanho_lote, simultaneos):
+    """Tempo para enviar `quantidade` lembretes vencidos com o lote e a concorrência dados"""
+    db.session.execute(text("DELETE FROM lembrete WHERE atendimento_id IN "
+                            "(SELECT id FROM atendimento WHERE profissional = 'Bench')"))
+    db.session.execute(text("DELETE FROM atendimento WHERE profissional = 'Bench'"))
+    db.session.commit()
+    criar_lembretes(db, quantidade, datetime.now() - timedelta(minutes=1), timedelta(0))
+
+    lembretes.TAMANHO_LOTE, original = tamanho_lote, lembretes.TAMANHO_LOTE
+    try:
+        agenda = lembretes.AgendaLembretes()
+        agenda.carregar(datetime.now() + lembretes.JANELA)
+        canais = {canal.nome: canal}
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=simultaneos) as executor:
+            enviados = 0
+            while True:
+                ids = agenda.vencidos(datetime.now(), tamanho_lote * simultaneos)
+                if not ids:
+                    break
+                enviados += lembretes.despachar(ids, canais, executor)[0]
+        return time.perf_counter() - inicio, enviados
+    finally:
+        lembretes.TAMANHO_LOTE = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--atendimentos', type=int, default=500000)
+    parser.add_argument('--por-paciente', type=int, default=5)
+    parser.add_argument('--envios', type=int, default=500, help='lembretes vencidos na medida de envio')
+    parser.add_argument('--latencia', type=float, default=0.05, help='segundos por chamada ao canal')
+    parser.add_argument('--precisao', type=int, default=500, help='lembretes na medida de atraso')
+    args = parser.parse_args()
+
+    pacientes = max(1, args.atendimentos // args.por_paciente)
+    pasta = tempfile.mkdtemp(prefix='bench_lembretes_')
+    caminho = os.path.join(pasta, 'lembretes.db')
+    agora = datetime.now()
+
+    from models import db, Paciente, Atendimento
+    engine = create_engine(f'sqlite:///{caminho}')
+    db.metadata.create_all(engine)
+    inicio = time.perf_counter()
+    with engine.begin() as conexao:
+        inserir_em_lotes(conexao, Paciente.__table__, gerar_pacientes(pacientes))
+        inserir_em_lotes(conexao, Atendimento.__table__, gerar_atendimentos(
+            pacientes, args.por_paciente, inicio=agora - timedelta(days=30), fim=agora + timedelta(days=365)))
+    engine.dispose()
+    print(f'{pacientes} pacientes e {pacientes * args.por_paciente} atendimentos em {time.perf_counter() - inicio:.1f}s')
+
+    from aplicacao import create_app, preparar_banco
+    import lembretes
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'GOOGLE_CALENDAR': False,
+                      'LEMBRETES_WEBHOOK_URL': 'http://127.0.0.1:9/', 'LEMBRETES_WORKER': False})
+    with app.app_context():
+        preparar_banco()
+        canais = [CanalFalso(0)]
+        futuros = Atendimento.query.options(db.joinedload(Atendimento.paciente)).filter(
+            Atendimento.data_atendimento > datetime.now(), Atendimento.status != 'cancelado')
+        inicio = time.perf_counter()
+        agendados = lembretes.agendar(futuros, canais, timedelta(hours=24))
+        db.session.commit()
+        print(f'lembretes.agendar: {agendados} lembretes em {time.perf_counter() - inicio:.1f}s')
+
+        plano = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, enviar_em FROM lembrete "
+            "WHERE status IN ('pendente', 'enviando') AND enviar_em < :ate"), {'ate': agora}).all()
+        print('plano da janela:', '; '.join(linha[-1] for linha in plano))
+
+        melhor = {}
+        for nome, funcao in (('janela pelo índice', lambda: lembretes.AgendaLembretes().carregar(datetime.now() + lembretes.JANELA)),
+                             ('varrer atendimentos', lambda: len(varrer_atendimentos(db, datetime.now(), lembretes.JANELA)))):
+            for _ in range(3):
+                inicio = time.perf_counter()
+                total = funcao()
+                duracao = time.perf_counter() - inicio
+                melhor[nome] = min(melhor.get(nome, duracao), duracao)
+            print(f'{nome:20s} {melhor[nome] * 1000:8.1f}ms ({total} lembretes na janela)')
+
+        # Daqui em diante só contam os lembretes criados pelo benchmark
+        db.session.execute(text("UPDATE lembrete SET status = 'cancelado' WHERE status = 'pendente'"))
+        db.session.commit()
+
+        print(f'envio de {args.envios} lembretes, canal com {args.latencia * 1000:.0f}ms por chamada:')
+        for tamanho_lote, simultaneos in ((1, 1), (50, 1), (50, 4)):
+            canal = CanalFalso(args.latencia)
+            duracao, enviados = medir_envio(db, lembretes, canal, args.envios, tamanho_lote, simultaneos)
+            print(f'  lote {tamanho_lote:3d}, {simultaneos} simultâneos: {duracao:6.2f}s '
+                  f'({enviados / duracao:7.0f}/s, {enviados} enviados)')
+
+        # Precisão: lembretes ao longo dos próximos segundos, worker reiniciado no meio
+        canal = CanalFalso(0.005)
+        passo = timedelta(seconds=8) / args.precisao
+        ids = criar_lembretes(db, args.precisao, datetime.now() + timedelta(seconds=1), passo)
+        previstos = dict(db.session.query(lembretes.Lembrete.id, lembretes.Lembrete.enviar_em).filter(
+            lembretes.Lembrete.atendimento_id.in_(ids)))
+
+    worker = lembretes.WorkerLembretes(app, [canal])
+    worker.start()
+    time.sleep(4)
+    worker.parar()
+    worker.join()
+    worker = lembretes.WorkerLembretes(app, [canal])
+    worker.start()
+    time.sleep(7)
+    worker.parar()
+    worker.join()
+
+    atrasos = sorted((canal.enviados[i][0] - previsto).total_seconds() for i, previsto in previstos.items()
+                     if i in canal.enviados)
+    repetidos = sum(len(v) > 1 for v in canal.enviados.values())
+    print(f'precisão: {len(atrasos)}/{len(previstos)} enviados, {repetidos} em dobro; atraso p50 '
+          f'{statistics.median(atrasos) * 1000:.1f}ms, p99 {atrasos[int(len(atrasos) * 0.99) - 1] * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
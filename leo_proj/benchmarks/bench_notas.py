@@ -0,0 +1,212 @@
+"""Notas clínicas: colunas comprimidas e adiadas (notas.py) contra texto puro carregado sempre.
+
+    python -m benchmarks.bench_notas --atendimentos 200000
+
+Gera atendimentos com observações e evolução de tamanhos variados (a
+maioria de algumas centenas de caracteres, algumas bem longas) e monta
+dois bancos iguais:
+
+    antes    notas em texto puro, carregadas com cada linha (como os modelos
+             antigos, com Text sem `deferred`)
+    depois   após a migração 0011 (notas longas comprimidas, trecho das
+             observações) e os modelos com as notas adiadas
+
+Mede o tamanho do banco e das notas por linha, e o tempo das consultas de
+lista (agenda do mês, todos os pacientes), de uma varredura da tabela que
+não lê as notas e da página do paciente, que lê e descomprime as notas.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.dados import gerar_pacientes, gerar_atendimentos, inserir_em_lotes
+
+FRASES = [
+    'Paciente relata melhora das dores na região lombar.',
+    'Refere piora ao permanecer sentado por longos períodos.',
+    'Amplitude de movimento do ombro direito aumentada em relação à sessão anterior.',
+    'Realizados alongamentos de cadeia posterior e fortalecimento de core.',
+    'Orientado a manter exercícios domiciliares duas vezes ao dia.',
+    'Sem queixas de parestesia nesta sessão.',
+    'Dor 4/10 na escala visual analógica, antes 6/10.',
+    'Aplicada eletroterapia (TENS) por 20 minutos na região cervical.',
+    'Marcha sem claudicação, equilíbrio estático preservado.',
+    'Paciente trouxe exame de ressonância: protrusão discal L4-L5.',
+    'Liberação miofascial em trapézio e elevador da escápula.',
+    'Edema discreto em tornozelo esquerdo, reduzido após drenagem.',
+]
+
+
+def gerar_nota(rng, mediana):
+    """Nota com tamanho sorteado (lognormal em torno de `mediana` caracteres)"""
+    alvo = rng.lognormvariate(0, 0.9) * mediana
+    partes, tamanho = [], 0
+    while tamanho < alvo:
+        frase = rng.choice(FRASES)
+        partes.append(frase)
+        tamanho += len(frase) + 1
+    return ' '.join(partes)
+
+
+def com_notas(linhas, rng):
+    for linha in linhas:
+        linha['observacoes'] = gerar_nota(rng, 300) if rng.random() < 0.6 else None
+        linha['evolucao'] = gerar_nota(rng, 500) if rng.random() < 0.4 else None
+        yield linha
+
+
+def inserir_texto_puro(conexao, tabela, linhas, tamanho_lote=10000):
+    """INSERT sem passar pelos tipos do modelo (as notas ficam em texto puro, como antes)"""
+    colunas = None
+    lote = []
+    for linha in linhas:
+        if colunas is None:
+            colunas = list(linha)
+            sql = text(f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join(':' + c for c in colunas)})")
+        lote.append(linha)
+        if len(lote) == tamanho_lote:
+            conexao.execute(sql, lote)
+            lote = []
+    if lote:
+        conexao.execute(sql, lote)
+
+
+def cronometrar(funcao, repeticoes=5):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+def medir(caminho, antes, paciente_id):
+    from aplicacao import create_app
+    from models import db, Paciente, Atendimento
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'GOOGLE_CALENDAR': False})
+    resultados = {}
+    with app.app_context():
+        # Antes: todas as colunas vinham em cada linha
+        notas = (db.undefer_group('notas'),) if antes else ()
+        inicio = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def agenda():
+            # Como rotas_atendimentos.carregar_agenda, com ou sem as notas
+            return len(Atendimento.query.options(
+                db.joinedload(Atendimento.paciente).options(*notas), *notas
+            ).filter(
+                Atendimento.data_atendimento >= inicio - timedelta(days=30),
+                Atendimento.data_atendimento < inicio,
+                Atendimento.status != 'cancelado'
+            ).all())
+
+        def pacientes():
+            return len(Paciente.query.options(*notas).all())
+
+        def historico():
+            # Página do paciente: as notas aparecem inteiras nos dois casos
+            atendimentos = Atendimento.query.options(db.undefer_group('notas')).filter_by(
+                paciente_id=paciente_id).order_by(Atendimento.data_atendimento.desc()).limit(20).all()
+            return sum(len(a.observacoes or '') + len(a.evolucao or '') for a in atendimentos)
+
+        def varredura():
+            # Consultas que percorrem a tabela sem ler as notas (fila do Calendar, relatórios em SQL)
+            return db.session.execute(text(
+                "SELECT SUM(duracao_minutos) FROM atendimento WHERE status != 'cancelado'")).scalar()
+
+        for nome, funcao in (('agenda (30 dias)', agenda), ('todos os pacientes', pacientes),
+                             ('histórico do paciente', historico), ('varredura de atendimento', varredura)):
+            db.session.expunge_all()
+            resultados[nome] = cronometrar(lambda: (db.session.expunge_all(), funcao())[1])
+
+        resultados['notas por atendimento'] = db.session.execute(text(
+            "SELECT AVG(COALESCE(length(CAST(observacoes AS BLOB)), 0) + COALESCE(length(CAST(evolucao AS BLOB)), 0)) "
+            "FROM atendimento")).scalar()
+        resultados['tabela atendimento'] = db.session.execute(text(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name = 'atendimento'")).scalar() / 2 ** 20
+        db.engine.dispose()
+    return resultados
+
+
+def compactar(caminho):
+    engine = create_engine(f'sqlite:///{caminho}')
+    with engine.connect() as conexao:
+        conexao.exec_driver_sql('VACUUM')
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--atendimentos', type=int, default=200000)
+    parser.add_argument('--por-paciente', type=int, default=5)
+    args = parser.parse_args()
+
+    pacientes = max(1, args.atendimentos // args.por_paciente)
+    pasta = tempfile.mkdtemp(prefix='bench_notas_')
+    antes = os.path.join(pasta, 'antes.db')
+    depois = os.path.join(pasta, 'depois.db')
+
+    from models import db
+    engine = create_engine(f'sqlite:///{depois}')
+    db.metadata.create_all(engine)
+    rng = random.Random(11)
+    inicio = time.perf_counter()
+    with engine.begin() as conexao:
+        inserir_em_lotes(conexao, db.metadata.tables['paciente'], gerar_pacientes(pacientes))
+        inserir_texto_puro(conexao, 'atendimento', com_notas(gerar_atendimentos(pacientes, args.por_paciente), rng))
+        conexao.execute(text("UPDATE paciente SET observacoes_medicas = :nota WHERE id % 3 = 0"),
+                        {'nota': gerar_nota(rng, 400)})
+    engine.dispose()
+    print(f'{pacientes} pacientes e {pacientes * args.por_paciente} atendimentos em {time.perf_counter() - inicio:.1f}s')
+
+    from aplicacao import create_app, preparar_banco
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{depois}', 'GOOGLE_CALENDAR': False})
+    with app.app_context():
+        inicio = time.perf_counter()
+        preparar_banco()
+        print(f'Migrações (inclui a compressão das notas existentes) em {time.perf_counter() - inicio:.1f}s')
+        db.session.close()
+        db.engine.dispose()
+    compactar(depois)
+
+    import notas
+
+    # Antes: o mesmo banco (índices, resumos, busca) com as notas de volta em texto puro e sem trecho
+    shutil.copy(depois, antes)
+    engine = create_engine(f'sqlite:///{antes}')
+    with engine.begin() as conexao:
+        for tabela, colunas in (('atendimento', ('observacoes', 'evolucao')), ('paciente', ('observacoes_medicas',))):
+            linhas = conexao.execute(text(f"SELECT id, {', '.join(colunas)} FROM {tabela}")).fetchall()
+            conexao.execute(text(f"UPDATE {tabela} SET {', '.join(f'{c} = :{c}' for c in colunas)} WHERE id = :id"),
+                            [dict(id=linha[0], **{c: notas.descomprimir(v) for c, v in zip(colunas, linha[1:])})
+                             for linha in linhas])
+        conexao.execute(text("UPDATE atendimento SET observacoes_trecho = NULL"))
+    engine.dispose()
+    compactar(antes)
+
+    paciente_id = 1
+    resultados = {'antes': medir(antes, True, paciente_id), 'depois': medir(depois, False, paciente_id)}
+
+    tamanhos = {nome: os.path.getsize(caminho) / 2 ** 20 for nome, caminho in (('antes', antes), ('depois', depois))}
+    print(f"{'':24s} {'antes':>12s} {'depois':>12s}")
+    print(f"{'banco (após VACUUM)':24s} {tamanhos['antes']:10.1f}MB {tamanhos['depois']:10.1f}MB")
+    print(f"{'tabela atendimento':24s} {resultados['antes']['tabela atendimento']:10.1f}MB "
+          f"{resultados['depois']['tabela atendimento']:10.1f}MB")
+    print(f"{'notas por atendimento':24s} {resultados['antes']['notas por atendimento']:11.0f}B "
+          f"{resultados['depois']['notas por atendimento']:11.0f}B")
+    for nome in ('agenda (30 dias)', 'todos os pacientes', 'histórico do paciente', 'varredura de atendimento'):
+        (t_antes, n_antes), (t_depois, n_depois) = resultados['antes'][nome], resultados['depois'][nome]
+        print(f'{nome:24s} {t_antes * 1000:10.1f}ms {t_depois * 1000:10.1f}ms  '
+              f'{"iguais" if n_antes == n_depois else "DIFERENTES"} ({n_depois})')
+
+
+if __name__ == '__main__':
+    main()
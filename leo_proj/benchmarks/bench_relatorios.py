@@ -0,0 +1,171 @@
+"""Relatórios mensais: totais diários (relatorios.py) contra a varredura da tabela inteira.
+
+    python -m benchmarks.bench_relatorios --atendimentos 1000000
+
+Compara, para o relatório por profissional do período todo e dos últimos
+12 meses:
+
+    orm        percorre os objetos Atendimento e Paciente e agrega em Python
+    sql        GROUP BY direto na tabela atendimento (lê todas as linhas do período)
+    resumos    relatorios.sessoes_por_mes e pacientes_novos_por_mes
+
+Mede também a carga inicial dos resumos (migração 0008) e o custo dos
+triggers em um INSERT em lote de atendimentos.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.dados import popular_banco, gerar_atendimentos
+
+
+def cronometrar(funcao, repeticoes=1):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+def relatorio_orm(inicio, fim, hoje):
+    """O jeito ingênuo: objetos ORM da tabela inteira, agregados em Python"""
+    from models import Atendimento, Paciente
+
+    por_mes = {}
+    consulta = Atendimento.query.filter(
+        Atendimento.data_atendimento >= datetime.combine(inicio, datetime.min.time()),
+        Atendimento.data_atendimento < datetime.combine(fim, datetime.min.time())
+    )
+    for a in consulta.yield_per(10000):
+        linha = por_mes.setdefault((a.data_atendimento.strftime('%Y-%m'), a.profissional),
+                                   {'sessoes': 0, 'faltas': 0, 'cancelados': 0, 'passadas': 0})
+        if a.status == 'cancelado':
+            linha['cancelados'] += 1
+            continue
+        linha['sessoes'] += 1
+        linha['faltas'] += a.status == 'faltou'
+        linha['passadas'] += a.data_atendimento.date() < hoje
+
+    novos = {}
+    for p in Paciente.query.yield_per(10000):
+        if p.data_cadastro and inicio <= p.data_cadastro.date() < fim:
+            mes = p.data_cadastro.strftime('%Y-%m')
+            novos[mes] = novos.get(mes, 0) + 1
+    return por_mes, novos
+
+
+def relatorio_sql(inicio, fim, hoje):
+    """GROUP BY na tabela atendimento: agrega no banco, mas lê todas as linhas do período"""
+    from models import db
+
+    linhas = db.session.execute(text("""
+        SELECT strftime('%Y-%m', data_atendimento), profissional,
+               SUM(status != 'cancelado'), SUM(status = 'faltou'), SUM(status = 'cancelado'),
+               SUM(status != 'cancelado' AND date(data_atendimento) < :hoje)
+        FROM atendimento WHERE data_atendimento >= :inicio AND data_atendimento < :fim
+        GROUP BY 1, 2"""), {'inicio': str(inicio), 'fim': str(fim), 'hoje': str(hoje)}).all()
+    novos = db.session.execute(text("""
+        SELECT strftime('%Y-%m', data_cadastro), COUNT(*) FROM paciente
+        WHERE data_cadastro >= :inicio AND data_cadastro < :fim GROUP BY 1"""),
+        {'inicio': str(inicio), 'fim': str(fim)}).all()
+    return {(m, p): {'sessoes': s, 'faltas': f, 'cancelados': c, 'passadas': ps}
+            for m, p, s, f, c, ps in linhas}, dict(novos)
+
+
+def relatorio_resumos(inicio, fim, hoje):
+    import relatorios
+
+    linhas = relatorios.sessoes_por_mes(inicio, fim, 'profissional', hoje=hoje)
+    return {(l['mes'], l['chave']): {k: l[k] for k in ('sessoes', 'faltas', 'cancelados', 'passadas')}
+            for l in linhas}, dict(relatorios.pacientes_novos_por_mes(inicio, fim))
+
+
+def custo_dos_triggers(quantidade, pacientes):
+    """Tempo de um INSERT em lote de `quantidade` atendimentos, com e sem os triggers dos resumos"""
+    from models import db, Atendimento
+
+    def inserir(semente):
+        linhas = list(gerar_atendimentos(pacientes, 1, semente=semente))[:quantidade]
+        inicio = time.perf_counter()
+        db.session.execute(Atendimento.__table__.insert(), linhas)
+        db.session.commit()
+        return time.perf_counter() - inicio
+
+    com = inserir(101)
+    triggers = db.session.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_resumo_dia_%'")).all()
+    for nome, _ in triggers:
+        db.session.execute(text(f'DROP TRIGGER {nome}'))
+    db.session.commit()
+    sem = inserir(102)
+    for _, sql in triggers:
+        db.session.execute(text(sql))
+    db.session.commit()
+    return com, sem
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--atendimentos', type=int, default=1000000)
+    parser.add_argument('--por-paciente', type=int, default=5)
+    parser.add_argument('--banco', help='arquivo do banco (reaproveitado se já existir)')
+    parser.add_argument('--repeticoes', type=int, default=3, help='para o sql e os resumos (vale a melhor)')
+    parser.add_argument('--sem-orm', action='store_true', help='pula a varredura ORM (a mais lenta)')
+    args = parser.parse_args()
+
+    pacientes = max(1, args.atendimentos // args.por_paciente)
+    pasta = tempfile.mkdtemp(prefix='bench_relatorios_')
+    caminho = os.path.abspath(args.banco or os.path.join(pasta, 'relatorios.db'))
+    if not os.path.exists(caminho):
+        print(f'Gerando {pacientes} pacientes e {pacientes * args.por_paciente} atendimentos...')
+        inicio = time.perf_counter()
+        engine = create_engine(f'sqlite:///{caminho}')
+        popular_banco(engine, pacientes, args.por_paciente)
+        engine.dispose()
+        print(f'Dados gerados em {time.perf_counter() - inicio:.1f}s')
+
+    from aplicacao import create_app, preparar_banco
+    from models import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'GOOGLE_CALENDAR': False})
+    with app.app_context():
+        inicio = time.perf_counter()
+        preparar_banco()
+        print(f'Migrações (inclui a carga inicial dos resumos) em {time.perf_counter() - inicio:.1f}s')
+        linhas_resumo = db.session.execute(text('SELECT COUNT(*) FROM resumo_atendimento_dia')).scalar()
+        print(f'resumo_atendimento_dia: {linhas_resumo} linhas')
+
+        hoje = date.today()
+        ultimo_ano = (date(hoje.year - 1, hoje.month, 1), date(hoje.year + hoje.month // 12, hoje.month % 12 + 1, 1))
+        periodos = {'tudo': (date(2000, 1, 1), date(2100, 1, 1)), '12 meses': ultimo_ano}
+
+        print(f"{'período':10s} {'orm':>10s} {'sql':>10s} {'resumos':>10s}  iguais")
+        for nome, (inicio, fim) in periodos.items():
+            t_sql, r_sql = cronometrar(lambda: relatorio_sql(inicio, fim, hoje), args.repeticoes)
+            t_res, r_res = cronometrar(lambda: relatorio_resumos(inicio, fim, hoje), args.repeticoes)
+            iguais = r_sql == r_res
+            t_orm = None
+            if not args.sem_orm:
+                t_orm, r_orm = cronometrar(lambda: relatorio_orm(inicio, fim, hoje))
+                iguais = iguais and r_orm == r_res
+            orm = f'{t_orm * 1000:8.0f}ms' if t_orm is not None else f"{'-':>10s}"
+            print(f'{nome:10s} {orm} {t_sql * 1000:8.0f}ms {t_res * 1000:8.1f}ms  {"sim" if iguais else "NÃO"}')
+
+        import relatorios
+        t_col, colunas = cronometrar(lambda: relatorios.colunas_diarias(*periodos['tudo']))
+        print(f"colunas_diarias (período todo): {len(colunas['dia'])} linhas em {t_col * 1000:.0f}ms")
+
+        quantidade = min(50000, pacientes)
+        com, sem = custo_dos_triggers(quantidade, pacientes)
+        print(f'INSERT de {quantidade} atendimentos: {com * 1000:.0f}ms com os triggers, '
+              f'{sem * 1000:.0f}ms sem ({(com - sem) / quantidade * 1e6:.1f}µs por atendimento)')
+
+
+if __name__ == '__main__':
+    main()
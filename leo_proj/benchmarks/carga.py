@@ -0,0 +1,176 @@
+"""Geradores de carga para as rotas do app: pelo test client ou por HTTP.
+
+Os dois recebem o mesmo Cenario (mistura ponderada de requisições) e
+devolvem um Resultado com latências por rota, erros e vazão.
+"""
+import http.client
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.dados import PRIMEIROS_NOMES, SOBRENOMES, TRATAMENTOS, PROFISSIONAIS, gerar_telefone
+
+# (nome, peso): proporção de cada tipo de requisição na carga
+MISTURA_PADRAO = (
+    ('lista', 20),
+    ('buscar', 15),
+    ('api_pacientes', 30),
+    ('paciente', 25),
+    ('novo_atendimento', 10),
+)
+
+
+class Cenario:
+    """Sorteia requisições (nome, método, caminho, formulário) sobre `pacientes` ids"""
+
+    def __init__(self, pacientes, mistura=MISTURA_PADRAO, agendar_google=False, semente=7):
+        self.pacientes = pacientes
+        self.nomes = [nome for nome, _ in mistura]
+        self.pesos = [peso for _, peso in mistura]
+        self.agendar_google = agendar_google
+        self.semente = semente
+
+    def gerador(self, indice):
+        """Sequência própria de requisições para cada thread"""
+        rng = random.Random(self.semente * 1000 + indice)
+        while True:
+            yield self._sortear(rng)
+
+    def _termo(self, rng):
+        tipo = rng.randint(0, 2)
+        if tipo == 0:
+            nome = rng.choice(PRIMEIROS_NOMES)
+            return nome[:rng.randint(2, len(nome))]
+        if tipo == 1:
+            return f'{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)[:4]}'
+        return gerar_telefone(rng)[-8:-3]
+
+    def _sortear(self, rng):
+        nome = rng.choices(self.nomes, self.pesos)[0]
+        paciente_id = rng.randint(1, self.pacientes)
+        if nome == 'lista':
+            return nome, 'GET', '/?' + urlencode({'ordem': rng.choice(['nome', 'recentes'])}), None
+        if nome == 'buscar':
+            return nome, 'GET', '/buscar?' + urlencode({'q': self._termo(rng)}), None
+        if nome == 'api_pacientes':
+            return nome, 'GET', '/api/pacientes?' + urlencode({'q': self._termo(rng)}), None
+        if nome == 'paciente':
+            return nome, 'GET', f'/paciente/{paciente_id}', None
+        data = (datetime.now() + timedelta(days=rng.randint(1, 60))).replace(hour=rng.randint(8, 18), minute=0)
+        formulario = {
+            'data_atendimento': data.strftime('%Y-%m-%dT%H:%M'),
+            'profissional': rng.choice(PROFISSIONAIS),
+            'tratamento': rng.choice(TRATAMENTOS),
+        }
+        if self.agendar_google:
+            formulario['agendar_google'] = 'on'
+        return nome, 'POST', f'/novo_atendimento/{paciente_id}', formulario
+
+
+def percentil(valores, p):
+    if len(valores) < 2:
+        return valores[0] if valores else 0.0
+    return statistics.quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+class Resultado:
+    def __init__(self):
+        self.tempos = defaultdict(list)   # rota -> latências em ms
+        self.erros = defaultdict(int)
+        self.duracao = 0.0
+        self._lock = threading.Lock()
+
+    def juntar(self, tempos, erros):
+        with self._lock:
+            for rota, valores in tempos.items():
+                self.tempos[rota].extend(valores)
+            for rota, quantidade in erros.items():
+                self.erros[rota] += quantidade
+
+    def resumo(self):
+        """Dicionário por rota (e 'total') com n, vazão, erros e percentis em ms"""
+        linhas = {}
+        todos = []
+        for rota in sorted(self.tempos):
+            valores = self.tempos[rota]
+            todos.extend(valores)
+            linhas[rota] = self._linha(valores, self.erros.get(rota, 0))
+        linhas['total'] = self._linha(todos, sum(self.erros.values()))
+        return linhas
+
+    def _linha(self, valores, erros):
+        return {
+            'n': len(valores),
+            'req_s': round(len(valores) / self.duracao, 1) if self.duracao else 0.0,
+            'erros': erros,
+            'p50': round(percentil(valores, 50), 2),
+            'p90': round(percentil(valores, 90), 2),
+            'p99': round(percentil(valores, 99), 2),
+            'max': round(max(valores), 2) if valores else 0.0,
+        }
+
+
+def _status_ok(status):
+    return status < 400
+
+
+def executar_test_client(app, cenario, requisicoes):
+    """Executa `requisicoes` em sequência pelo test client do Flask (sem rede)"""
+    cliente = app.test_client()
+    resultado = Resultado()
+    tempos, erros = defaultdict(list), defaultdict(int)
+    gerador = cenario.gerador(0)
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        nome, metodo, caminho, formulario = next(gerador)
+        t0 = time.perf_counter()
+        resposta = cliente.open(caminho, method=metodo, data=formulario)
+        tempos[nome].append((time.perf_counter() - t0) * 1000)
+        if not _status_ok(resposta.status_code):
+            erros[nome] += 1
+    resultado.duracao = time.perf_counter() - inicio
+    resultado.juntar(tempos, erros)
+    return resultado
+
+
+def executar_http(url_base, cenario, concorrencia, segundos):
+    """`concorrencia` threads, cada uma com sua conexão, enviando requisições por `segundos`"""
+    partes = urlsplit(url_base)
+    resultado = Resultado()
+    fim = time.perf_counter() + segundos
+
+    def trabalhador(indice):
+        conexao = http.client.HTTPConnection(partes.hostname, partes.port, timeout=60)
+        tempos, erros = defaultdict(list), defaultdict(int)
+        gerador = cenario.gerador(indice)
+        while time.perf_counter() < fim:
+            nome, metodo, caminho, formulario = next(gerador)
+            corpo = urlencode(formulario) if formulario else None
+            cabecalhos = {'Content-Type': 'application/x-www-form-urlencoded'} if corpo else {}
+            t0 = time.perf_counter()
+            try:
+                conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                resposta.read()
+                ok = _status_ok(resposta.status)
+            except (OSError, http.client.HTTPException):
+                conexao.close()
+                ok = False
+            tempos[nome].append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                erros[nome] += 1
+        conexao.close()
+        resultado.juntar(tempos, erros)
+
+    threads = [threading.Thread(target=trabalhador, args=(i,)) for i in range(concorrencia)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    resultado.duracao = time.perf_counter() - inicio
+    return resultado
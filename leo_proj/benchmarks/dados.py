@@ -0,0 +1,137 @@
+"""Geração de dados sintéticos de clínica (nomes e telefones brasileiros)"""
+import random
+from datetime import datetime, timedelta
+
+PRIMEIROS_NOMES = [
+    'João', 'Maria', 'José', 'Ana', 'Antônio', 'Francisca', 'Carlos', 'Adriana',
+    'Paulo', 'Juliana', 'Pedro', 'Márcia', 'Lucas', 'Fernanda', 'Luiz', 'Patrícia',
+    'Marcos', 'Aline', 'Luís', 'Sandra', 'Gabriel', 'Camila', 'Rafael', 'Amanda',
+    'Daniel', 'Bruna', 'Marcelo', 'Jéssica', 'Bruno', 'Letícia', 'Eduardo', 'Júlia',
+    'Felipe', 'Luciana', 'Raimundo', 'Vanessa', 'Rodrigo', 'Mariana', 'Sebastião', 'Gabriela',
+    'Conceição', 'Vitória', 'Thiago', 'Larissa', 'Mateus', 'Cláudia', 'André', 'Beatriz',
+    'Fábio', 'Luana', 'Vinícius', 'Raquel', 'Leonardo', 'Débora', 'Gustavo', 'Simone',
+]
+
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+    'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes',
+    'Soares', 'Fernandes', 'Vieira', 'Barbosa', 'Rocha', 'Dias', 'Nascimento', 'Andrade',
+    'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas', 'Cardoso', 'Ramos',
+    'Gonçalves', 'Santana', 'Teixeira', 'Araújo', 'Pinto', 'Correia', 'Cavalcanti', 'Conceição',
+]
+
+DDDS = ['11', '21', '31', '41', '51', '61', '71', '81', '85', '19', '27', '48', '62', '92']
+
+DOMINIOS_EMAIL = ['gmail.com', 'hotmail.com', 'yahoo.com.br', 'outlook.com', 'uol.com.br']
+
+
+def gerar_nome(rng):
+    return f'{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}'
+
+
+def gerar_telefone(rng):
+    """Telefone celular em um dos formatos comuns de digitação"""
+    ddd = rng.choice(DDDS)
+    numero = f'9{rng.randint(0, 99999999):08d}'
+    formato = rng.randint(0, 2)
+    if formato == 0:
+        return f'({ddd}) {numero[:5]}-{numero[5:]}'
+    if formato == 1:
+        return f'{ddd}{numero}'
+    return f'+55 {ddd} {numero[:5]} {numero[5:]}'
+
+
+def gerar_email(rng, nome):
+    partes = nome.lower().split()
+    usuario = f'{partes[0]}.{partes[-1]}{rng.randint(1, 9999)}'
+    return f'{usuario}@{rng.choice(DOMINIOS_EMAIL)}'
+
+
+def gerar_pacientes(quantidade, semente=42):
+    """Gera dicionários com as colunas da tabela paciente"""
+    rng = random.Random(semente)
+    inicio = datetime(2015, 1, 1)
+    for i in range(quantidade):
+        nome = gerar_nome(rng)
+        yield {
+            'nome': nome,
+            'telefone': gerar_telefone(rng),
+            'email': gerar_email(rng, nome) if rng.random() < 0.7 else None,
+            'endereco': None,
+            'observacoes_medicas': None,
+            'data_cadastro': inicio + timedelta(minutes=i * 7),
+        }
+
+
+TRATAMENTOS = ['Fisioterapia', 'Consulta Médica', 'Acupuntura', 'Massoterapia', 'Pilates', 'RPG', 'Hidroterapia']
+
+PROFISSIONAIS = ['Dr. Leonardo', 'Dra. Camila', 'Dr. Rafael', 'Dra. Juliana', 'Dra. Beatriz']
+
+
+# Proporção de faltas e cancelamentos nos atendimentos passados
+TAXA_FALTAS = 0.08
+TAXA_CANCELAMENTOS = 0.05
+
+
+def sortear_status(rng):
+    sorteio = rng.random()
+    if sorteio < TAXA_FALTAS:
+        return 'faltou'
+    if sorteio < TAXA_FALTAS + TAXA_CANCELAMENTOS:
+        return 'cancelado'
+    return 'realizado'
+
+
+def gerar_atendimentos(pacientes, por_paciente, semente=43, inicio=datetime(2020, 1, 6), fim=None):
+    """Gera dicionários da tabela atendimento para os ids 1..`pacientes`.
+
+    As datas caem em horário comercial entre `inicio` e `fim` (padrão: 60
+    dias a partir de hoje), então parte dos atendimentos fica no futuro. Os
+    passados recebem uma situação (realizado, faltou ou cancelado) sorteada
+    à parte, sem mudar as demais colunas geradas com a mesma semente.
+    """
+    rng = random.Random(semente)
+    rng_status = random.Random(semente + 1)
+    agora = datetime.now()
+    fim = fim or agora + timedelta(days=60)
+    dias = max(1, (fim - inicio).days)
+    for paciente_id in range(1, pacientes + 1):
+        for _ in range(por_paciente):
+            data = inicio + timedelta(days=rng.randrange(dias), hours=rng.randint(8, 18))
+            yield {
+                'paciente_id': paciente_id,
+                'data_atendimento': data,
+                'profissional': rng.choice(PROFISSIONAIS),
+                'tratamento': rng.choice(TRATAMENTOS),
+                'observacoes': 'Paciente relata melhora das dores.' if rng.random() < 0.5 else None,
+                'evolucao': None,
+                'status': sortear_status(rng_status) if data < agora else 'agendado',
+            }
+
+
+def inserir_em_lotes(conexao, tabela, linhas, tamanho_lote=10000):
+    """executemany em lotes, para gerar milhões de linhas sem guardar todas em memória"""
+    lote = []
+    total = 0
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) == tamanho_lote:
+            conexao.execute(tabela.insert(), lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        conexao.execute(tabela.insert(), lote)
+        total += len(lote)
+    return total
+
+
+def popular_banco(engine, pacientes, atendimentos_por_paciente, semente=42):
+    """Cria as tabelas do app e insere os dados sintéticos (antes das migrações,
+    para que os resumos e o índice de busca sejam calculados de uma vez)"""
+    from models import db, Paciente, Atendimento
+
+    db.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        inserir_em_lotes(conexao, Paciente.__table__, gerar_pacientes(pacientes, semente))
+        inserir_em_lotes(conexao, Atendimento.__table__,
+                         gerar_atendimentos(pacientes, atendimentos_por_paciente, semente + 1))
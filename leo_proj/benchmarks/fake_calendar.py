@@ -0,0 +1,245 @@
+"""Servidor HTTP local que imita a parte da API do Google Calendar usada pelo sistema.
+
+Implementa insert/get/patch/update/delete de eventos, a listagem paginada
+com syncToken, calendars.get e o endpoint de batch (multipart/mixed),
+guardando tudo em memória. Para usar com o app:
+
+    python -m benchmarks.fake_calendar --porta 8765
+    GOOGLE_CALENDAR_API_URL=http://127.0.0.1:8765/ python app2.py
+
+`--atraso` simula a latência do Google em cada requisição; nos testes,
+`CalendarioFalso.falhar` simula erros em requisições escolhidas.
+"""
+import argparse
+import email.parser
+import itertools
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+_ROTA_EVENTOS = re.compile(r'^/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?$')
+_ROTA_CALENDARIO = re.compile(r'^/calendar/v3/calendars/([^/]+)$')
+
+
+class CalendarioFalso:
+    """Estado em memória dos eventos, por calendário"""
+
+    def __init__(self, atraso=0.0):
+        self.atraso = atraso
+        # falhar(metodo, caminho, corpo) -> status HTTP do erro, ou None para atender
+        self.falhar = None
+        self.eventos = {}
+        self.versao = 0  # incrementada a cada alteração; é o syncToken
+        self.requisicoes = 0
+        self.requisicoes_batch = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def tratar(self, metodo, caminho, corpo):
+        """Executa uma requisição da API e retorna (status, corpo_json)"""
+        with self._lock:
+            self.requisicoes += 1
+        if self.falhar is not None:
+            status = self.falhar(metodo, caminho, corpo)
+            if status:
+                return status, {'error': {'code': status, 'message': 'Erro simulado'}}
+        partes = urlsplit(caminho)
+        parametros = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+
+        rota = _ROTA_EVENTOS.match(partes.path)
+        if rota:
+            calendario, evento_id = unquote(rota.group(1)), rota.group(2)
+            if metodo == 'POST' and not evento_id:
+                return self.inserir(calendario, json.loads(corpo or b'{}'))
+            if metodo == 'GET' and not evento_id:
+                return self.listar(calendario, parametros)
+            if metodo == 'GET':
+                return self.obter(calendario, unquote(evento_id))
+            if metodo in ('PATCH', 'PUT'):
+                return self.alterar(calendario, unquote(evento_id), json.loads(corpo or b'{}'))
+            if metodo == 'DELETE':
+                return self.alterar(calendario, unquote(evento_id), {'status': 'cancelled'})
+
+        rota = _ROTA_CALENDARIO.match(partes.path)
+        if rota and metodo == 'GET':
+            return 200, {'id': unquote(rota.group(1)), 'summary': 'clinica@exemplo.com',
+                         'timeZone': 'America/Sao_Paulo'}
+
+        return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+    def _gravar(self, calendario, evento):
+        self.versao += 1
+        evento['_versao'] = self.versao
+        evento['updated'] = datetime.utcnow().isoformat() + 'Z'
+        self.eventos.setdefault(calendario, {})[evento['id']] = evento
+
+    def inserir(self, calendario, evento):
+        with self._lock:
+            evento = dict(evento)
+            evento.setdefault('id', f'evento{next(self._ids)}')
+            evento['status'] = 'confirmed'
+            self._gravar(calendario, evento)
+        return 200, self._publico(evento)
+
+    def alterar(self, calendario, evento_id, mudancas):
+        """Patch/update/delete; também usado pelos testes para simular edições no Google"""
+        with self._lock:
+            atual = self.eventos.get(calendario, {}).get(evento_id)
+            if atual is None:
+                return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+            evento = dict(atual)
+            evento.update(mudancas)
+            self._gravar(calendario, evento)
+        if evento['status'] == 'cancelled':
+            return 204, {}
+        return 200, self._publico(evento)
+
+    def obter(self, calendario, evento_id):
+        evento = self.eventos.get(calendario, {}).get(evento_id)
+        if evento is None:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        return 200, self._publico(evento)
+
+    def listar(self, calendario, parametros):
+        """Listagem paginada; com syncToken só devolve o que mudou desde aquela versão"""
+        sync_token = parametros.get('syncToken')
+        with self._lock:
+            eventos = sorted(self.eventos.get(calendario, {}).values(), key=lambda e: e['_versao'])
+            versao_atual = self.versao
+
+        if sync_token:
+            try:
+                desde = int(sync_token)
+            except ValueError:
+                return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid'}}
+            eventos = [e for e in eventos if e['_versao'] > desde]
+        elif parametros.get('showDeleted') != 'true':
+            eventos = [e for e in eventos if e['status'] != 'cancelled']
+
+        inicio = int(parametros.get('pageToken') or 0)
+        por_pagina = int(parametros.get('maxResults') or 250)
+        pagina = eventos[inicio:inicio + por_pagina]
+        resposta = {'kind': 'calendar#events', 'items': [self._publico(e) for e in pagina]}
+        if inicio + por_pagina < len(eventos):
+            resposta['nextPageToken'] = str(inicio + por_pagina)
+        else:
+            resposta['nextSyncToken'] = str(versao_atual)
+        return 200, resposta
+
+    @staticmethod
+    def _publico(evento):
+        return {k: v for k, v in evento.items() if not k.startswith('_')}
+
+
+def _resposta_http(status, corpo):
+    dados = json.dumps(corpo) if status != 204 else ''
+    return (f'HTTP/1.1 {status} OK\r\n'
+            f'Content-Type: application/json; charset=UTF-8\r\n'
+            f'Content-Length: {len(dados.encode("utf-8"))}\r\n\r\n{dados}')
+
+
+def tratar_batch(calendario, tipo_conteudo, corpo):
+    """Separa as requisições de um batch multipart/mixed e monta a resposta"""
+    mensagem = email.parser.BytesParser().parsebytes(
+        f'Content-Type: {tipo_conteudo}\r\n\r\n'.encode('utf-8') + corpo)
+    fronteira = 'fronteira_resposta_batch'
+    partes = []
+    for parte in mensagem.get_payload():
+        content_id = parte['Content-ID'].strip('<>')
+        requisicao = parte.get_payload()
+        cabecalho, _, corpo_requisicao = requisicao.partition('\r\n\r\n')
+        if not _:
+            cabecalho, _, corpo_requisicao = requisicao.partition('\n\n')
+        metodo, caminho, _ = cabecalho.splitlines()[0].split(' ', 2)
+        status, resposta = calendario.tratar(metodo, caminho, corpo_requisicao.encode('utf-8'))
+        partes.append(
+            f'--{fronteira}\r\n'
+            f'Content-Type: application/http\r\n'
+            f'Content-ID: <response-{content_id}>\r\n\r\n'
+            f'{_resposta_http(status, resposta)}\r\n'
+        )
+    partes.append(f'--{fronteira}--\r\n')
+    return f'multipart/mixed; boundary={fronteira}', ''.join(partes).encode('utf-8')
+
+
+def criar_handler(calendario):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _ler_corpo(self):
+            tamanho = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(tamanho) if tamanho else b''
+
+        def _responder(self, status, tipo, dados):
+            self.send_response(status)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _tratar(self, metodo):
+            corpo = self._ler_corpo()
+            if calendario.atraso:
+                time.sleep(calendario.atraso)
+
+            if urlsplit(self.path).path.startswith('/batch/'):
+                with calendario._lock:
+                    calendario.requisicoes_batch += 1
+                tipo, dados = tratar_batch(calendario, self.headers['Content-Type'], corpo)
+                return self._responder(200, tipo, dados)
+
+            status, resposta = calendario.tratar(metodo, self.path, corpo)
+            dados = json.dumps(resposta).encode('utf-8') if status != 204 else b''
+            self._responder(status, 'application/json; charset=UTF-8', dados)
+
+        def do_GET(self):
+            self._tratar('GET')
+
+        def do_POST(self):
+            self._tratar('POST')
+
+        def do_PUT(self):
+            self._tratar('PUT')
+
+        def do_PATCH(self):
+            self._tratar('PATCH')
+
+        def do_DELETE(self):
+            self._tratar('DELETE')
+
+    return Handler
+
+
+def iniciar_servidor(porta=0, atraso=0.0):
+    """Sobe o servidor em uma thread; retorna (servidor, calendario, url_base)"""
+    calendario = CalendarioFalso(atraso=atraso)
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), criar_handler(calendario))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url_base = f'http://127.0.0.1:{servidor.server_address[1]}/'
+    return servidor, calendario, url_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--atraso', type=float, default=0.0, help='latência simulada, em segundos')
+    args = parser.parse_args()
+
+    servidor, _, url_base = iniciar_servidor(args.porta, args.atraso)
+    print(f'Google Calendar falso em {url_base} (Ctrl+C para sair)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""Busca de pacientes com índice full-text (SQLite FTS5).
+
+O índice `paciente_busca` guarda, para cada paciente (rowid = paciente.id),
+o nome e o email sem acentos e em minúsculas e o telefone apenas com dígitos.
+Ele é mantido pelas rotas que gravam pacientes, na mesma transação.
+
+O índice só casa termos pelo começo. Consultas com '@', '.' ou dígitos (pedaços
+de email ou de telefone) voltam ao LIKE da busca antiga quando o índice não
+acha ninguém: 'mail.com', '4321'. Com algum resultado no índice o LIKE não
+roda, porque ele percorre a tabela inteira.
+"""
+import re
+import unicodedata
+
+from sqlalchemy import text
+
+import clinicas
+
+TABELA_INDICE = 'paciente_busca'
+
+# Peso de cada coluna no ranking bm25 (nome, telefone, email)
+PESOS_RANKING = (10.0, 5.0, 2.0)
+
+_PEDACO_DE_CONTATO = re.compile(r'[@.\d]')
+_SOMENTE_TELEFONE = re.compile(r'^[\d\s()+.\-]+$')
+_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar_texto(valor):
+    """Remove acentos e converte para minúsculas ('João' -> 'joao')"""
+    if not valor:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', valor)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return sem_acentos.casefold()
+
+
+def normalizar_telefone(valor):
+    """Mantém apenas os dígitos do telefone ('(11) 98765-4321' -> '11987654321')"""
+    if not valor:
+        return ''
+    return re.sub(r'\D', '', valor)
+
+
+def variantes_telefone(valor):
+    """Retorna o telefone com e sem DDI/DDD, para casar buscas pelo número local"""
+    digitos = normalizar_telefone(valor)
+    variantes = [digitos]
+    if digitos.startswith('55') and len(digitos) >= 12:
+        digitos = digitos[2:]
+        variantes.append(digitos)
+    if len(digitos) >= 10:
+        variantes.append(digitos[2:])
+    return ' '.join(v for v in variantes if v)
+
+
+def fts_disponivel(session):
+    """Verifica se o SQLite em uso foi compilado com FTS5"""
+    try:
+        session.execute(text("SELECT fts5_source_id()"))
+        return True
+    except Exception:
+        session.rollback()
+        return False
+
+
+def indice_existe(session):
+    return session.execute(text("SELECT 1 FROM sqlite_master WHERE name = :nome"),
+                           {'nome': TABELA_INDICE}).first() is not None
+
+
+def fts_ativa(session):
+    """Se o banco atual tem o índice; guardado por banco (cada clínica tem o seu)"""
+    estado = clinicas.estado_do_banco()
+    if estado.get('BUSCA_FTS') is None:
+        estado['BUSCA_FTS'] = fts_disponivel(session) and indice_existe(session)
+    return estado['BUSCA_FTS']
+
+
+def criar_indice(session):
+    """Cria a tabela virtual do índice e a popula se estiver desatualizada"""
+    if not fts_disponivel(session):
+        return False
+
+    session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_INDICE} USING fts5("
+        "nome, telefone, email, "
+        "tokenize = 'unicode61 remove_diacritics 2', "
+        "prefix = '2 3 4')"
+    ))
+
+    total_pacientes = session.execute(text("SELECT COUNT(*) FROM paciente")).scalar()
+    total_indice = session.execute(text(f"SELECT COUNT(*) FROM {TABELA_INDICE}")).scalar()
+    if total_pacientes != total_indice:
+        reconstruir_indice(session)
+
+    session.commit()
+    return True
+
+
+def _linha_indice(paciente_id, nome, telefone, email):
+    return {
+        'id': paciente_id,
+        'nome': normalizar_texto(nome),
+        'telefone': variantes_telefone(telefone),
+        'email': normalizar_texto(email),
+    }
+
+
+def reconstruir_indice(session, tamanho_lote=5000):
+    """Recria o índice inteiro a partir da tabela de pacientes, em lotes"""
+    session.execute(text(f"DELETE FROM {TABELA_INDICE}"))
+
+    ultimo_id = 0
+    while True:
+        linhas = session.execute(
+            text("SELECT id, nome, telefone, email FROM paciente "
+                 "WHERE id > :ultimo ORDER BY id LIMIT :limite"),
+            {'ultimo': ultimo_id, 'limite': tamanho_lote}
+        ).fetchall()
+        if not linhas:
+            break
+
+        session.execute(
+            text(f"INSERT INTO {TABELA_INDICE}(rowid, nome, telefone, email) "
+                 "VALUES (:id, :nome, :telefone, :email)"),
+            [_linha_indice(*linha) for linha in linhas]
+        )
+        ultimo_id = linhas[-1][0]
+
+
+def indexar_paciente(session, paciente):
+    """Atualiza a entrada do paciente no índice (chamar antes do commit)"""
+    indexar(session, paciente.id, paciente.nome, paciente.telefone, paciente.email)
+
+
+def indexar(session, paciente_id, nome, telefone, email):
+    """Como indexar_paciente, para quem inseriu o paciente sem o ORM"""
+    session.execute(text(f"DELETE FROM {TABELA_INDICE} WHERE rowid = :id"), {'id': paciente_id})
+    session.execute(
+        text(f"INSERT INTO {TABELA_INDICE}(rowid, nome, telefone, email) "
+             "VALUES (:id, :nome, :telefone, :email)"),
+        _linha_indice(paciente_id, nome, telefone, email)
+    )
+
+
+def indexar_novos(session, pacientes):
+    """Indexa de uma vez pacientes recém-inseridos: (id, nome, telefone, email)"""
+    if pacientes:
+        session.execute(
+            text(f"INSERT INTO {TABELA_INDICE}(rowid, nome, telefone, email) "
+                 "VALUES (:id, :nome, :telefone, :email)"),
+            [_linha_indice(*paciente) for paciente in pacientes]
+        )
+
+
+def montar_consulta_fts(consulta):
+    """Converte o texto digitado em uma expressão MATCH do FTS5.
+
+    Telefones viram uma busca por prefixo só na coluna telefone; o resto é
+    quebrado em termos, e todos precisam casar (por prefixo) em alguma coluna.
+    """
+    consulta = (consulta or '').strip()
+    if not consulta:
+        return None
+
+    if _SOMENTE_TELEFONE.match(consulta):
+        digitos = normalizar_telefone(consulta)
+        if digitos:
+            return f'telefone : "{digitos}"*'
+        return None
+
+    termos = [t for t in _NAO_ALFANUMERICO.split(normalizar_texto(consulta)) if t]
+    if not termos:
+        return None
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def buscar_ids(session, consulta, limite=10):
+    """Retorna os ids dos pacientes que casam com a consulta, do mais relevante ao menos"""
+    expressao = montar_consulta_fts(consulta)
+    ids = []
+    if expressao:
+        # O bm25 de todos os que casam: cortar antes (na ordem do rowid) deixava
+        # de fora os mais relevantes dos prefixos curtos
+        pesos = ', '.join(str(p) for p in PESOS_RANKING)
+        ids = [linha[0] for linha in session.execute(
+            text(f"SELECT rowid FROM {TABELA_INDICE} WHERE {TABELA_INDICE} MATCH :expressao "
+                 f"ORDER BY bm25({TABELA_INDICE}, {pesos}), rowid LIMIT :limite"),
+            {'expressao': expressao, 'limite': limite}
+        )]
+    if not ids and _PEDACO_DE_CONTATO.search(consulta or ''):
+        ids = buscar_ids_por_trecho(session, consulta.strip(), limite)
+    return ids
+
+
+def buscar_ids_por_trecho(session, consulta, limite):
+    """LIKE '%consulta%' em nome, telefone e email, como a busca sem FTS5"""
+    padrao = '%' + re.sub(r'([\\%_])', r'\\\1', consulta) + '%'
+    return [linha[0] for linha in session.execute(
+        text("SELECT id FROM paciente "
+             "WHERE nome LIKE :p ESCAPE '\\' OR telefone LIKE :p ESCAPE '\\' OR email LIKE :p ESCAPE '\\' "
+             "LIMIT :limite"),
+        {'p': padrao, 'limite': limite}
+    )]
@@ -0,0 +1,251 @@
+"""Importação de eventos do Google Calendar como pacientes e atendimentos.
+
+Os eventos chegam página a página (pageToken) e nunca ficam todos em
+memória. Os pacientes são encontrados por telefone/email normalizados (ou,
+em eventos sem nenhum dos dois, pelo nome normalizado) em um índice em
+memória carregado com uma única query. Os pacientes novos de cada página e
+os atendimentos são inseridos em lote (executemany), com commit a cada
+TAMANHO_TRANSACAO atendimentos.
+"""
+import re
+from collections import defaultdict
+from zoneinfo import ZoneInfo
+
+import busca
+import notas
+from calendar_sync import inicio_do_evento, duracao_do_evento
+from google_calendar import FUSO_HORARIO
+from models import db, Paciente, Atendimento
+
+EVENTOS_POR_PAGINA = 1000
+TAMANHO_TRANSACAO = 500
+
+PROFISSIONAL_PADRAO = 'Importado do Google Calendar'
+TRATAMENTO_PADRAO = 'Importado'
+
+_PREFIXO_RESUMO = re.compile(r'^\s*atendimento\s*-\s*', re.IGNORECASE)
+_CAMPO_DESCRICAO = re.compile(r'^\s*(Paciente|Telefone|Tratamento)\s*:\s*(.+?)\s*$', re.IGNORECASE | re.MULTILINE)
+_TELEFONE = re.compile(r'(?:\+?55\s*)?\(?\d{2}\)?\s*9?\d{4}[\s.-]?\d{4}')
+
+
+def chave_telefone(telefone):
+    """Telefone só com dígitos e sem o DDI 55, para comparar cadastros"""
+    digitos = busca.normalizar_telefone(telefone)
+    if digitos.startswith('55') and len(digitos) >= 12:
+        digitos = digitos[2:]
+    return digitos
+
+
+def chave_email(email):
+    return (email or '').strip().lower()
+
+
+def chave_nome(nome):
+    """Nome sem acentos, em minúsculas e com um espaço entre as palavras"""
+    return ' '.join(busca.normalizar_texto(nome).split())
+
+
+def inserir_pacientes(session, pacientes):
+    """Insere os pacientes (dicionários com as colunas da tabela) em lote; retorna os ids na ordem.
+
+    O RETURNING do SQLite não garante a ordem das linhas e, pedindo ordem, o
+    SQLAlchemy volta a inserir linha a linha. Por isso cada id é casado pelo
+    nome, telefone e email devolvidos junto, que o IndicePacientes já torna
+    distintos dentro do lote (iguais, ficam na ordem dos ids).
+    """
+    if not pacientes:
+        return []
+    tabela = Paciente.__table__
+    resultado = session.execute(
+        tabela.insert().returning(tabela.c.id, tabela.c.nome, tabela.c.telefone, tabela.c.email),
+        pacientes
+    )
+    ids = defaultdict(list)
+    for paciente_id, nome, telefone, email in sorted(resultado.all()):
+        ids[(nome, telefone, email)].append(paciente_id)
+    return [ids[(p['nome'], p['telefone'], p['email'])].pop(0) for p in pacientes]
+
+
+class IndicePacientes:
+    """Mapa telefone/email/nome normalizado -> id do paciente, carregado uma vez"""
+
+    def __init__(self):
+        self.por_telefone = {}
+        self.por_email = {}
+        self.por_nome = {}
+
+    def carregar(self, session):
+        consulta = session.query(Paciente.id, Paciente.nome, Paciente.telefone, Paciente.email)
+        for paciente_id, nome, telefone, email in consulta.yield_per(5000):
+            self.adicionar(paciente_id, nome, telefone, email)
+        return self
+
+    def adicionar(self, paciente_id, nome, telefone, email):
+        if chave_telefone(telefone):
+            self.por_telefone.setdefault(chave_telefone(telefone), paciente_id)
+        if chave_email(email):
+            self.por_email.setdefault(chave_email(email), paciente_id)
+        if chave_nome(nome):
+            self.por_nome.setdefault(chave_nome(nome), paciente_id)
+
+    def procurar(self, nome, telefone, email):
+        """Por telefone e depois email; pelo nome só quando não há nenhum dos dois"""
+        paciente_id = None
+        if chave_telefone(telefone):
+            paciente_id = self.por_telefone.get(chave_telefone(telefone))
+        if paciente_id is None and chave_email(email):
+            paciente_id = self.por_email.get(chave_email(email))
+        if paciente_id is None and not chave_telefone(telefone) and not chave_email(email):
+            # Sem isso, cada evento sem contato criava outro paciente com o mesmo nome
+            paciente_id = self.por_nome.get(chave_nome(nome))
+        return paciente_id
+
+
+def extrair_dados(evento):
+    """Extrai paciente e tratamento de um evento; None se o evento não servir.
+
+    Os eventos criados pelo sistema têm 'Paciente:', 'Telefone:' e
+    'Tratamento:' na descrição; nos demais usa o título e os convidados.
+    """
+    if evento.get('status') == 'cancelled':
+        return None
+    inicio = inicio_do_evento(evento)
+    if inicio is None:
+        return None
+
+    descricao = evento.get('description') or ''
+    campos = {nome.lower(): valor for nome, valor in _CAMPO_DESCRICAO.findall(descricao)}
+
+    nome = campos.get('paciente') or _PREFIXO_RESUMO.sub('', evento.get('summary') or '').strip()
+    if not nome:
+        return None
+
+    telefone = campos.get('telefone')
+    if not telefone:
+        encontrado = _TELEFONE.search(descricao)
+        telefone = encontrado.group(0) if encontrado else ''
+
+    email = ''
+    for convidado in evento.get('attendees') or []:
+        if not convidado.get('self') and not convidado.get('organizer') and convidado.get('email'):
+            email = convidado['email']
+            break
+
+    organizador = (evento.get('organizer') or {}).get('displayName')
+    return {
+        'nome': nome[:100],
+        'telefone': telefone[:20],
+        'email': email[:100] or None,
+        'data_atendimento': inicio,
+        'duracao_minutos': duracao_do_evento(evento) or 60,
+        'tratamento': (campos.get('tratamento') or TRATAMENTO_PADRAO)[:100],
+        'profissional': (organizador or PROFISSIONAL_PADRAO)[:100],
+        'observacoes': None if campos else (descricao or None),
+        'evento_calendar_id': evento['id'],
+    }
+
+
+class ImportadorCalendar:
+    """Importa os eventos do calendário em lotes de tamanho fixo"""
+
+    def __init__(self, service, ao_criar_paciente=None, calendar_id='primary'):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.ao_criar_paciente = ao_criar_paciente
+        self.indice = IndicePacientes()
+        self.pendentes = []
+        self.totais = {'eventos': 0, 'atendimentos': 0, 'pacientes': 0, 'ignorados': 0}
+
+    def importar(self, desde=None):
+        """Percorre todas as páginas de eventos (a partir de `desde`) e retorna os totais.
+
+        `desde` sem fuso é horário local da clínica, como as datas do banco.
+        """
+        self.indice.carregar(db.session)
+
+        parametros = {
+            'calendarId': self.calendar_id,
+            'singleEvents': True,
+            'maxResults': EVENTOS_POR_PAGINA,
+        }
+        if desde:
+            if desde.tzinfo is None:
+                desde = desde.replace(tzinfo=ZoneInfo(FUSO_HORARIO))
+            # RFC 3339 com o deslocamento (-03:00), não a hora local marcada como UTC
+            parametros['timeMin'] = desde.isoformat()
+
+        page_token = None
+        while True:
+            resposta = self.service.events().list(pageToken=page_token, **parametros).execute()
+            self.processar_pagina(resposta.get('items', []))
+            page_token = resposta.get('nextPageToken')
+            if not page_token:
+                break
+
+        self.gravar_pendentes()
+        return self.totais
+
+    def processar_pagina(self, eventos):
+        self.totais['eventos'] += len(eventos)
+        ids = [e['id'] for e in eventos]
+        existentes = {linha[0] for linha in db.session.query(Atendimento.evento_calendar_id).filter(
+            Atendimento.evento_calendar_id.in_(ids)
+        )} if ids else set()
+
+        # Os pacientes novos da página são criados juntos, antes dos atendimentos;
+        # o índice da página evita criar duas vezes quem aparece em vários eventos
+        validos = []
+        novos = []
+        indice_novos = IndicePacientes()
+        for evento in eventos:
+            dados = None if evento['id'] in existentes else extrair_dados(evento)
+            if dados is None:
+                self.totais['ignorados'] += 1
+                continue
+
+            chaves = (dados['nome'], dados['telefone'], dados['email'])
+            paciente_id = self.indice.procurar(*chaves)
+            posicao = None
+            if paciente_id is None:
+                posicao = indice_novos.procurar(*chaves)
+                if posicao is None:
+                    posicao = len(novos)
+                    novos.append(dados)
+                    indice_novos.adicionar(posicao, *chaves)
+            validos.append((dados, paciente_id, posicao))
+
+        ids_novos = self.criar_pacientes(novos)
+        for dados, paciente_id, posicao in validos:
+            self.pendentes.append({
+                'paciente_id': paciente_id if posicao is None else ids_novos[posicao],
+                'data_atendimento': dados['data_atendimento'],
+                'duracao_minutos': dados['duracao_minutos'],
+                'profissional': dados['profissional'],
+                'tratamento': dados['tratamento'],
+                'observacoes': dados['observacoes'],
+                'observacoes_trecho': notas.trecho(dados['observacoes']),
+                'evento_calendar_id': dados['evento_calendar_id'],
+                'status': 'agendado',
+            })
+            if len(self.pendentes) >= TAMANHO_TRANSACAO:
+                self.gravar_pendentes()
+
+    def criar_pacientes(self, novos):
+        """Insere os pacientes novos da página de uma vez; retorna os ids na ordem de `novos`"""
+        ids = inserir_pacientes(db.session, [
+            {'nome': dados['nome'], 'telefone': dados['telefone'], 'email': dados['email']} for dados in novos
+        ])
+        for paciente_id, dados in zip(ids, novos):
+            self.indice.adicionar(paciente_id, dados['nome'], dados['telefone'], dados['email'])
+            if self.ao_criar_paciente:
+                self.ao_criar_paciente(paciente_id, dados)
+        self.totais['pacientes'] += len(ids)
+        return ids
+
+    def gravar_pendentes(self):
+        if self.pendentes:
+            db.session.execute(Atendimento.__table__.insert(), self.pendentes)
+            self.totais['atendimentos'] += len(self.pendentes)
+            self.pendentes = []
+        db.session.commit()
+
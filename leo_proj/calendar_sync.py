@@ -0,0 +1,152 @@
+"""Sincronização de atendimentos com o Google Calendar.
+
+Envio: os eventos são enviados pelo endpoint de batch da API (até 50
+requisições por chamada HTTP), pelo worker da fila (outbox.py), que grava o
+resultado de cada lote antes do próximo.
+
+Recebimento: a listagem de eventos usa o syncToken da execução anterior, de
+modo que só os eventos alterados desde então são transferidos; apenas a
+primeira execução (ou uma com token expirado) percorre o calendário inteiro.
+"""
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from agendamento import DURACAO_MAXIMA
+from google_calendar import montar_evento, montar_evento_recorrente, FUSO_HORARIO
+
+# Limite recomendado pelo Google para requisições em um único batch
+TAMANHO_LOTE = 50
+
+
+def enviar_lote(service, atendimentos, calendar_id='primary'):
+    """Cria os eventos de um lote de atendimentos em uma única requisição batch.
+
+    Retorna (event_ids, erros): dicionários indexados pelo id do atendimento.
+    """
+    event_ids = {}
+    erros = {}
+
+    def ao_responder(request_id, resposta, erro):
+        atendimento_id = int(request_id)
+        if erro is not None:
+            erros[atendimento_id] = erro
+        else:
+            event_ids[atendimento_id] = resposta.get('id')
+
+    batch = service.new_batch_http_request(callback=ao_responder)
+    for atendimento in atendimentos:
+        evento = montar_evento(atendimento.paciente, atendimento)
+        batch.add(
+            service.events().insert(calendarId=calendar_id, body=evento),
+            request_id=str(atendimento.id)
+        )
+    batch.execute()
+    return event_ids, erros
+
+
+def enviar_plano(service, plano, primeiro, recorrencia, calendar_id='primary'):
+    """Cria o evento recorrente de um plano de tratamento e retorna o seu id"""
+    evento = montar_evento_recorrente(primeiro.paciente, primeiro, plano, recorrencia)
+    return service.events().insert(calendarId=calendar_id, body=evento).execute()['id']
+
+
+def id_da_instancia(evento_id, inicio):
+    """Id que o Google dá à ocorrência de um evento recorrente que começa em `inicio` (horário local)"""
+    inicio_utc = inicio.replace(tzinfo=ZoneInfo(FUSO_HORARIO)).astimezone(timezone.utc)
+    return f'{evento_id}_{inicio_utc:%Y%m%dT%H%M%SZ}'
+
+
+# Eventos por página na listagem incremental (máximo aceito pela API: 2500)
+EVENTOS_POR_PAGINA = 250
+
+
+class SyncTokenExpirado(Exception):
+    """O Google invalidou o syncToken (HTTP 410); é preciso sincronizar do zero"""
+
+
+def listar_alteracoes(service, sync_token, ao_receber_pagina, calendar_id='primary'):
+    """Percorre os eventos alterados desde `sync_token` (ou todos, se None).
+
+    Cada página é entregue a `ao_receber_pagina(eventos)` assim que chega.
+    Retorna o nextSyncToken para a próxima execução.
+    """
+    from googleapiclient.errors import HttpError
+
+    parametros = {
+        'calendarId': calendar_id,
+        'singleEvents': True,
+        'maxResults': EVENTOS_POR_PAGINA,
+    }
+    if sync_token:
+        parametros['syncToken'] = sync_token
+        parametros['showDeleted'] = True
+
+    page_token = None
+    while True:
+        try:
+            resposta = service.events().list(pageToken=page_token, **parametros).execute()
+        except HttpError as e:
+            if e.resp.status == 410:
+                raise SyncTokenExpirado()
+            raise
+
+        ao_receber_pagina(resposta.get('items', []))
+        page_token = resposta.get('nextPageToken')
+        if not page_token:
+            return resposta.get('nextSyncToken')
+
+
+def _horario_do_evento(evento, campo):
+    valor = evento.get(campo, {}).get('dateTime')
+    if not valor:
+        return None  # Evento de dia inteiro
+    data = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    if data.tzinfo is not None:
+        data = data.astimezone(ZoneInfo(FUSO_HORARIO)).replace(tzinfo=None)
+    return data
+
+
+def inicio_do_evento(evento):
+    """Início do evento no horário local da clínica (naive, como no banco)"""
+    return _horario_do_evento(evento, 'start')
+
+
+def duracao_do_evento(evento):
+    """Duração do evento em minutos (até DURACAO_MAXIMA), ou None em eventos de dia inteiro"""
+    inicio = _horario_do_evento(evento, 'start')
+    fim = _horario_do_evento(evento, 'end')
+    if inicio is None or fim is None or fim <= inicio:
+        return None
+    return min(int((fim - inicio).total_seconds() // 60), DURACAO_MAXIMA)
+
+
+def reconciliar_eventos(eventos, atendimentos_por_evento):
+    """Aplica aos atendimentos as mudanças feitas no Google Calendar.
+
+    Eventos cancelados cancelam o atendimento e eventos movidos (ou com a
+    duração alterada) atualizam data_atendimento e duracao_minutos.
+    Retorna (movidos, cancelados).
+    """
+    movidos = cancelados = 0
+    for evento in eventos:
+        atendimento = atendimentos_por_evento.get(evento['id'])
+        if atendimento is None:
+            continue
+
+        if evento.get('status') == 'cancelled':
+            if atendimento.status != 'cancelado':
+                atendimento.status = 'cancelado'
+                cancelados += 1
+            continue
+
+        inicio = inicio_do_evento(evento)
+        duracao = duracao_do_evento(evento)
+        movido = False
+        if inicio and inicio != atendimento.data_atendimento:
+            atendimento.data_atendimento = inicio
+            movido = True
+        if duracao and duracao != atendimento.duracao_minutos:
+            atendimento.duracao_minutos = duracao
+            movido = True
+        movidos += movido
+    return movidos, cancelados
@@ -0,0 +1,276 @@
+"""Várias clínicas: um banco SQLite por clínica, escolhido a cada requisição.
+
+Sem CLINICAS_ARQUIVO o app atende uma clínica só, no banco de
+SQLALCHEMY_DATABASE_URI, como sempre. Com ele, o arquivo JSON lista as
+clínicas (`flask criar-clinica` acrescenta uma):
+
+    {"centro": {"nome": "Clínica Centro", "banco": "sqlite:////dados/centro.db"},
+     "norte": {"nome": "Clínica Norte"}}
+
+Sem "banco", o arquivo da clínica fica em CLINICAS_PASTA/<slug>.db. Cada
+clínica grava no seu arquivo, sem esperar o lock de escrita das outras, e
+os dados (inclusive as credenciais do Google Calendar) ficam separados.
+
+A clínica da requisição vem só do cabeçalho CLINICAS_CABECALHO (por
+exemplo X-Clinica), definido pelo proxy que autentica o usuário e sabe a
+qual clínica ele pertence. O proxy deve sempre sobrescrever o cabeçalho:
+o navegador não escolhe a clínica. Sem o cabeçalho, a requisição é
+recusada. SessaoPorClinica manda as consultas de db.session para o engine
+da clínica atual (g.clinica).
+
+Os engines são criados sob demanda, cada um com um pool pequeno
+(CLINICAS_POOL), e guardados num LRU de até CLINICAS_MAXIMO_ENGINES: ao
+passar do limite o menos usado é fechado (dispose), e as conexões abertas
+não crescem com o número de clínicas.
+
+Workers, comandos e consultas de administração entram no banco de uma
+clínica com `contexto(app, slug)`; `para_cada()` roda uma função em todas
+as clínicas em paralelo.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import g, current_app, has_app_context, request, abort
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+
+import database
+import metricas
+
+logger = logging.getLogger(__name__)
+
+SLUG_VALIDO = re.compile(r'^[a-z0-9][a-z0-9-]{0,39}$')
+
+# Rotas atendidas sem clínica
+ENDPOINTS_LIVRES = {'static', 'metrics'}
+
+
+def atual():
+    """Slug da clínica do contexto atual (None com uma clínica só ou fora de um contexto).
+
+    Fora das requisições e de `usar()`, vale a clínica de CLINICA (comandos como
+    `CLINICA=centro flask importar-pacientes ...`).
+    """
+    if not has_app_context():
+        return None
+    return g.get('clinica') or current_app.config.get('CLINICA')
+
+
+def slugs(app):
+    """Clínicas do app; [None], o banco único, sem CLINICAS_ARQUIVO"""
+    clinicas = app.extensions.get('clinicas')
+    return list(clinicas.catalogo) if clinicas and clinicas.ativas else [None]
+
+
+def contexto(app, slug):
+    """Contexto do app no banco da clínica (no banco único, com slug None)"""
+    if slug is None:
+        return app.app_context()
+    return app.extensions['clinicas'].usar(slug)
+
+
+def estado_do_banco():
+    """Dicionário com o que vale só para o banco atual (ex.: BUSCA_FTS).
+
+    Com várias clínicas ele fica junto do engine da clínica no LRU e some
+    com ele; com um banco só, é a própria configuração do app.
+    """
+    clinicas = current_app.extensions.get('clinicas')
+    if clinicas is not None and clinicas.ativas:
+        return clinicas.estado(_slug_obrigatorio())
+    return current_app.config
+
+
+def _slug_obrigatorio():
+    slug = atual()
+    if slug is None:
+        # Com várias clínicas o banco padrão não guarda dados de ninguém
+        raise RuntimeError('Nenhuma clínica escolhida: use clinicas.usar(slug) ou defina CLINICA')
+    return slug
+
+
+def ler_catalogo(arquivo, pasta):
+    """{slug: {'nome', 'banco'}} do arquivo JSON, com o banco padrão preenchido"""
+    if not os.path.exists(arquivo):
+        return {}
+    with open(arquivo, encoding='utf-8') as f:
+        dados = json.load(f)
+    catalogo = {}
+    for slug, clinica in dados.items():
+        catalogo[slug] = {
+            'nome': clinica.get('nome') or slug,
+            'banco': clinica.get('banco') or f"sqlite:///{os.path.join(pasta, slug + '.db')}",
+        }
+    return catalogo
+
+
+class SessaoPorClinica(Session):
+    """Sessão do Flask-SQLAlchemy que consulta o banco da clínica atual"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        clinicas = current_app.extensions.get('clinicas')
+        if bind is None and clinicas is not None and clinicas.ativas:
+            return clinicas.engine(_slug_obrigatorio())
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class GerenciadorClinicas:
+    """Catálogo das clínicas e engines de cada banco, no estilo das extensões do Flask"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.arquivo = None
+        self.cabecalho = None
+        self.pasta = None
+        self.catalogo = {}
+        self.maximo_engines = 32
+        self.pool = 4
+        self.simultaneas = 8
+        # slug -> (engine, estado do banco), do menos ao mais usado
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['clinicas'] = self
+        self.arquivo = app.config.get('CLINICAS_ARQUIVO')
+        if not self.arquivo:
+            return
+        self.cabecalho = app.config.get('CLINICAS_CABECALHO')
+        if not self.cabecalho:
+            raise RuntimeError('CLINICAS_ARQUIVO exige CLINICAS_CABECALHO, o cabeçalho com a clínica '
+                               'definido pelo proxy que autentica os usuários')
+        self.pasta = app.config.get('CLINICAS_PASTA') or os.path.join(app.instance_path, 'clinicas')
+        os.makedirs(self.pasta, exist_ok=True)
+        self.maximo_engines = app.config.get('CLINICAS_MAXIMO_ENGINES', self.maximo_engines)
+        self.pool = app.config.get('CLINICAS_POOL', self.pool)
+        self.simultaneas = app.config.get('CLINICAS_SIMULTANEAS', self.simultaneas)
+        self.catalogo = ler_catalogo(self.arquivo, self.pasta)
+        app.before_request(self._escolher_clinica)
+
+    @property
+    def ativas(self):
+        return bool(self.arquivo)
+
+    def nome(self, slug):
+        return self.catalogo[slug]['nome'] if slug in self.catalogo else None
+
+    # --- Requisições ---------------------------------------------------
+
+    def _escolher_clinica(self):
+        slug = request.headers.get(self.cabecalho)
+        if slug is None:
+            if request.endpoint in ENDPOINTS_LIVRES:
+                return None
+            abort(400, 'Clínica não informada pelo proxy')
+        if slug not in self.catalogo:
+            abort(404)
+        g.clinica = slug
+        return None
+
+    # --- Engines -------------------------------------------------------
+
+    def engine(self, slug):
+        """Engine do banco da clínica; cria se preciso e fecha o menos usado acima do limite"""
+        return self._entrada(slug)[0]
+
+    def estado(self, slug):
+        """O que vale só para o banco da clínica (ver estado_do_banco())"""
+        return self._entrada(slug)[1]
+
+    def _entrada(self, slug):
+        with self._lock:
+            entrada = self._engines.get(slug)
+            if entrada is not None:
+                self._engines.move_to_end(slug)
+                return entrada
+            if slug not in self.catalogo:
+                raise KeyError(f'Clínica desconhecida: {slug}')
+            entrada = (self._criar_engine(self.catalogo[slug]['banco']), {})
+            self._engines[slug] = entrada
+            while len(self._engines) > self.maximo_engines:
+                antigo, (descartado, _) = self._engines.popitem(last=False)
+                # Conexões em uso seguem até serem devolvidas; as livres fecham agora
+                descartado.dispose()
+                logger.info('Engine da clínica %s fechado (limite de %d)', antigo, self.maximo_engines)
+            return entrada
+
+    def _criar_engine(self, banco):
+        opcoes = {}
+        if banco.startswith('sqlite'):
+            opcoes = database.opcoes_engine()
+            opcoes.update(pool_size=self.pool, max_overflow=self.pool * 2)
+        engine = create_engine(banco, **opcoes)
+        database.registrar_pragmas(engine)
+        metricas.instrumentar_engine(engine)
+        return engine
+
+    def engines_abertos(self):
+        with self._lock:
+            return list(self._engines)
+
+    def fechar_engines(self):
+        with self._lock:
+            while self._engines:
+                self._engines.popitem()[1][0].dispose()
+
+    # --- Contextos -----------------------------------------------------
+
+    @contextmanager
+    def usar(self, slug):
+        """Contexto do app em que db.session consulta o banco da clínica `slug`"""
+        if slug not in self.catalogo:
+            raise KeyError(f'Clínica desconhecida: {slug}')
+        with self.app.app_context():
+            g.clinica = slug
+            yield self.catalogo[slug]
+
+    def para_cada(self, funcao, simultaneas=None):
+        """Roda `funcao()` no banco de cada clínica, em paralelo.
+
+        Retorna {slug: resultado}; onde a função falhou, o resultado é a exceção.
+        """
+        def rodar(slug):
+            try:
+                with self.usar(slug):
+                    return funcao()
+            except Exception as e:
+                logger.exception('Erro na clínica %s', slug)
+                return e
+
+        todas = list(self.catalogo)
+        if not todas:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(simultaneas or self.simultaneas, len(todas)),
+                                thread_name_prefix='clinicas') as executor:
+            return dict(zip(todas, executor.map(rodar, todas)))
+
+    # --- Cadastro ------------------------------------------------------
+
+    def adicionar(self, slug, nome, banco=None):
+        """Acrescenta a clínica ao catálogo e grava o arquivo (o banco é criado por quem chama)"""
+        if not SLUG_VALIDO.match(slug):
+            raise ValueError('Use letras minúsculas, números e hífen no identificador da clínica')
+        if slug in self.catalogo:
+            raise ValueError(f'A clínica {slug} já existe')
+        dados = {}
+        if os.path.exists(self.arquivo):
+            with open(self.arquivo, encoding='utf-8') as f:
+                dados = json.load(f)
+        dados[slug] = {'nome': nome}
+        if banco:
+            dados[slug]['banco'] = banco
+        temporario = f'{self.arquivo}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, self.arquivo)
+        self.catalogo = ler_catalogo(self.arquivo, self.pasta)
+        return self.catalogo[slug]
@@ -0,0 +1,60 @@
+"""Configuração do banco SQLite para uso com vários usuários ao mesmo tempo.
+
+- WAL: leituras não bloqueiam a escrita e vice-versa;
+- synchronous=NORMAL: seguro com WAL e bem mais rápido que FULL;
+- busy_timeout: espera o lock em vez de falhar com 'database is locked';
+- cache e mmap maiores para as leituras frequentes.
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+URI_PADRAO = 'sqlite:///pacientes.db'
+
+# Tempo máximo esperando o lock de escrita, em milissegundos
+ESPERA_LOCK_MS = 15000
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': ESPERA_LOCK_MS,
+    'cache_size': -32000,          # ~32 MB por conexão (valor negativo = KiB)
+    'mmap_size': 268435456,        # 256 MB
+    'temp_store': 'MEMORY',
+}
+
+
+def opcoes_engine():
+    """Opções do create_engine para SQLite com pool de conexões entre threads"""
+    return {
+        'poolclass': QueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'connect_args': {
+            'timeout': ESPERA_LOCK_MS / 1000,
+            'check_same_thread': False,
+        },
+    }
+
+
+def configurar(app):
+    """Preenche a configuração do Flask-SQLAlchemy (antes do db.init_app)"""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', os.environ.get('DATABASE_URL', URI_PADRAO))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', opcoes_engine())
+
+
+def registrar_pragmas(engine):
+    """Aplica os PRAGMAS a cada nova conexão do engine"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def aplicar_pragmas(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        for nome, valor in PRAGMAS.items():
+            cursor.execute(f'PRAGMA {nome}={valor}')
+        cursor.close()
@@ -0,0 +1,273 @@
+"""Pacientes duplicados: chaves de bloqueio, candidatos no cadastro e fusão em lote.
+
+Cada paciente tem em `paciente_chave` até três chaves:
+
+- telefone: os 8 últimos dígitos (iguais com ou sem DDI/DDD e em qualquer formato);
+- email: sem acentos e em minúsculas;
+- nome: código fonético do primeiro e do último nome (ver codigo_fonetico).
+
+Só os pacientes que compartilham alguma chave são comparados entre si
+(busca no índice por (tipo, chave)), em vez de comparar cada cadastro com a
+tabela inteira. As chaves são mantidas pelas rotas que gravam pacientes e
+apagadas por trigger quando o paciente é excluído (migração 0009).
+
+A fusão em lote só junta quem tem telefone ou email em comum e nome
+parecido: homônimos com contatos diferentes ficam para a recepção decidir.
+"""
+import difflib
+import functools
+import logging
+import re
+
+from sqlalchemy import text
+
+import busca
+from models import db, Paciente, PacienteChave
+
+logger = logging.getLogger(__name__)
+
+# Semelhança mínima entre os nomes (0 a 1) para considerar a mesma pessoa
+LIMIAR_NOME = 0.85
+
+# Blocos maiores que isto (ex.: telefone da própria clínica usado como
+# contato de muitos pacientes) não são comparados na fusão em lote
+MAXIMO_BLOCO = 50
+
+MAXIMO_CANDIDATOS = 5
+
+PARTICULAS = {'de', 'da', 'do', 'das', 'dos', 'e'}
+
+# Regras do código fonético, aplicadas em ordem (texto já sem acentos)
+REGRAS_FONETICAS = (
+    (r'ph', 'f'), (r'th', 't'), (r'lh', 'l'), (r'nh', 'n'), (r'[cs]h', 'x'),
+    (r'[sx]c(?=[ei])', 's'), (r'c(?=[ei])', 's'), (r'c', 'k'), (r'g(?=[ei])', 'j'),
+    (r'qu(?=[ei])', 'k'), (r'gu(?=[ei])', 'g'), (r'q', 'k'),
+    (r'y', 'i'), (r'w', 'v'), (r'z', 's'), (r'h', ''),
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def codigo_fonetico(palavra):
+    """Código de uma palavra pela pronúncia em português ('Luiz' e 'Luís' -> 'ls')"""
+    codigo = busca.normalizar_texto(palavra.replace('ç', 's').replace('Ç', 's'))
+    codigo = re.sub(r'[^a-z]', '', codigo)
+    for padrao, troca in REGRAS_FONETICAS:
+        codigo = re.sub(padrao, troca, codigo)
+    codigo = re.sub(r'(.)\1+', r'\1', codigo)
+    return codigo[:1] + re.sub(r'[aeiou]', '', codigo[1:])
+
+
+def partes_do_nome(nome):
+    return [p for p in busca.normalizar_texto(nome).split() if p not in PARTICULAS]
+
+
+def chave_nome(nome):
+    partes = partes_do_nome(nome)
+    if not partes:
+        return ''
+    if len(partes) == 1:
+        return codigo_fonetico(partes[0])
+    return f'{codigo_fonetico(partes[0])} {codigo_fonetico(partes[-1])}'
+
+
+def chave_telefone(telefone):
+    digitos = busca.normalizar_telefone(telefone)
+    return digitos[-8:] if len(digitos) >= 8 else ''
+
+
+def chave_email(email):
+    return busca.normalizar_texto(email).strip()
+
+
+def chaves(nome, telefone, email):
+    """[(tipo, chave)] de um paciente, sem as vazias"""
+    pares = (('telefone', chave_telefone(telefone)), ('email', chave_email(email)), ('nome', chave_nome(nome)))
+    return [(tipo, chave) for tipo, chave in pares if chave]
+
+
+def semelhanca_nomes(nome_a, nome_b):
+    """A maior entre a semelhança da grafia e a dos códigos fonéticos ('Luiz Souza' e 'Luís Sousa': 1)"""
+    partes_a, partes_b = partes_do_nome(nome_a), partes_do_nome(nome_b)
+    grafia = difflib.SequenceMatcher(None, ' '.join(partes_a), ' '.join(partes_b)).ratio()
+    pronuncia = difflib.SequenceMatcher(None, ' '.join(map(codigo_fonetico, partes_a)),
+                                        ' '.join(map(codigo_fonetico, partes_b))).ratio()
+    return max(grafia, pronuncia)
+
+
+def comparar(a, b):
+    """Compara dois pacientes (nome, telefone, email); retorna (nota 0..1, motivos)"""
+    motivos = []
+    if chave_telefone(a[1]) and chave_telefone(a[1]) == chave_telefone(b[1]):
+        motivos.append('telefone')
+    if chave_email(a[2]) and chave_email(a[2]) == chave_email(b[2]):
+        motivos.append('email')
+    nome = semelhanca_nomes(a[0], b[0])
+    # A mesma chave de bloqueio ('José Lopes Santana' e 'José Santana') também conta
+    if nome >= LIMIAR_NOME or (chave_nome(a[0]) and chave_nome(a[0]) == chave_nome(b[0])):
+        motivos.append('nome')
+    nota = 0.6 * nome + 0.3 * ('telefone' in motivos) + 0.1 * ('email' in motivos)
+    return nota, motivos
+
+
+def mesma_pessoa(a, b):
+    """Critério da fusão automática: contato em comum e nome parecido"""
+    _, motivos = comparar(a, b)
+    return 'nome' in motivos and ('telefone' in motivos or 'email' in motivos)
+
+
+# --- Índice ------------------------------------------------------------
+
+def indexar(session, paciente_id, nome, telefone, email):
+    """Atualiza as chaves do paciente (chamar antes do commit)"""
+    session.execute(text("DELETE FROM paciente_chave WHERE paciente_id = :id"), {'id': paciente_id})
+    indexar_novos(session, [(paciente_id, nome, telefone, email)])
+
+
+def indexar_paciente(session, paciente):
+    indexar(session, paciente.id, paciente.nome, paciente.telefone, paciente.email)
+
+
+def indexar_novos(session, pacientes):
+    """Grava de uma vez as chaves de pacientes recém-inseridos: (id, nome, telefone, email)"""
+    linhas = [{'tipo': tipo, 'chave': chave, 'paciente_id': paciente_id}
+              for paciente_id, nome, telefone, email in pacientes
+              for tipo, chave in chaves(nome, telefone, email)]
+    if linhas:
+        session.execute(PacienteChave.__table__.insert(), linhas)
+
+
+def reconstruir_indice(session, tamanho_lote=5000):
+    """Recria as chaves de todos os pacientes, em lotes"""
+    session.execute(text("DELETE FROM paciente_chave"))
+    ultimo_id = 0
+    while True:
+        linhas = session.execute(
+            text("SELECT id, nome, telefone, email FROM paciente WHERE id > :ultimo ORDER BY id LIMIT :limite"),
+            {'ultimo': ultimo_id, 'limite': tamanho_lote}
+        ).fetchall()
+        if not linhas:
+            break
+        indexar_novos(session, linhas)
+        ultimo_id = linhas[-1][0]
+
+
+def criar_indice(session):
+    """Popula as chaves se houver pacientes sem elas (bancos antigos, cargas diretas no banco)"""
+    sem_chave = session.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM paciente p WHERE NOT EXISTS "
+        "(SELECT 1 FROM paciente_chave c WHERE c.paciente_id = p.id))"
+    )).scalar()
+    if sem_chave:
+        reconstruir_indice(session)
+        session.commit()
+
+
+# --- Candidatos no cadastro --------------------------------------------
+
+def candidatos(nome, telefone, email, ignorar_id=None, limite=MAXIMO_CANDIDATOS):
+    """Pacientes já cadastrados que podem ser a mesma pessoa: [(paciente, nota, motivos)]"""
+    # Uma consulta limitada por chave: num OR só com um limite, um nome comum
+    # ('js sl') podia ocupar todas as linhas antes do telefone ou do email iguais
+    ids = set()
+    for tipo, chave in chaves(nome, telefone, email):
+        ids.update(linha[0] for linha in db.session.query(PacienteChave.paciente_id).filter(
+            PacienteChave.tipo == tipo, PacienteChave.chave == chave
+        ).limit(MAXIMO_BLOCO))
+    ids.discard(ignorar_id)
+    if not ids:
+        return []
+
+    novo = (nome, telefone, email)
+    encontrados = []
+    for paciente in Paciente.query.filter(Paciente.id.in_(ids)):
+        nota, motivos = comparar(novo, (paciente.nome, paciente.telefone, paciente.email))
+        if motivos:
+            encontrados.append((paciente, nota, motivos))
+    encontrados.sort(key=lambda c: c[1], reverse=True)
+    return encontrados[:limite]
+
+
+# --- Fusão em lote -----------------------------------------------------
+
+def blocos(session, tipos=('telefone', 'email')):
+    """Gera (tipo, chave, [ids]) das chaves compartilhadas por mais de um paciente"""
+    for tipo in tipos:
+        linhas = session.execute(text(
+            "SELECT chave, paciente_id FROM paciente_chave WHERE tipo = :tipo AND chave IN ("
+            "SELECT chave FROM paciente_chave WHERE tipo = :tipo GROUP BY chave HAVING COUNT(*) > 1"
+            ") ORDER BY chave, paciente_id"), {'tipo': tipo})
+        atual, ids = None, []
+        for chave, paciente_id in linhas:
+            if chave != atual:
+                if ids:
+                    yield tipo, atual, ids
+                atual, ids = chave, []
+            ids.append(paciente_id)
+        if ids:
+            yield tipo, atual, ids
+
+
+def encontrar_grupos(session):
+    """Grupos de pacientes que são a mesma pessoa, em ordem de id (o primeiro é o mais antigo)"""
+    pais = {}
+
+    def raiz(x):
+        while pais.get(x, x) != x:
+            pais[x] = pais.get(pais[x], pais[x])
+            x = pais[x]
+        return x
+
+    dados = {}
+    for tipo, chave, ids in blocos(session):
+        if len(ids) > MAXIMO_BLOCO:
+            logger.warning('Chave %s %r compartilhada por %d pacientes: ignorada', tipo, chave, len(ids))
+            continue
+        faltando = [i for i in ids if i not in dados]
+        if faltando:
+            for linha in session.execute(text(
+                    "SELECT id, nome, telefone, email FROM paciente WHERE id IN (%s)" % ','.join(map(str, faltando)))):
+                dados[linha[0]] = linha[1:]
+        for posicao, a in enumerate(ids):
+            for b in ids[posicao + 1:]:
+                if raiz(a) != raiz(b) and mesma_pessoa(dados[a], dados[b]):
+                    pais[max(raiz(a), raiz(b))] = min(raiz(a), raiz(b))
+
+    grupos = {}
+    for paciente_id in pais:
+        grupos.setdefault(raiz(paciente_id), set()).add(paciente_id)
+    return sorted(sorted(grupo | {principal}) for principal, grupo in grupos.items())
+
+
+def mesclar(session, principal_id, duplicados_ids, indexar_busca=False):
+    """Passa atendimentos e planos dos duplicados para o principal e os exclui.
+
+    Campos vazios do principal são preenchidos com os dos duplicados, e
+    observações médicas diferentes são acrescentadas. O commit é de quem chama.
+    """
+    duplicados_ids = [i for i in duplicados_ids if i != principal_id]
+    if not duplicados_ids:
+        return
+    principal = session.get(Paciente, principal_id)
+    for duplicado in Paciente.query.filter(Paciente.id.in_(duplicados_ids)).order_by(Paciente.id):
+        principal.email = principal.email or duplicado.email
+        principal.endereco = principal.endereco or duplicado.endereco
+        if duplicado.observacoes_medicas and duplicado.observacoes_medicas not in (principal.observacoes_medicas or ''):
+            principal.observacoes_medicas = '\n'.join(
+                filter(None, [principal.observacoes_medicas, duplicado.observacoes_medicas]))
+        if duplicado.data_cadastro and (principal.data_cadastro is None or duplicado.data_cadastro < principal.data_cadastro):
+            principal.data_cadastro = duplicado.data_cadastro
+    session.flush()
+
+    parametros = {'principal': principal_id}
+    lista = ','.join(str(int(i)) for i in duplicados_ids)
+    # Os triggers da 0004 movem os totais de paciente_resumo/paciente_tratamento
+    session.execute(text(f"UPDATE atendimento SET paciente_id = :principal WHERE paciente_id IN ({lista})"), parametros)
+    session.execute(text(f"UPDATE plano_tratamento SET paciente_id = :principal WHERE paciente_id IN ({lista})"), parametros)
+    session.execute(text(f"DELETE FROM paciente_resumo WHERE paciente_id IN ({lista})"))
+    session.execute(text(f"DELETE FROM paciente_tratamento WHERE paciente_id IN ({lista})"))
+    if indexar_busca:
+        session.execute(text(f"DELETE FROM {busca.TABELA_INDICE} WHERE rowid IN ({lista})"))
+        busca.indexar_paciente(session, principal)
+    # As chaves dos excluídos saem pelo trigger da 0009
+    session.execute(text(f"DELETE FROM paciente WHERE id IN ({lista})"))
+    indexar_paciente(session, principal)
@@ -0,0 +1,90 @@
+"""Contadores da página de status do Google Calendar, em cache.
+
+Os dois contadores saem de uma única consulta, e o "hoje" é um intervalo
+de datas (usa o índice de data_atendimento, ao contrário de date(...)).
+O nome da conta Google é buscado em segundo plano e guardado por
+VALIDADE_CONTA: a página nunca espera pelo Google.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, time as hora, timedelta
+
+from models import db, Atendimento
+
+logger = logging.getLogger(__name__)
+
+VALIDADE_CONTADORES = 60     # segundos; as gravações do app também invalidam
+VALIDADE_CONTA = 3600
+ESPERA_APOS_FALHA = 60
+
+
+def contar_eventos(hoje):
+    """Retorna (total_sincronizados, sincronizados_hoje) em uma consulta"""
+    inicio = datetime.combine(hoje, hora.min)
+    sincronizados = Atendimento.evento_calendar_id.isnot(None)
+    total = db.session.query(db.func.count(Atendimento.id)).filter(sincronizados)
+    de_hoje = total.filter(
+        Atendimento.data_atendimento >= inicio,
+        Atendimento.data_atendimento < inicio + timedelta(days=1)
+    )
+    return db.session.query(total.scalar_subquery(), de_hoje.scalar_subquery()).one()
+
+
+class EstatisticasCalendar:
+    """Cache dos contadores e do resumo da conta; thread-safe"""
+
+    def __init__(self, obter_servico):
+        self.obter_servico = obter_servico
+        self._lock = threading.Lock()
+        self._contadores = None      # (dia, expira_em, valores)
+        self._conta = None           # (expira_em, resumo)
+        self._atualizando_conta = False
+
+    def contadores(self):
+        hoje = datetime.now().date()
+        agora = time.monotonic()
+        with self._lock:
+            cache = self._contadores
+        if cache and cache[0] == hoje and cache[1] > agora:
+            return cache[2]
+
+        valores = tuple(contar_eventos(hoje))
+        with self._lock:
+            self._contadores = (hoje, agora + VALIDADE_CONTADORES, valores)
+        return valores
+
+    def conta(self):
+        """Resumo do calendário em cache (ou None); se vencido, atualiza em segundo plano"""
+        with self._lock:
+            cache = self._conta
+            vencido = cache is None or cache[0] <= time.monotonic()
+            if vencido and not self._atualizando_conta:
+                self._atualizando_conta = True
+                threading.Thread(target=self._atualizar_conta, daemon=True).start()
+        return cache[1] if cache else None
+
+    def _atualizar_conta(self):
+        resumo = None
+        try:
+            service = self.obter_servico()
+            if service:
+                resumo = service.calendars().get(calendarId='primary').execute().get('summary')
+        except Exception:
+            logger.exception('Erro ao obter informações do calendar')
+        with self._lock:
+            if resumo:
+                self._conta = (time.monotonic() + VALIDADE_CONTA, resumo)
+            else:
+                # Mantém o valor antigo e só tenta de novo depois de um tempo
+                anterior = self._conta[1] if self._conta else None
+                self._conta = (time.monotonic() + ESPERA_APOS_FALHA, anterior)
+            self._atualizando_conta = False
+
+    def invalidar_contadores(self):
+        with self._lock:
+            self._contadores = None
+
+    def invalidar_conta(self):
+        with self._lock:
+            self._conta = None
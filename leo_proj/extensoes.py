@@ -0,0 +1,23 @@
+"""Extensões compartilhadas pelos blueprints, ligadas ao app em aplicacao.create_app()"""
+from cache_respostas import CacheRespostas
+from clinicas import GerenciadorClinicas
+from integracao_calendar import IntegracaoCalendar
+from lembretes import ServicoLembretes
+
+# Um banco por clínica (opcional: ver CLINICAS_* em aplicacao.py)
+clinicas = GerenciadorClinicas()
+
+# Respostas das rotas de leitura, invalidadas a cada gravação
+cache = CacheRespostas()
+
+# Google Calendar (opcional: ver GOOGLE_CALENDAR em aplicacao.py)
+calendar = IntegracaoCalendar()
+
+# Lembretes por email/webhook (opcionais: ver LEMBRETES_* em aplicacao.py)
+lembretes = ServicoLembretes()
+
+
+def dados_alterados():
+    """Descarta o que foi calculado em cache; chamar depois de cada gravação"""
+    cache.nova_versao()
+    calendar.dados_alterados()
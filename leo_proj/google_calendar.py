@@ -0,0 +1,195 @@
+"""Construção do serviço do Google Calendar e dos eventos de atendimento.
+
+As bibliotecas do Google (~300 ms de importação) só são importadas quando um
+serviço ou credencial é de fato criado: instalações que nunca conectam o
+Calendar não pagam esse custo na subida de cada processo.
+"""
+import copy
+import functools
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import metricas
+
+logger = logging.getLogger(__name__)
+
+FUSO_HORARIO = 'America/Sao_Paulo'
+
+# Renova o token de acesso com esta antecedência em relação à expiração
+ANTECEDENCIA_RENOVACAO = timedelta(minutes=5)
+
+# Espera antes de tentar de novo quando a renovação em segundo plano falha
+ESPERA_APOS_FALHA = 60
+
+
+@functools.lru_cache(maxsize=None)
+def _documento_discovery():
+    """Documento de discovery do Calendar v3 que vem com a biblioteca (sem acesso à rede)"""
+    from googleapiclient.discovery_cache import get_static_doc
+    return json.loads(get_static_doc('calendar', 'v3'))
+
+
+def construir_servico(credentials=None, url_base=None):
+    """Cria o serviço a partir do documento de discovery que vem com a biblioteca.
+
+    `url_base` troca o endereço da API (inclusive o endpoint de batch), para
+    apontar o serviço para um servidor local que imita o Google Calendar.
+    Todas as chamadas passam por metricas.HttpMedido.
+    """
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.http import build_http
+
+    documento = _documento_discovery()
+    if url_base:
+        documento = copy.deepcopy(documento)
+        documento['rootUrl'] = url_base.rstrip('/') + '/'
+    http = build_http()
+    if credentials is not None:
+        http = AuthorizedHttp(credentials, http=http)
+    return build_from_document(documento, http=metricas.HttpMedido(http))
+
+
+class CacheServicoCalendar:
+    """Credenciais e serviço do Google Calendar compartilhados pelo processo.
+
+    As credenciais são lidas do banco uma vez e renovadas em segundo plano
+    antes de expirar. O objeto de serviço usa um httplib2.Http que não é
+    thread-safe, então cada thread recebe o seu, criado a partir das mesmas
+    credenciais. `invalidar()` descarta tudo (após conectar ou desconectar).
+    """
+
+    def __init__(self, carregar_credenciais, salvar_credenciais, scopes, url_base=None):
+        self._carregar_credenciais = carregar_credenciais
+        self._salvar_credenciais = salvar_credenciais
+        self._scopes = scopes
+        self._url_base = url_base
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._credentials = None
+        self._carregado = False
+        self._geracao = 0
+        self._timer = None
+
+    def obter_servico(self):
+        """Retorna o serviço desta thread, ou None se o Calendar não estiver conectado"""
+        if self._url_base:
+            credentials = None
+        else:
+            credentials = self.obter_credenciais()
+            if credentials is None:
+                return None
+
+        local = self._local
+        if getattr(local, 'geracao', None) != self._geracao:
+            local.servico = construir_servico(credentials, url_base=self._url_base)
+            local.geracao = self._geracao
+        return local.servico
+
+    def obter_credenciais(self):
+        with self._lock:
+            if not self._carregado:
+                self._credentials = self._ler_credenciais()
+                self._carregado = True
+                self._geracao += 1
+                self._agendar_renovacao()
+            return self._credentials
+
+    def invalidar(self):
+        """Descarta credenciais e serviços; a próxima chamada relê o banco"""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._credentials = None
+            self._carregado = False
+            self._geracao += 1
+
+    def _ler_credenciais(self):
+        dados = self._carregar_credenciais()
+        if not dados:
+            return None
+
+        from google.oauth2.credentials import Credentials
+
+        credentials = Credentials.from_authorized_user_info(json.loads(dados), self._scopes)
+        if credentials.expired and credentials.refresh_token:
+            self._renovar(credentials)
+        return credentials
+
+    def _renovar(self, credentials):
+        from google.auth.transport.requests import Request
+
+        credentials.refresh(Request())
+        self._salvar_credenciais(credentials.to_json())
+
+    def _agendar_renovacao(self, espera=None):
+        credentials = self._credentials
+        if credentials is None or not credentials.refresh_token:
+            return
+
+        if espera is None:
+            if credentials.expiry is None:
+                return
+            momento = credentials.expiry - ANTECEDENCIA_RENOVACAO
+            espera = max(0, (momento - datetime.utcnow()).total_seconds())
+
+        self._timer = threading.Timer(espera, self._renovar_em_segundo_plano, args=(self._geracao,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _renovar_em_segundo_plano(self, geracao):
+        with self._lock:
+            if geracao != self._geracao or self._credentials is None:
+                return
+            try:
+                self._renovar(self._credentials)
+            except Exception:
+                logger.exception('Erro ao renovar token do Google Calendar')
+                self._agendar_renovacao(ESPERA_APOS_FALHA)
+                return
+            self._agendar_renovacao()
+
+
+def montar_evento(paciente, atendimento):
+    """Monta o corpo do evento do Google Calendar para um atendimento"""
+    start_time = atendimento.data_atendimento
+    end_time = start_time + timedelta(minutes=atendimento.duracao_minutos or 60)
+
+    evento = {
+        'summary': f'Atendimento - {paciente.nome}',
+        'description': f'Paciente: {paciente.nome}\nTelefone: {paciente.telefone}\nTratamento: {atendimento.tratamento}\n\nObservações: {atendimento.observacoes or "Nenhuma"}',
+        'start': {
+            'dateTime': start_time.isoformat(),
+            'timeZone': FUSO_HORARIO,
+        },
+        'end': {
+            'dateTime': end_time.isoformat(),
+            'timeZone': FUSO_HORARIO,
+        },
+        'attendees': [{'email': paciente.email}] if paciente.email else [],
+        'extendedProperties': {
+            'private': {'atendimento_id': str(atendimento.id)},
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},  # 1 dia antes
+                {'method': 'popup', 'minutes': 30},       # 30 min antes
+            ],
+        },
+    }
+    if atendimento.sala:
+        evento['location'] = f'Sala {atendimento.sala}'
+    return evento
+
+
+def montar_evento_recorrente(paciente, primeiro, plano, recorrencia):
+    """Evento recorrente de um plano de tratamento, a partir da primeira sessão"""
+    evento = montar_evento(paciente, primeiro)
+    evento['summary'] = f'Atendimento - {paciente.nome} ({plano.sessoes} sessões)'
+    evento['recurrence'] = [recorrencia]
+    evento['extendedProperties'] = {'private': {'plano_id': str(plano.id)}}
+    return evento
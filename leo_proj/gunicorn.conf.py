@@ -0,0 +1,10 @@
+"""Configuração do gunicorn: gunicorn -c gunicorn.conf.py app2:app (ver servidor.py)"""
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('SERVIDOR_THREADS', 8))
+# Uma requisição ao Google pode demorar; o padrão de 30 s derrubaria o worker
+timeout = 120
+accesslog = '-'
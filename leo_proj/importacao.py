@@ -0,0 +1,276 @@
+"""Importação e exportação de pacientes (e atendimentos) em CSV ou JSONL.
+
+O arquivo é lido linha a linha e gravado em lotes de TAMANHO_LOTE com
+executemany, com commit a cada lote. Pacientes já cadastrados (mesmo
+telefone ou email normalizado, como na importação do Google Calendar) são
+reaproveitados em vez de duplicados. Linhas inválidas são puladas e
+reportadas com o seu número.
+
+Uma linha é um paciente e, opcionalmente, um atendimento dele: colunas
+COLUNAS_PACIENTE + COLUNAS_ATENDIMENTO. A exportação gera esse mesmo
+formato, sem carregar a tabela inteira em memória.
+"""
+import csv
+import io
+import itertools
+import json
+import re
+from datetime import datetime
+
+import busca
+import duplicados
+import notas
+from calendar_import import IndicePacientes, inserir_pacientes
+from models import db, Paciente, Atendimento
+
+TAMANHO_LOTE = 1000
+MAXIMO_ERROS = 500   # erros guardados para exibir; o total é sempre contado
+
+COLUNAS_PACIENTE = ('nome', 'telefone', 'email', 'endereco', 'observacoes_medicas')
+COLUNAS_ATENDIMENTO = ('data_atendimento', 'profissional', 'tratamento', 'observacoes')
+COLUNAS_EXPORTACAO = ('id',) + COLUNAS_PACIENTE + COLUNAS_ATENDIMENTO
+
+FORMATOS_DATA = ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+# Nomes de coluna comuns em planilhas -> coluna do sistema
+SINONIMOS = {
+    'e_mail': 'email',
+    'celular': 'telefone',
+    'fone': 'telefone',
+    'endereco_completo': 'endereco',
+    'observacoes_medicas_gerais': 'observacoes_medicas',
+    'data': 'data_atendimento',
+    'data_do_atendimento': 'data_atendimento',
+}
+
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+def detectar_formato(nome_arquivo):
+    return 'jsonl' if nome_arquivo.lower().endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+
+
+def _nome_coluna(nome):
+    """'Observações Médicas' -> 'observacoes_medicas'; 'E-mail' -> 'email'"""
+    nome = re.sub(r'[^a-z0-9]+', '_', busca.normalizar_texto(nome or '')).strip('_')
+    return SINONIMOS.get(nome, nome)
+
+
+def ler_csv(arquivo):
+    """Gera (número da linha, registro) de um CSV com cabeçalho, separado por ',' ou ';'"""
+    cabecalho = arquivo.readline()
+    if not cabecalho:
+        return
+    separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    leitor = csv.reader(itertools.chain([cabecalho], arquivo), delimiter=separador)
+    colunas = [_nome_coluna(c) for c in next(leitor)]
+    for valores in leitor:
+        if not any(v.strip() for v in valores):
+            continue
+        yield leitor.line_num, dict(zip(colunas, valores))
+
+
+def ler_jsonl(arquivo):
+    """Gera (número da linha, registro) de um JSONL; registro None se a linha não for um objeto"""
+    for numero, linha in enumerate(arquivo, 1):
+        if not linha.strip():
+            continue
+        try:
+            registro = json.loads(linha)
+        except ValueError:
+            registro = None
+        if not isinstance(registro, dict):
+            yield numero, None
+            continue
+        yield numero, {_nome_coluna(k): v for k, v in registro.items()}
+
+
+def ler_arquivo(arquivo, formato):
+    return ler_jsonl(arquivo) if formato == 'jsonl' else ler_csv(arquivo)
+
+
+def _texto(registro, coluna):
+    valor = registro.get(coluna)
+    return '' if valor is None else str(valor).strip()
+
+
+def _data(valor):
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        pass
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+    raise LinhaInvalida(f'data_atendimento inválida: {valor!r}')
+
+
+def validar(registro):
+    """Retorna (paciente, atendimento ou None) já no formato das tabelas"""
+    if registro is None:
+        raise LinhaInvalida('linha não é um objeto JSON válido')
+
+    nome = _texto(registro, 'nome')
+    telefone = _texto(registro, 'telefone')
+    email = _texto(registro, 'email')
+    if not nome:
+        raise LinhaInvalida('nome é obrigatório')
+    if len(nome) > 100:
+        raise LinhaInvalida('nome com mais de 100 caracteres')
+    if not 10 <= len(busca.normalizar_telefone(telefone)) <= 13 or len(telefone) > 20:
+        raise LinhaInvalida(f'telefone inválido: {telefone!r}')
+    if email and (len(email) > 100 or not _EMAIL.match(email)):
+        raise LinhaInvalida(f'email inválido: {email!r}')
+
+    paciente = {
+        'nome': nome,
+        'telefone': telefone,
+        'email': email or None,
+        'endereco': _texto(registro, 'endereco') or None,
+        'observacoes_medicas': _texto(registro, 'observacoes_medicas') or None,
+    }
+
+    if not any(_texto(registro, coluna) for coluna in COLUNAS_ATENDIMENTO):
+        return paciente, None
+    for coluna in ('data_atendimento', 'profissional', 'tratamento'):
+        if not _texto(registro, coluna):
+            raise LinhaInvalida(f'{coluna} é obrigatório quando a linha tem atendimento')
+    atendimento = {
+        'data_atendimento': _data(_texto(registro, 'data_atendimento')),
+        'profissional': _texto(registro, 'profissional')[:100],
+        'tratamento': _texto(registro, 'tratamento')[:100],
+        'observacoes': _texto(registro, 'observacoes') or None,
+    }
+    atendimento['observacoes_trecho'] = notas.trecho(atendimento['observacoes'])
+    return paciente, atendimento
+
+
+class ImportadorPacientes:
+    """Importa registros (número da linha, dicionário) em lotes"""
+
+    def __init__(self, session, indexar_busca=False):
+        self.session = session
+        self.indexar_busca = indexar_busca
+        self.indice = IndicePacientes()
+        self.pacientes_pendentes = []       # (id provisório, paciente)
+        self.atendimentos_pendentes = []
+        self.ids_reais = {}                 # id provisório (negativo) -> id gravado
+        self.existentes = set()
+        self.erros = []
+        self.totais = {'linhas': 0, 'pacientes_novos': 0, 'pacientes_existentes': 0,
+                       'atendimentos': 0, 'erros': 0}
+
+    def importar(self, registros):
+        self.indice.carregar(self.session)
+        for numero, registro in registros:
+            self.totais['linhas'] += 1
+            try:
+                paciente, atendimento = validar(registro)
+            except LinhaInvalida as e:
+                self.registrar_erro(numero, str(e))
+                continue
+
+            paciente_id = self.indice.procurar(paciente['nome'], paciente['telefone'], paciente['email'])
+            if paciente_id is None:
+                paciente_id = self.adicionar_paciente(paciente)
+            elif paciente_id > 0 and paciente_id not in self.existentes:
+                self.existentes.add(paciente_id)
+                self.totais['pacientes_existentes'] += 1
+
+            if atendimento:
+                atendimento['paciente_id'] = paciente_id
+                self.atendimentos_pendentes.append(atendimento)
+
+            if (len(self.pacientes_pendentes) >= TAMANHO_LOTE
+                    or len(self.atendimentos_pendentes) >= TAMANHO_LOTE):
+                self.gravar_pendentes()
+
+        self.gravar_pendentes()
+        return self.totais
+
+    def registrar_erro(self, numero, mensagem):
+        self.totais['erros'] += 1
+        if len(self.erros) < MAXIMO_ERROS:
+            self.erros.append((numero, mensagem))
+
+    def adicionar_paciente(self, paciente):
+        # Id provisório até o lote ser gravado; linhas seguintes do mesmo
+        # paciente o encontram pelo índice
+        provisorio = -(self.totais['pacientes_novos'] + 1)
+        self.totais['pacientes_novos'] += 1
+        self.pacientes_pendentes.append((provisorio, paciente))
+        self.indice.adicionar(provisorio, paciente['nome'], paciente['telefone'], paciente['email'])
+        return provisorio
+
+    def gravar_pendentes(self):
+        if self.pacientes_pendentes:
+            # Ids vindos do RETURNING: contar a partir do max(id) supunha rowids contíguos
+            ids = inserir_pacientes(self.session, [p for _, p in self.pacientes_pendentes])
+            for (provisorio, _), paciente_id in zip(self.pacientes_pendentes, ids):
+                self.ids_reais[provisorio] = paciente_id
+            novos = [(paciente_id, p['nome'], p['telefone'], p['email'])
+                     for (_, p), paciente_id in zip(self.pacientes_pendentes, ids)]
+            if self.indexar_busca:
+                busca.indexar_novos(self.session, novos)
+            duplicados.indexar_novos(self.session, novos)
+            self.pacientes_pendentes = []
+
+        if self.atendimentos_pendentes:
+            for atendimento in self.atendimentos_pendentes:
+                atendimento['paciente_id'] = self.ids_reais.get(atendimento['paciente_id'], atendimento['paciente_id'])
+            self.session.execute(Atendimento.__table__.insert(), self.atendimentos_pendentes)
+            self.totais['atendimentos'] += len(self.atendimentos_pendentes)
+            self.atendimentos_pendentes = []
+
+        self.session.commit()
+
+
+def linhas_exportacao(com_atendimentos=False, tamanho_lote=TAMANHO_LOTE):
+    """Gera um dicionário por paciente (ou por atendimento), lendo em lotes"""
+    colunas = [Paciente.id] + [getattr(Paciente, c) for c in COLUNAS_PACIENTE]
+    if com_atendimentos:
+        consulta = db.session.query(*colunas, *[getattr(Atendimento, c) for c in COLUNAS_ATENDIMENTO]).outerjoin(
+            Atendimento, db.and_(Atendimento.paciente_id == Paciente.id, Atendimento.status != 'cancelado')
+        ).order_by(Paciente.id, Atendimento.data_atendimento)
+        nomes = COLUNAS_EXPORTACAO
+    else:
+        consulta = db.session.query(*colunas).order_by(Paciente.id)
+        nomes = ('id',) + COLUNAS_PACIENTE
+
+    for linha in consulta.yield_per(tamanho_lote):
+        registro = dict(zip(nomes, linha))
+        if registro.get('data_atendimento'):
+            registro['data_atendimento'] = registro['data_atendimento'].strftime('%Y-%m-%d %H:%M')
+        yield registro
+
+
+def gerar_csv(linhas, colunas, linhas_por_bloco=500):
+    """Texto CSV em blocos (com BOM, para o Excel reconhecer o UTF-8)"""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=colunas, extrasaction='ignore')
+    buffer.write('\ufeff')
+    escritor.writeheader()
+    for numero, linha in enumerate(linhas, 1):
+        escritor.writerow(linha)
+        if numero % linhas_por_bloco == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gerar_jsonl(linhas, linhas_por_bloco=500):
+    bloco = []
+    for linha in linhas:
+        bloco.append(json.dumps(linha, ensure_ascii=False))
+        if len(bloco) == linhas_por_bloco:
+            yield '\n'.join(bloco) + '\n'
+            bloco = []
+    if bloco:
+        yield '\n'.join(bloco) + '\n'
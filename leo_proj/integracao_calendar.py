@@ -0,0 +1,118 @@
+"""Integração opcional com o Google Calendar, no estilo das extensões do Flask.
+
+Com GOOGLE_CALENDAR desligado, o app sobe sem registrar as rotas do
+Calendar e sem iniciar o worker da fila. Ligado, nada do Google é
+importado na subida: as bibliotecas só carregam na primeira vez que um
+serviço é criado (ver google_calendar.py) ou no fluxo de autorização.
+"""
+import functools
+import threading
+
+import clinicas
+import estatisticas
+import google_calendar
+import outbox
+from models import db, GoogleCredentials
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+CLIENT_SECRETS_FILE = "credentials.json"  # Baixe do Google Cloud Console
+
+
+class IntegracaoCalendar:
+    """Serviço, estatísticas, limite de chamadas e worker do Google Calendar.
+
+    Com várias clínicas (clinicas.py) cada uma tem a sua conta Google: as
+    credenciais, o serviço e as estatísticas ficam separados por clínica.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.chamadas_google = None
+        self.worker = None
+        self._por_clinica = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from rotas_calendar import bp
+
+        self.app = app
+        # Requisições que podem esperar o Google ao mesmo tempo (ver servidor.py)
+        self.chamadas_google = threading.BoundedSemaphore(app.config.get('GOOGLE_SIMULTANEOS', 2))
+        app.register_blueprint(bp)
+        app.extensions['calendar'] = self
+
+    @property
+    def ativa(self):
+        return self.app is not None
+
+    def _da_clinica(self):
+        """(serviços, estatísticas) da clínica atual; uma entrada só, com chave None, sem clínicas"""
+        slug = clinicas.atual()
+        with self._lock:
+            if slug not in self._por_clinica:
+                # Credenciais e serviço do Google Calendar reaproveitados entre requisições
+                servicos = google_calendar.CacheServicoCalendar(
+                    functools.partial(self._carregar_credenciais, slug),
+                    functools.partial(self._salvar_credenciais, slug),
+                    scopes=SCOPES,
+                    url_base=self.app.config.get('GOOGLE_CALENDAR_API_URL')
+                )
+                # Contadores e conta Google exibidos em /calendar_status, em cache
+                self._por_clinica[slug] = (servicos, estatisticas.EstatisticasCalendar(
+                    functools.partial(self._obter_servico, servicos)))
+            return self._por_clinica[slug]
+
+    @property
+    def servicos(self):
+        return self._da_clinica()[0]
+
+    @property
+    def estatisticas(self):
+        return self._da_clinica()[1]
+
+    def _carregar_credenciais(self, slug):
+        with clinicas.contexto(self.app, slug):
+            cred_record = GoogleCredentials.query.first()
+            return cred_record.credentials if cred_record else None
+
+    def _salvar_credenciais(self, slug, credentials_json):
+        with clinicas.contexto(self.app, slug):
+            cred_record = GoogleCredentials.query.first()
+            if cred_record:
+                cred_record.credentials = credentials_json
+                db.session.commit()
+
+    def _obter_servico(self, servicos):
+        try:
+            return servicos.obter_servico()
+        except Exception:
+            self.app.logger.exception('Erro ao obter serviço do Google Calendar')
+            return None
+
+    def obter_servico(self):
+        """Retorna o serviço do Google Calendar (da clínica atual) se autenticado"""
+        if not self.ativa:
+            return None
+        return self._obter_servico(self.servicos)
+
+    def invalidar(self):
+        """Descarta credenciais e a conta em cache (após conectar ou desconectar)"""
+        self.servicos.invalidar()
+        self.estatisticas.invalidar_conta()
+
+    def dados_alterados(self):
+        if self.ativa:
+            self.estatisticas.invalidar_contadores()
+
+    def iniciar_worker(self, ao_processar=None):
+        """Worker que esvazia a fila de eventos (desligue com CALENDAR_WORKER=0)"""
+        if not self.ativa or self.worker is not None or not self.app.config.get('CALENDAR_WORKER'):
+            return
+        self.worker = outbox.WorkerCalendar(self.app, self.obter_servico, ao_processar=ao_processar)
+        self.worker.start()
+
+    def notificar_worker(self):
+        if self.worker is not None:
+            self.worker.notificar()
@@ -0,0 +1,432 @@
+"""Lembretes de atendimento enviados pela clínica (email e webhook), sem depender do Google.
+
+Com LEMBRETES_SMTP_HOST e/ou LEMBRETES_WEBHOOK_URL configurados, o
+formulário do atendimento oferece "Enviar lembrete" e cada canal em que o
+paciente tem contato ganha uma linha em `lembrete`, com o horário de envio
+(o atendimento menos LEMBRETES_ANTECEDENCIA_HORAS).
+
+O worker não varre os atendimentos. A cada JANELA ele lê pelo índice
+(status, enviar_em) só os lembretes que vencem até o fim da janela, guarda
+em um heap por horário e dorme até o primeiro vencer. Depois de um
+reinício basta ler a janela de novo (os atrasados também vêm). Como na
+fila do Calendar (outbox.py), cada lembrete é reservado no banco antes do
+envio, então vários processos podem rodar o worker sem enviar duas vezes.
+
+Os envios saem em lotes de TAMANHO_LOTE por canal (uma conexão SMTP ou um
+POST por lote), com no máximo LEMBRETES_SIMULTANEOS lotes ao mesmo tempo.
+
+Os horários são locais, como data_atendimento. Atendimentos cancelados ou
+movidos cancelam ou reagendam os lembretes por trigger (migração 0010).
+"""
+import heapq
+import json
+import logging
+import smtplib
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import clinicas
+import outbox
+from models import db, Atendimento, Lembrete
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_ENVIANDO = 'enviando'
+STATUS_ENVIADO = 'enviado'
+STATUS_FALHOU = 'falhou'
+STATUS_CANCELADO = 'cancelado'
+
+STATUS_ABERTOS = (STATUS_PENDENTE, STATUS_ENVIANDO)
+
+# Quanto à frente o worker carrega do banco; também é o atraso máximo para
+# ver lembretes criados em outro processo para daqui a pouco
+JANELA = timedelta(minutes=5)
+
+TAMANHO_LOTE = 50        # mensagens por conexão SMTP / POST do webhook
+MAXIMO_TENTATIVAS = 5
+ESPERA_APOS_ERRO = 30    # segundos, quando a rodada do worker falha
+
+# Tempo que um lembrete fica reservado para um worker; se o processo morrer
+# no meio do envio, ele volta a vencer depois disso
+RESERVA = timedelta(minutes=5)
+
+
+# --- Canais ------------------------------------------------------------
+
+class CanalEmail:
+    """Email pelo SMTP configurado (para testes, um servidor local como `python -m aiosmtpd -n`)"""
+    nome = 'email'
+
+    def __init__(self, host, porta=25, remetente=None, usuario=None, senha=None, tls=False, timeout=10):
+        self.host = host
+        self.porta = porta
+        self.remetente = remetente or f'lembretes@{host}'
+        self.usuario = usuario
+        self.senha = senha
+        self.tls = tls
+        self.timeout = timeout
+
+    def destino(self, paciente):
+        return paciente.email or None
+
+    def enviar(self, mensagens):
+        """Envia o lote em uma conexão; retorna {id do lembrete: erro} dos que falharam"""
+        erros = {}
+        with smtplib.SMTP(self.host, self.porta, timeout=self.timeout) as smtp:
+            if self.tls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.senha)
+            for mensagem in mensagens:
+                email = EmailMessage()
+                email['From'] = self.remetente
+                email['To'] = mensagem['destino']
+                email['Subject'] = mensagem['assunto']
+                email.set_content(mensagem['texto'])
+                try:
+                    smtp.send_message(email)
+                except smtplib.SMTPException as e:
+                    erros[mensagem['id']] = e
+        return erros
+
+
+class CanalWebhook:
+    """POST de {"lembretes": [...]} em JSON por lote (ex.: gateway de SMS/WhatsApp da clínica)"""
+    nome = 'webhook'
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def destino(self, paciente):
+        return paciente.telefone or None
+
+    def enviar(self, mensagens):
+        corpo = json.dumps({'lembretes': mensagens}).encode('utf-8')
+        requisicao = urllib.request.Request(self.url, data=corpo, method='POST',
+                                            headers={'Content-Type': 'application/json'})
+        # Respostas fora de 2xx levantam HTTPError: o lote todo volta para a fila
+        with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+            resposta.read()
+        return {}
+
+
+def canais_configurados(config):
+    canais = []
+    if config.get('LEMBRETES_SMTP_HOST'):
+        canais.append(CanalEmail(
+            config['LEMBRETES_SMTP_HOST'],
+            porta=config.get('LEMBRETES_SMTP_PORTA', 25),
+            remetente=config.get('LEMBRETES_REMETENTE'),
+            usuario=config.get('LEMBRETES_SMTP_USUARIO'),
+            senha=config.get('LEMBRETES_SMTP_SENHA'),
+            tls=config.get('LEMBRETES_SMTP_TLS', False)
+        ))
+    if config.get('LEMBRETES_WEBHOOK_URL'):
+        canais.append(CanalWebhook(config['LEMBRETES_WEBHOOK_URL']))
+    return canais
+
+
+# --- Agendamento -------------------------------------------------------
+
+def agendar(atendimentos, canais, antecedencia, agora=None):
+    """Adiciona os lembretes dos atendimentos futuros nos canais em que o paciente tem contato.
+
+    Retorna quantos foram criados (o commit é de quem chama).
+    """
+    agora = agora or datetime.now()
+    linhas = []
+    for atendimento in atendimentos:
+        if atendimento.data_atendimento <= agora:
+            continue
+        for canal in canais:
+            if canal.destino(atendimento.paciente):
+                linhas.append({
+                    'atendimento_id': atendimento.id,
+                    'canal': canal.nome,
+                    # Atendimento marcado em cima da hora: o lembrete sai já
+                    'enviar_em': max(atendimento.data_atendimento - antecedencia, agora),
+                    'antecedencia_minutos': int(antecedencia.total_seconds() // 60),
+                    'status': STATUS_PENDENTE,
+                    'tentativas': 0,
+                })
+    if linhas:
+        db.session.execute(Lembrete.__table__.insert(), linhas)
+    return len(linhas)
+
+
+def montar_mensagem(lembrete, atendimento, destino):
+    quando = atendimento.data_atendimento.strftime('%d/%m/%Y às %H:%M')
+    primeiro_nome = atendimento.paciente.nome.split()[0]
+    return {
+        'id': lembrete.id,
+        'canal': lembrete.canal,
+        'destino': destino,
+        'paciente': atendimento.paciente.nome,
+        'data_atendimento': atendimento.data_atendimento.isoformat(),
+        'profissional': atendimento.profissional,
+        'tratamento': atendimento.tratamento,
+        'assunto': f'Lembrete: {atendimento.tratamento} em {quando}',
+        'texto': (f'Olá, {primeiro_nome}! Lembramos do seu atendimento de {atendimento.tratamento} '
+                  f'com {atendimento.profissional} em {quando}.'),
+    }
+
+
+class AgendaLembretes:
+    """Heap (enviar_em, id) dos lembretes que vencem até `fim_janela`.
+
+    Um lembrete reagendado para mais cedo entra de novo no heap; a entrada
+    antiga é descartada ao sair (vale o horário guardado em `horarios`).
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.horarios = {}
+        self.fim_janela = None
+
+    def __len__(self):
+        return len(self.horarios)
+
+    def adicionar(self, lembrete_id, enviar_em):
+        atual = self.horarios.get(lembrete_id)
+        if atual is None or enviar_em < atual:
+            self.horarios[lembrete_id] = enviar_em
+            heapq.heappush(self.heap, (enviar_em, lembrete_id))
+
+    def carregar(self, ate):
+        """Lê pelo índice os lembretes abertos que vencem antes de `ate` (inclusive os atrasados)"""
+        linhas = db.session.query(Lembrete.id, Lembrete.enviar_em).filter(
+            Lembrete.status.in_(STATUS_ABERTOS),
+            Lembrete.enviar_em < ate
+        ).all()
+        for lembrete_id, enviar_em in linhas:
+            self.adicionar(lembrete_id, enviar_em)
+        self.fim_janela = ate
+        return len(linhas)
+
+    def proximo(self):
+        while self.heap and self.horarios.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def vencidos(self, agora, limite):
+        """Tira do heap até `limite` ids vencidos, do mais antigo para o mais novo"""
+        ids = []
+        while len(ids) < limite and self.proximo() is not None and self.heap[0][0] <= agora:
+            _, lembrete_id = heapq.heappop(self.heap)
+            del self.horarios[lembrete_id]
+            ids.append(lembrete_id)
+        return ids
+
+
+# --- Envio -------------------------------------------------------------
+
+def reservar(ids, agora):
+    """Reserva para este worker os lembretes ainda abertos e vencidos; retorna os ids reservados"""
+    reservados = db.session.execute(db.update(Lembrete).where(
+        Lembrete.id.in_(ids),
+        Lembrete.status.in_(STATUS_ABERTOS),
+        Lembrete.enviar_em <= agora
+    ).values(status=STATUS_ENVIANDO, enviar_em=agora + RESERVA).returning(Lembrete.id)).scalars().all()
+    db.session.commit()
+    return reservados
+
+
+def _registrar_falha(lembrete, erro, agora):
+    lembrete.tentativas += 1
+    lembrete.ultimo_erro = str(erro)[:1000]
+    proxima = agora + outbox.calcular_espera(lembrete.tentativas)
+    if lembrete.tentativas >= MAXIMO_TENTATIVAS or proxima >= lembrete.atendimento.data_atendimento:
+        lembrete.status = STATUS_FALHOU
+    else:
+        lembrete.status = STATUS_PENDENTE
+        lembrete.enviar_em = proxima
+
+
+def despachar(ids, canais, executor, agora=None):
+    """Reserva e envia os lembretes `ids` pelos canais ({nome: canal}).
+
+    Retorna (enviados, [(id, enviar_em)] dos que voltaram para a fila).
+    """
+    agora = agora or datetime.now()
+    reservados = reservar(ids, agora)
+    if not reservados:
+        return 0, []
+
+    lembretes = {l.id: l for l in Lembrete.query.options(
+        db.joinedload(Lembrete.atendimento).joinedload(Atendimento.paciente)
+    ).filter(Lembrete.id.in_(reservados))}
+
+    por_canal = {}
+    for lembrete in lembretes.values():
+        atendimento = lembrete.atendimento
+        canal = canais.get(lembrete.canal)
+        destino = canal.destino(atendimento.paciente) if canal else None
+        if atendimento.status == 'cancelado' or atendimento.data_atendimento <= agora or destino is None:
+            # Cancelado depois da reserva, já passou, canal desligado ou paciente sem o contato
+            lembrete.status = STATUS_CANCELADO
+            continue
+        por_canal.setdefault(lembrete.canal, []).append(montar_mensagem(lembrete, atendimento, destino))
+
+    futuros = []
+    for nome, mensagens in por_canal.items():
+        for inicio in range(0, len(mensagens), TAMANHO_LOTE):
+            lote = mensagens[inicio:inicio + TAMANHO_LOTE]
+            futuros.append((executor.submit(canais[nome].enviar, lote), lote))
+
+    enviados, reagendados = 0, []
+    for futuro, lote in futuros:
+        try:
+            erros = futuro.result()
+        except Exception as e:
+            erros = {mensagem['id']: e for mensagem in lote}
+        for mensagem in lote:
+            lembrete = lembretes[mensagem['id']]
+            if mensagem['id'] in erros:
+                _registrar_falha(lembrete, erros[mensagem['id']], agora)
+                if lembrete.status == STATUS_PENDENTE:
+                    reagendados.append((lembrete.id, lembrete.enviar_em))
+            else:
+                lembrete.status = STATUS_ENVIADO
+                lembrete.enviado_em = datetime.now()
+                lembrete.ultimo_erro = None
+                enviados += 1
+    db.session.commit()
+    return enviados, reagendados
+
+
+class WorkerLembretes(threading.Thread):
+    """Thread que envia os lembretes na hora; `notificar()` a faz reler a janela.
+
+    Com várias clínicas (clinicas.py) há uma agenda por clínica, e
+    `notificar(slug)` relê só a janela daquela clínica.
+    """
+
+    def __init__(self, app, canais, simultaneos=4, janela=JANELA):
+        super().__init__(name='worker-lembretes', daemon=True)
+        self.app = app
+        self.canais = {canal.nome: canal for canal in canais}
+        self.janela = janela
+        self.limite = TAMANHO_LOTE * simultaneos
+        self.executor = ThreadPoolExecutor(max_workers=simultaneos, thread_name_prefix='lembretes')
+        self.agendas = {}
+        self.fim_janela = None
+        self.enviados = 0
+        self._a_recarregar = set()
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+
+    def notificar(self, clinica=None):
+        with self._trava:
+            self._a_recarregar.add(clinica)
+        self._acordar.set()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def executar_uma_vez(self):
+        """Relê as janelas se preciso e envia o que venceu; retorna os segundos até o próximo vencimento"""
+        agora = datetime.now()
+        slugs = clinicas.slugs(self.app)
+        with self._trava:
+            if self.fim_janela is None or agora >= self.fim_janela:
+                self.fim_janela = agora + self.janela
+                recarregar = set(slugs)
+            else:
+                recarregar = self._a_recarregar
+            self._a_recarregar = set()
+
+        for slug in slugs:
+            agenda = self.agendas.setdefault(slug, AgendaLembretes())
+            proximo = agenda.proximo()
+            if slug not in recarregar and (proximo is None or proximo > datetime.now()):
+                # Nada vencido nesta clínica: nem abre o banco
+                continue
+            try:
+                with clinicas.contexto(self.app, slug):
+                    if slug in recarregar:
+                        agenda.carregar(self.fim_janela)
+                    self._enviar_vencidos(agenda)
+            except Exception:
+                # Um banco com problema não segura os lembretes das outras clínicas
+                if slug is None:
+                    raise
+                logger.exception('Erro no worker de lembretes (clínica %s)', slug)
+                with self._trava:
+                    self._a_recarregar.add(slug)
+
+        proximos = [p for p in (self.agendas[slug].proximo() for slug in slugs) if p is not None]
+        alvo = min(proximos + [self.fim_janela])
+        return max(0, (alvo - datetime.now()).total_seconds())
+
+    def _enviar_vencidos(self, agenda):
+        while not self._parar.is_set():
+            ids = agenda.vencidos(datetime.now(), self.limite)
+            if not ids:
+                break
+            enviados, reagendados = despachar(ids, self.canais, self.executor)
+            self.enviados += enviados
+            for lembrete_id, enviar_em in reagendados:
+                agenda.adicionar(lembrete_id, enviar_em)
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                espera = self.executar_uma_vez()
+            except Exception:
+                logger.exception('Erro no worker de lembretes')
+                espera = ESPERA_APOS_ERRO
+            self._acordar.wait(espera)
+            self._acordar.clear()
+        self.executor.shutdown(wait=True)
+
+
+def resumo():
+    """Lembretes por situação (métricas)"""
+    return dict(db.session.query(Lembrete.status, db.func.count()).group_by(Lembrete.status).all())
+
+
+class ServicoLembretes:
+    """Canais e worker dos lembretes, no estilo das extensões do Flask"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.canais = []
+        self.antecedencia = timedelta(hours=24)
+        self.worker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.canais = canais_configurados(app.config)
+        self.antecedencia = timedelta(hours=app.config.get('LEMBRETES_ANTECEDENCIA_HORAS', 24))
+        app.extensions['lembretes'] = self
+
+    @property
+    def ativos(self):
+        return bool(self.canais)
+
+    def agendar(self, atendimentos):
+        """Lembretes dos atendimentos nos canais configurados (o commit é de quem chama)"""
+        return agendar(atendimentos, self.canais, self.antecedencia)
+
+    def criar_worker(self):
+        return WorkerLembretes(self.app, self.canais, self.app.config.get('LEMBRETES_SIMULTANEOS', 4))
+
+    def iniciar_worker(self):
+        """Worker que envia os lembretes (desligue com LEMBRETES_WORKER=0)"""
+        if not self.ativos or self.worker is not None or not self.app.config.get('LEMBRETES_WORKER'):
+            return
+        self.worker = self.criar_worker()
+        self.worker.start()
+
+    def notificar_worker(self):
+        if self.worker is not None:
+            self.worker.notificar(clinicas.atual())
@@ -0,0 +1,282 @@
+"""Métricas de desempenho no formato texto do Prometheus (/metrics).
+
+- tempo de cada requisição, por rota, método e status;
+- número e tempo das consultas SQL de cada requisição, com aviso quando a
+  mesma consulta se repete muitas vezes (padrão N+1);
+- tempo das chamadas à API do Google Calendar;
+- perfil por amostragem das requisições lentas (opcional, PERFIL_LENTAS=1):
+  uma thread registra a pilha da requisição a cada INTERVALO_AMOSTRAGEM e,
+  se ela passar de LIMITE_LENTA, grava as pilhas agregadas em
+  instance/perfis/ (formato "collapsed" dos flame graphs).
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LIMITES_TEMPO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# A mesma consulta repetida este número de vezes na requisição é avisada como N+1
+REPETICOES_N_MAIS_UM = 10
+
+LIMITE_LENTA = float(os.environ.get('LIMITE_REQUISICAO_LENTA', 1.0))   # segundos
+INTERVALO_AMOSTRAGEM = 0.005
+
+
+def _rotulos(nomes, valores):
+    if not nomes:
+        return ''
+    pares = ','.join(f'{n}="{str(v)}"'.replace('\n', ' ') for n, v in zip(nomes, valores))
+    return '{' + pares + '}'
+
+
+class Contador:
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, rotulos
+        self._valores = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores, quantidade=1):
+        with self._lock:
+            self._valores[valores] += quantidade
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} counter']
+        with self._lock:
+            for valores, total in sorted(self._valores.items()):
+                linhas.append(f'{self.nome}{_rotulos(self.rotulos, valores)} {total:g}')
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_TEMPO):
+        self.nome, self.ajuda, self.rotulos, self.limites = nome, ajuda, rotulos, limites
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * len(self.limites), 0.0, 0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} histogram']
+        nomes = self.rotulos + ('le',)
+        with self._lock:
+            for valores, (baldes, soma, total) in sorted(self._series.items()):
+                for limite, quantidade in zip(self.limites, baldes):
+                    linhas.append(f'{self.nome}_bucket{_rotulos(nomes, valores + (f"{limite:g}",))} {quantidade}')
+                linhas.append(f'{self.nome}_bucket{_rotulos(nomes, valores + ("+Inf",))} {total}')
+                linhas.append(f'{self.nome}_sum{_rotulos(self.rotulos, valores)} {soma:g}')
+                linhas.append(f'{self.nome}_count{_rotulos(self.rotulos, valores)} {total}')
+        return linhas
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = []
+        self.coletores = []
+
+    def adicionar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        """Texto completo do /metrics; os coletores geram métricas calculadas na hora"""
+        linhas = []
+        for metrica in self.metricas:
+            linhas.extend(metrica.exportar())
+        for coletor in self.coletores:
+            try:
+                linhas.extend(coletor())
+            except Exception:
+                logger.exception('Erro em coletor de métricas')
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRO = Registro()
+
+REQUISICOES = REGISTRO.adicionar(Histograma(
+    'crm_requisicao_segundos', 'Tempo de resposta das requisições', ('rota', 'metodo', 'status')))
+CONSULTAS_POR_REQUISICAO = REGISTRO.adicionar(Histograma(
+    'crm_sql_consultas_por_requisicao', 'Consultas SQL por requisição', ('rota',), LIMITES_CONSULTAS))
+SQL_SEGUNDOS = REGISTRO.adicionar(Histograma(
+    'crm_sql_segundos_por_requisicao', 'Tempo total em SQL por requisição', ('rota',)))
+N_MAIS_UM = REGISTRO.adicionar(Contador(
+    'crm_sql_n_mais_um_total', 'Requisições com a mesma consulta repetida (N+1)', ('rota',)))
+GOOGLE = REGISTRO.adicionar(Histograma(
+    'crm_google_api_segundos', 'Tempo das chamadas à API do Google Calendar', ('recurso', 'metodo', 'status')))
+
+
+# --- SQL ---------------------------------------------------------------
+
+def instrumentar_engine(engine):
+    """Mede cada consulta do engine e a atribui à requisição em andamento"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes(conexao, cursor, sql, parametros, contexto, executemany):
+        conexao.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def depois(conexao, cursor, sql, parametros, contexto, executemany):
+        duracao = time.perf_counter() - conexao.info['inicio_consulta'].pop()
+        if has_request_context() and hasattr(g, 'metricas_sql'):
+            g.metricas_sql['total'] += 1
+            g.metricas_sql['segundos'] += duracao
+            if not executemany:
+                # executemany já é o lote; só repetições de consultas isoladas indicam N+1
+                g.metricas_sql['repeticoes'][sql] += 1
+
+
+# --- Google Calendar ---------------------------------------------------
+
+_RECURSO_GOOGLE = re.compile(r'/calendar/v3/(?:calendars/[^/?]+/)?(events|calendars|users/me/calendarList)')
+
+
+class HttpMedido:
+    """Envolve o objeto http do cliente do Google e mede cada requisição"""
+
+    def __init__(self, http):
+        self._http = http
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        if '/batch/' in uri:
+            recurso = 'batch'
+        else:
+            encontrado = _RECURSO_GOOGLE.search(uri)
+            recurso = encontrado.group(1) if encontrado else 'outro'
+        inicio = time.perf_counter()
+        status = 'erro'
+        try:
+            resposta, conteudo = self._http.request(uri, method, *args, **kwargs)
+            status = resposta.status
+            return resposta, conteudo
+        finally:
+            GOOGLE.observar(time.perf_counter() - inicio, recurso, method, status)
+
+    def __getattr__(self, nome):
+        return getattr(self._http, nome)
+
+
+# --- Perfil por amostragem ---------------------------------------------
+
+class AmostradorPilhas(threading.Thread):
+    """Registra periodicamente a pilha das threads que pediram para ser amostradas"""
+
+    def __init__(self, intervalo=INTERVALO_AMOSTRAGEM):
+        super().__init__(name='amostrador-pilhas', daemon=True)
+        self.intervalo = intervalo
+        self._amostras = {}
+        self._lock = threading.Lock()
+
+    def iniciar_amostragem(self):
+        with self._lock:
+            self._amostras[threading.get_ident()] = Counter()
+
+    def terminar_amostragem(self):
+        with self._lock:
+            return self._amostras.pop(threading.get_ident(), Counter())
+
+    def run(self):
+        while True:
+            time.sleep(self.intervalo)
+            with self._lock:
+                if not self._amostras:
+                    continue
+                quadros = sys._current_frames()
+                for ident, contagem in self._amostras.items():
+                    quadro = quadros.get(ident)
+                    if quadro is not None:
+                        contagem[_pilha(quadro)] += 1
+
+
+def _pilha(quadro):
+    funcoes = []
+    while quadro is not None:
+        codigo = quadro.f_code
+        funcoes.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}')
+        quadro = quadro.f_back
+    return ';'.join(reversed(funcoes))
+
+
+def gravar_perfil(pasta, rota, duracao, amostras):
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{datetime.now():%Y%m%d-%H%M%S}-{re.sub(r'[^A-Za-z0-9_]+', '_', rota)}-{duracao * 1000:.0f}ms.txt"
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, 'w') as arquivo:
+        for pilha, quantidade in amostras.most_common():
+            arquivo.write(f'{pilha} {quantidade}\n')
+    return caminho
+
+
+# --- Flask -------------------------------------------------------------
+
+def instrumentar_app(app, perfil_lentas=False):
+    """Registra os ganchos de medição e a rota /metrics"""
+    amostrador = None
+    if perfil_lentas:
+        amostrador = AmostradorPilhas()
+        amostrador.start()
+
+    @app.before_request
+    def iniciar_medicao():
+        g.inicio_requisicao = time.perf_counter()
+        g.metricas_sql = {'total': 0, 'segundos': 0.0, 'repeticoes': Counter()}
+        if amostrador:
+            amostrador.iniciar_amostragem()
+
+    @app.after_request
+    def registrar_medicao(resposta):
+        if not hasattr(g, 'inicio_requisicao'):
+            return resposta
+        duracao = time.perf_counter() - g.inicio_requisicao
+        rota = request.endpoint or 'desconhecida'
+        sql = g.metricas_sql
+
+        REQUISICOES.observar(duracao, rota, request.method, resposta.status_code)
+        CONSULTAS_POR_REQUISICAO.observar(sql['total'], rota)
+        SQL_SEGUNDOS.observar(sql['segundos'], rota)
+        resposta.headers['Server-Timing'] = (
+            f"app;dur={duracao * 1000:.1f}, db;dur={sql['segundos'] * 1000:.1f};desc=\"{sql['total']} consultas\"")
+
+        consulta, repeticoes = sql['repeticoes'].most_common(1)[0] if sql['repeticoes'] else ('', 0)
+        if repeticoes >= REPETICOES_N_MAIS_UM:
+            N_MAIS_UM.incrementar(rota)
+            logger.warning('Possível N+1 em %s: consulta executada %d vezes: %s',
+                           rota, repeticoes, ' '.join(consulta.split())[:200])
+
+        if duracao >= LIMITE_LENTA:
+            logger.warning('Requisição lenta: %s %s levou %.0f ms (%d consultas, %.0f ms em SQL)',
+                           request.method, request.full_path, duracao * 1000,
+                           sql['total'], sql['segundos'] * 1000)
+        if amostrador:
+            amostras = amostrador.terminar_amostragem()
+            if duracao >= LIMITE_LENTA and amostras:
+                caminho = gravar_perfil(os.path.join(app.instance_path, 'perfis'), rota, duracao, amostras)
+                logger.warning('Perfil da requisição lenta gravado em %s', caminho)
+        return resposta
+
+    @app.teardown_request
+    def encerrar_amostragem(erro=None):
+        if amostrador:
+            amostrador.terminar_amostragem()
+
+    @app.route('/metrics')
+    def metrics():
+        return REGISTRO.exportar(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
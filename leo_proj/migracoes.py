@@ -0,0 +1,250 @@
+"""Migrações simples do banco SQLite.
+
+O `db.create_all()` só cria tabelas que ainda não existem; alterações em
+tabelas existentes (índices, colunas novas) ficam registradas aqui, em ordem,
+e cada uma é aplicada uma única vez por banco.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+import notas
+
+
+def adicionar_coluna(tabela, coluna, definicao):
+    """Passo de migração que adiciona a coluna, se ela ainda não existir.
+
+    Em bancos novos o create_all já cria a tabela com a coluna do modelo.
+    """
+    def passo(session):
+        colunas = {linha[1] for linha in session.execute(text(f"PRAGMA table_info({tabela})"))}
+        if coluna not in colunas:
+            session.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}"))
+    return passo
+
+
+MIGRACOES = [
+    ('0001_indice_paciente_nome', [
+        "CREATE INDEX IF NOT EXISTS ix_paciente_nome_id ON paciente (nome, id)",
+    ]),
+    ('0002_indice_atendimento_data', [
+        "CREATE INDEX IF NOT EXISTS ix_atendimento_data ON atendimento (data_atendimento)",
+    ]),
+    ('0003_sync_bidirecional', [
+        adicionar_coluna('google_credentials', 'sync_token', "TEXT"),
+        adicionar_coluna('atendimento', 'status', "VARCHAR(20) NOT NULL DEFAULT 'agendado'"),
+        "CREATE INDEX IF NOT EXISTS ix_atendimento_evento_calendar ON atendimento (evento_calendar_id)",
+    ]),
+    # Totais por paciente mantidos pelo próprio banco, para qualquer caminho de
+    # escrita (ORM, inserções em lote da importação, edições manuais).
+    # Atendimentos cancelados não contam.
+    ('0004_resumo_paciente', [
+        "CREATE INDEX IF NOT EXISTS ix_atendimento_paciente_data ON atendimento (paciente_id, data_atendimento)",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_atendimento_insert AFTER INSERT ON atendimento
+        BEGIN
+            INSERT INTO paciente_resumo (paciente_id, total_atendimentos)
+                SELECT NEW.paciente_id, 1 WHERE NEW.status != 'cancelado'
+                ON CONFLICT (paciente_id) DO UPDATE SET total_atendimentos = total_atendimentos + 1;
+            INSERT INTO paciente_tratamento (paciente_id, tratamento, total)
+                SELECT NEW.paciente_id, NEW.tratamento, 1 WHERE NEW.status != 'cancelado'
+                ON CONFLICT (paciente_id, tratamento) DO UPDATE SET total = total + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_atendimento_delete AFTER DELETE ON atendimento
+        WHEN OLD.status != 'cancelado'
+        BEGIN
+            UPDATE paciente_resumo SET total_atendimentos = total_atendimentos - 1
+                WHERE paciente_id = OLD.paciente_id;
+            UPDATE paciente_tratamento SET total = total - 1
+                WHERE paciente_id = OLD.paciente_id AND tratamento = OLD.tratamento;
+            DELETE FROM paciente_tratamento
+                WHERE paciente_id = OLD.paciente_id AND tratamento = OLD.tratamento AND total <= 0;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_atendimento_update
+        AFTER UPDATE OF paciente_id, tratamento, status ON atendimento
+        BEGIN
+            UPDATE paciente_resumo SET total_atendimentos = total_atendimentos - 1
+                WHERE paciente_id = OLD.paciente_id AND OLD.status != 'cancelado';
+            UPDATE paciente_tratamento SET total = total - 1
+                WHERE paciente_id = OLD.paciente_id AND tratamento = OLD.tratamento AND OLD.status != 'cancelado';
+            DELETE FROM paciente_tratamento
+                WHERE paciente_id = OLD.paciente_id AND tratamento = OLD.tratamento AND total <= 0;
+            INSERT INTO paciente_resumo (paciente_id, total_atendimentos)
+                SELECT NEW.paciente_id, 1 WHERE NEW.status != 'cancelado'
+                ON CONFLICT (paciente_id) DO UPDATE SET total_atendimentos = total_atendimentos + 1;
+            INSERT INTO paciente_tratamento (paciente_id, tratamento, total)
+                SELECT NEW.paciente_id, NEW.tratamento, 1 WHERE NEW.status != 'cancelado'
+                ON CONFLICT (paciente_id, tratamento) DO UPDATE SET total = total + 1;
+        END""",
+        # Carga inicial a partir dos atendimentos já existentes
+        "DELETE FROM paciente_resumo",
+        "DELETE FROM paciente_tratamento",
+        """INSERT INTO paciente_resumo (paciente_id, total_atendimentos)
+            SELECT paciente_id, COUNT(*) FROM atendimento WHERE status != 'cancelado' GROUP BY paciente_id""",
+        """INSERT INTO paciente_tratamento (paciente_id, tratamento, total)
+            SELECT paciente_id, tratamento, COUNT(*) FROM atendimento
+            WHERE status != 'cancelado' GROUP BY paciente_id, tratamento""",
+    ]),
+    # paciente_id, data_atendimento e evento_calendar_id já têm índice
+    # (0002, 0003 e o composto da 0004); falta o telefone, usado para achar
+    # pacientes já cadastrados. O ANALYZE atualiza as estatísticas do planejador.
+    ('0005_indice_paciente_telefone', [
+        "CREATE INDEX IF NOT EXISTS ix_paciente_telefone ON paciente (telefone)",
+        "ANALYZE",
+    ]),
+    # Duração e sala do atendimento, para a checagem de conflitos de horário
+    # (agendamento.py): busca por faixa de data_atendimento por profissional e por sala.
+    ('0006_duracao_sala_atendimento', [
+        adicionar_coluna('atendimento', 'duracao_minutos', "INTEGER NOT NULL DEFAULT 60"),
+        adicionar_coluna('atendimento', 'sala', "VARCHAR(50)"),
+        "CREATE INDEX IF NOT EXISTS ix_atendimento_profissional_data ON atendimento (profissional, data_atendimento)",
+        "CREATE INDEX IF NOT EXISTS ix_atendimento_sala_data ON atendimento (sala, data_atendimento)",
+        "ANALYZE",
+    ]),
+    # Planos de tratamento: a tabela plano_tratamento vem do create_all
+    ('0007_plano_tratamento', [
+        adicionar_coluna('atendimento', 'plano_id', "INTEGER REFERENCES plano_tratamento (id)"),
+        "CREATE INDEX IF NOT EXISTS ix_atendimento_plano_id ON atendimento (plano_id)",
+    ]),
+    # Totais por dia, profissional e tratamento (sessões, realizadas, faltas,
+    # cancelados) e cadastros por dia, para os relatórios (relatorios.py). As
+    # tabelas vêm do create_all; os triggers as mantêm em qualquer caminho de escrita.
+    ('0008_resumos_diarios', [
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_dia_insert AFTER INSERT ON atendimento
+        BEGIN
+            INSERT INTO resumo_atendimento_dia
+                (dia, profissional, tratamento, sessoes, realizadas, faltas, cancelados, minutos)
+                VALUES (date(NEW.data_atendimento), NEW.profissional, NEW.tratamento,
+                        NEW.status != 'cancelado', NEW.status = 'realizado', NEW.status = 'faltou',
+                        NEW.status = 'cancelado', iif(NEW.status != 'cancelado', NEW.duracao_minutos, 0))
+                ON CONFLICT (dia, profissional, tratamento) DO UPDATE SET
+                    sessoes = sessoes + excluded.sessoes, realizadas = realizadas + excluded.realizadas,
+                    faltas = faltas + excluded.faltas, cancelados = cancelados + excluded.cancelados,
+                    minutos = minutos + excluded.minutos;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_dia_delete AFTER DELETE ON atendimento
+        BEGIN
+            UPDATE resumo_atendimento_dia SET
+                sessoes = sessoes - (OLD.status != 'cancelado'), realizadas = realizadas - (OLD.status = 'realizado'),
+                faltas = faltas - (OLD.status = 'faltou'), cancelados = cancelados - (OLD.status = 'cancelado'),
+                minutos = minutos - iif(OLD.status != 'cancelado', OLD.duracao_minutos, 0)
+                WHERE dia = date(OLD.data_atendimento) AND profissional = OLD.profissional AND tratamento = OLD.tratamento;
+            DELETE FROM resumo_atendimento_dia
+                WHERE dia = date(OLD.data_atendimento) AND profissional = OLD.profissional
+                AND tratamento = OLD.tratamento AND sessoes <= 0 AND cancelados <= 0;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_dia_update
+        AFTER UPDATE OF data_atendimento, profissional, tratamento, status, duracao_minutos ON atendimento
+        BEGIN
+            UPDATE resumo_atendimento_dia SET
+                sessoes = sessoes - (OLD.status != 'cancelado'), realizadas = realizadas - (OLD.status = 'realizado'),
+                faltas = faltas - (OLD.status = 'faltou'), cancelados = cancelados - (OLD.status = 'cancelado'),
+                minutos = minutos - iif(OLD.status != 'cancelado', OLD.duracao_minutos, 0)
+                WHERE dia = date(OLD.data_atendimento) AND profissional = OLD.profissional AND tratamento = OLD.tratamento;
+            DELETE FROM resumo_atendimento_dia
+                WHERE dia = date(OLD.data_atendimento) AND profissional = OLD.profissional
+                AND tratamento = OLD.tratamento AND sessoes <= 0 AND cancelados <= 0;
+            INSERT INTO resumo_atendimento_dia
+                (dia, profissional, tratamento, sessoes, realizadas, faltas, cancelados, minutos)
+                VALUES (date(NEW.data_atendimento), NEW.profissional, NEW.tratamento,
+                        NEW.status != 'cancelado', NEW.status = 'realizado', NEW.status = 'faltou',
+                        NEW.status = 'cancelado', iif(NEW.status != 'cancelado', NEW.duracao_minutos, 0))
+                ON CONFLICT (dia, profissional, tratamento) DO UPDATE SET
+                    sessoes = sessoes + excluded.sessoes, realizadas = realizadas + excluded.realizadas,
+                    faltas = faltas + excluded.faltas, cancelados = cancelados + excluded.cancelados,
+                    minutos = minutos + excluded.minutos;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_cadastro_insert AFTER INSERT ON paciente
+        WHEN NEW.data_cadastro IS NOT NULL
+        BEGIN
+            INSERT INTO resumo_cadastro_dia (dia, total) VALUES (date(NEW.data_cadastro), 1)
+                ON CONFLICT (dia) DO UPDATE SET total = total + 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_cadastro_delete AFTER DELETE ON paciente
+        WHEN OLD.data_cadastro IS NOT NULL
+        BEGIN
+            UPDATE resumo_cadastro_dia SET total = total - 1 WHERE dia = date(OLD.data_cadastro);
+            DELETE FROM resumo_cadastro_dia WHERE dia = date(OLD.data_cadastro) AND total <= 0;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_resumo_cadastro_update AFTER UPDATE OF data_cadastro ON paciente
+        BEGIN
+            UPDATE resumo_cadastro_dia SET total = total - 1 WHERE dia = date(OLD.data_cadastro);
+            DELETE FROM resumo_cadastro_dia WHERE dia = date(OLD.data_cadastro) AND total <= 0;
+            INSERT INTO resumo_cadastro_dia (dia, total)
+                SELECT date(NEW.data_cadastro), 1 WHERE NEW.data_cadastro IS NOT NULL
+                ON CONFLICT (dia) DO UPDATE SET total = total + 1;
+        END""",
+        # Carga inicial a partir dos dados já existentes
+        "DELETE FROM resumo_atendimento_dia",
+        "DELETE FROM resumo_cadastro_dia",
+        """INSERT INTO resumo_atendimento_dia
+            (dia, profissional, tratamento, sessoes, realizadas, faltas, cancelados, minutos)
+            SELECT date(data_atendimento), profissional, tratamento,
+                   SUM(status != 'cancelado'), SUM(status = 'realizado'), SUM(status = 'faltou'),
+                   SUM(status = 'cancelado'), SUM(iif(status != 'cancelado', duracao_minutos, 0))
+            FROM atendimento GROUP BY 1, 2, 3""",
+        """INSERT INTO resumo_cadastro_dia (dia, total)
+            SELECT date(data_cadastro), COUNT(*) FROM paciente WHERE data_cadastro IS NOT NULL GROUP BY 1""",
+    ]),
+    # Chaves de bloqueio dos duplicados (duplicados.py): a tabela vem do
+    # create_all e é populada no preparo do banco; excluir o paciente apaga as chaves.
+    ('0009_chaves_duplicados', [
+        """CREATE TRIGGER IF NOT EXISTS trg_paciente_chave_delete AFTER DELETE ON paciente
+        BEGIN
+            DELETE FROM paciente_chave WHERE paciente_id = OLD.id;
+        END""",
+    ]),
+    # Lembretes (lembretes.py): a tabela vem do create_all. Atendimentos
+    # cancelados ou movidos (ex.: pelo Google Calendar) cancelam ou reagendam
+    # os lembretes pendentes, qualquer que seja o caminho da alteração.
+    ('0010_lembretes', [
+        """CREATE TRIGGER IF NOT EXISTS trg_lembrete_cancelado AFTER UPDATE OF status ON atendimento
+        WHEN NEW.status = 'cancelado' AND OLD.status != 'cancelado'
+        BEGIN
+            UPDATE lembrete SET status = 'cancelado', ultimo_erro = 'Atendimento cancelado'
+                WHERE atendimento_id = NEW.id AND status = 'pendente';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_lembrete_movido AFTER UPDATE OF data_atendimento ON atendimento
+        WHEN NEW.data_atendimento != OLD.data_atendimento
+        BEGIN
+            UPDATE lembrete SET enviar_em = datetime(NEW.data_atendimento, '-' || antecedencia_minutos || ' minutes')
+                WHERE atendimento_id = NEW.id AND status = 'pendente';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_lembrete_atendimento_delete AFTER DELETE ON atendimento
+        BEGIN
+            DELETE FROM lembrete WHERE atendimento_id = OLD.id;
+        END""",
+    ]),
+    # Notas clínicas comprimidas e trecho das observações para as listas (notas.py)
+    ('0011_notas_comprimidas', [
+        adicionar_coluna('atendimento', 'observacoes_trecho', "VARCHAR(120)"),
+        notas.compactar_existentes,
+    ]),
+]
+
+
+def aplicar_migracoes(session):
+    """Aplica as migrações pendentes e retorna os nomes das que foram executadas"""
+    session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migracao ("
+        "nome VARCHAR(100) PRIMARY KEY, "
+        "aplicada_em DATETIME NOT NULL)"
+    ))
+    aplicadas = {linha[0] for linha in session.execute(text("SELECT nome FROM schema_migracao"))}
+
+    executadas = []
+    for nome, comandos in MIGRACOES:
+        if nome in aplicadas:
+            continue
+        for comando in comandos:
+            if callable(comando):
+                comando(session)
+            else:
+                session.execute(text(comando))
+        session.execute(
+            text("INSERT INTO schema_migracao (nome, aplicada_em) VALUES (:nome, :agora)"),
+            {'nome': nome, 'agora': datetime.utcnow()}
+        )
+        executadas.append(nome)
+
+    session.commit()
+    return executadas
@@ -0,0 +1,145 @@
+"""Modelos do banco de dados"""
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+import clinicas
+import notas
+
+# Com várias clínicas, cada requisição consulta o banco da sua (ver clinicas.py)
+db = SQLAlchemy(session_options={'class_': clinicas.SessaoPorClinica})
+
+# Modelo do Paciente
+class Paciente(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False)
+    telefone = db.Column(db.String(20), nullable=False)
+    email = db.Column(db.String(100))
+    endereco = db.Column(db.Text)
+    # Notas clínicas: comprimidas e carregadas só quando usadas (ver notas.py)
+    observacoes_medicas = db.deferred(db.Column(notas.TextoComprimido), group='notas')
+    data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relacionamento com atendimentos (dinâmico: o histórico pode ter centenas de
+    # sessões, então ele nunca é carregado inteiro sem filtro/paginação)
+    atendimentos = db.relationship('Atendimento', backref='paciente', lazy='dynamic')
+
+# Modelo do Atendimento
+class Atendimento(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), nullable=False)
+    data_atendimento = db.Column(db.DateTime, nullable=False)
+    profissional = db.Column(db.String(100), nullable=False)
+    tratamento = db.Column(db.String(100), nullable=False)
+    # Notas clínicas: comprimidas e carregadas só quando usadas (ver notas.py)
+    observacoes = db.deferred(db.Column(notas.TextoComprimido), group='notas')
+    evolucao = db.deferred(db.Column(notas.TextoComprimido), group='notas')
+    # Prévia das observações para as listas; inserções em lote preenchem com notas.trecho()
+    observacoes_trecho = db.Column(db.String(120))
+    evento_calendar_id = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='agendado', server_default='agendado')
+    duracao_minutos = db.Column(db.Integer, nullable=False, default=60, server_default='60')
+    sala = db.Column(db.String(50))
+    plano_id = db.Column(db.Integer, db.ForeignKey('plano_tratamento.id'), index=True)
+
+    @db.validates('observacoes')
+    def _atualizar_trecho(self, chave, valor):
+        self.observacoes_trecho = notas.trecho(valor)
+        return valor
+
+# Série de sessões (ex.: 10 sessões, seg e qui às 10h), expandida em atendimentos
+# e enviada ao Google Calendar como um único evento recorrente
+class PlanoTratamento(db.Model):
+    __tablename__ = 'plano_tratamento'
+    id = db.Column(db.Integer, primary_key=True)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), nullable=False, index=True)
+    tratamento = db.Column(db.String(100), nullable=False)
+    profissional = db.Column(db.String(100), nullable=False)
+    sala = db.Column(db.String(50))
+    duracao_minutos = db.Column(db.Integer, nullable=False, default=60)
+    data_inicio = db.Column(db.Date, nullable=False)
+    horario = db.Column(db.Time, nullable=False)
+    dias_semana = db.Column(db.String(20), nullable=False)  # dias da semana, 0 = segunda: '0,3'
+    sessoes = db.Column(db.Integer, nullable=False)
+    # Id do evento recorrente no Google; cada sessão guarda o id da sua instância
+    evento_calendar_id = db.Column(db.String(255))
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    atendimentos = db.relationship('Atendimento', backref='plano', lazy='dynamic')
+
+# Totais por paciente, mantidos por triggers no banco (ver migracoes.py)
+class PacienteResumo(db.Model):
+    __tablename__ = 'paciente_resumo'
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), primary_key=True)
+    total_atendimentos = db.Column(db.Integer, nullable=False, default=0)
+
+class PacienteTratamento(db.Model):
+    __tablename__ = 'paciente_tratamento'
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), primary_key=True)
+    tratamento = db.Column(db.String(100), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+# Chaves de bloqueio para achar pacientes duplicados (ver duplicados.py)
+class PacienteChave(db.Model):
+    __tablename__ = 'paciente_chave'
+    tipo = db.Column(db.String(10), primary_key=True)     # telefone, email ou nome
+    chave = db.Column(db.String(100), primary_key=True)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('paciente.id'), primary_key=True, index=True)
+
+# Totais diários para os relatórios, mantidos por triggers no banco (ver migracoes.py e relatorios.py)
+class ResumoAtendimentoDia(db.Model):
+    __tablename__ = 'resumo_atendimento_dia'
+    dia = db.Column(db.Date, primary_key=True)
+    profissional = db.Column(db.String(100), primary_key=True)
+    tratamento = db.Column(db.String(100), primary_key=True)
+    sessoes = db.Column(db.Integer, nullable=False, default=0)      # não canceladas
+    realizadas = db.Column(db.Integer, nullable=False, default=0)
+    faltas = db.Column(db.Integer, nullable=False, default=0)
+    cancelados = db.Column(db.Integer, nullable=False, default=0)
+    minutos = db.Column(db.Integer, nullable=False, default=0)      # das sessões não canceladas
+
+class ResumoCadastroDia(db.Model):
+    __tablename__ = 'resumo_cadastro_dia'
+    dia = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+# Lembretes de atendimento a enviar por email/webhook (ver lembretes.py)
+class Lembrete(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    atendimento_id = db.Column(db.Integer, db.ForeignKey('atendimento.id'), nullable=False, index=True)
+    canal = db.Column(db.String(20), nullable=False)                 # email ou webhook
+    enviar_em = db.Column(db.DateTime, nullable=False)               # horário local, como data_atendimento
+    antecedencia_minutos = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    ultimo_erro = db.Column(db.Text)
+    enviado_em = db.Column(db.DateTime)
+
+    atendimento = db.relationship('Atendimento')
+
+    __table_args__ = (
+        db.Index('ix_lembrete_fila', 'status', 'enviar_em'),
+    )
+
+# Modelo para armazenar credenciais do Google
+class GoogleCredentials(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(100), unique=True, nullable=False)
+    credentials = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Token da última listagem incremental de eventos (syncToken do Google)
+    sync_token = db.Column(db.Text)
+
+# Fila (outbox) de eventos a criar no Google Calendar, gravada junto com o atendimento
+class CalendarJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    atendimento_id = db.Column(db.Integer, db.ForeignKey('atendimento.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_erro = db.Column(db.Text)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_calendar_job_fila', 'status', 'proxima_tentativa'),
+    )
@@ -0,0 +1,88 @@
+"""Notas clínicas (observações e evolução): compressão transparente e trechos para as listas.
+
+As colunas de notas usam TextoComprimido. Textos a partir de
+LIMIAR_COMPRESSAO bytes são gravados comprimidos com zlib: um BLOB na
+mesma coluna, já que o SQLite aceita os dois tipos. Na leitura eles voltam
+como texto. Notas curtas ficam como texto puro, legíveis em qualquer
+ferramenta do SQLite.
+
+Nos modelos as notas são `deferred` (grupo 'notas'). As listas (agenda,
+busca, fila do Calendar) carregam pacientes e atendimentos sem ler as
+notas, e usam Atendimento.observacoes_trecho para a prévia. Quem exibe o
+texto completo pede as notas na consulta com `db.undefer_group('notas')`.
+"""
+import zlib
+
+from sqlalchemy import text
+from sqlalchemy.types import Text, TypeDecorator
+
+# Abaixo disso o zlib quase não ganha espaço e o texto fica legível no banco
+LIMIAR_COMPRESSAO = 256
+NIVEL_COMPRESSAO = 6
+
+TAMANHO_TRECHO = 100
+
+
+def comprimir(texto):
+    if texto is None:
+        return None
+    dados = texto.encode('utf-8')
+    if len(dados) < LIMIAR_COMPRESSAO:
+        return texto
+    comprimido = zlib.compress(dados, NIVEL_COMPRESSAO)
+    return comprimido if len(comprimido) < len(dados) else texto
+
+
+def descomprimir(valor):
+    if isinstance(valor, bytes):
+        return zlib.decompress(valor).decode('utf-8')
+    return valor
+
+
+class TextoComprimido(TypeDecorator):
+    """Text que grava as notas longas comprimidas e as devolve como texto"""
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return comprimir(value)
+
+    def process_result_value(self, value, dialect):
+        return descomprimir(value)
+
+
+def trecho(texto, tamanho=TAMANHO_TRECHO):
+    """Início da nota em uma linha, com reticências se ela for maior ('Paciente relata…')"""
+    if not texto:
+        return None
+    texto = ' '.join(texto.split())
+    return texto if len(texto) <= tamanho else texto[:tamanho].rstrip() + '…'
+
+
+def compactar_existentes(session, tamanho_lote=5000):
+    """Passo da migração 0011: comprime as notas longas já gravadas e preenche os trechos"""
+    ultimo_id = 0
+    while True:
+        linhas = session.execute(text(
+            "SELECT id, observacoes, evolucao FROM atendimento "
+            "WHERE id > :ultimo AND (observacoes IS NOT NULL OR evolucao IS NOT NULL) ORDER BY id LIMIT :limite"),
+            {'ultimo': ultimo_id, 'limite': tamanho_lote}).fetchall()
+        if not linhas:
+            break
+        session.execute(text(
+            "UPDATE atendimento SET observacoes = :observacoes, evolucao = :evolucao, "
+            "observacoes_trecho = :trecho WHERE id = :id"
+        ), [{'id': atendimento_id,
+             'observacoes': comprimir(descomprimir(observacoes)),
+             'evolucao': comprimir(descomprimir(evolucao)),
+             'trecho': trecho(descomprimir(observacoes))}
+            for atendimento_id, observacoes, evolucao in linhas])
+        ultimo_id = linhas[-1][0]
+
+    linhas = session.execute(text(
+        "SELECT id, observacoes_medicas FROM paciente "
+        "WHERE typeof(observacoes_medicas) = 'text' AND length(CAST(observacoes_medicas AS BLOB)) >= :limiar"),
+        {'limiar': LIMIAR_COMPRESSAO}).fetchall()
+    if linhas:
+        session.execute(text("UPDATE paciente SET observacoes_medicas = :observacoes WHERE id = :id"),
+                        [{'id': paciente_id, 'observacoes': comprimir(observacoes)} for paciente_id, observacoes in linhas])
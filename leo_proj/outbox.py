@@ -0,0 +1,256 @@
+"""Fila (outbox) de criação de eventos no Google Calendar.
+
+O atendimento e o seu CalendarJob são gravados na mesma transação, e a
+requisição termina sem falar com o Google. Um worker em segundo plano
+(thread no próprio processo ou `flask --app app2 worker-calendar`) cria os
+eventos em lote e reagenda as falhas com espera exponencial.
+
+As sessões de um plano de tratamento têm um job cada, mas viram um único
+evento recorrente no Google (ver planos.py).
+"""
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+
+import calendar_sync
+import clinicas
+import planos
+from models import db, Atendimento, CalendarJob, PlanoTratamento
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_FALHOU = 'falhou'
+
+STATUS_ABERTOS = (STATUS_PENDENTE, STATUS_PROCESSANDO)
+
+MAXIMO_TENTATIVAS = 8
+ESPERA_BASE = 5          # segundos antes da 1ª nova tentativa
+ESPERA_MAXIMA = 3600     # teto da espera entre tentativas
+
+# Tempo que um job fica reservado para o worker; se o processo morrer no
+# meio do envio, o job volta para a fila depois disso.
+RESERVA = timedelta(minutes=5)
+
+
+def calcular_espera(tentativas):
+    """Espera exponencial com variação aleatória: ~5s, 10s, 20s... até 1h"""
+    espera = min(ESPERA_BASE * (2 ** (tentativas - 1)), ESPERA_MAXIMA)
+    return timedelta(seconds=espera * random.uniform(0.8, 1.2))
+
+
+def enfileirar(atendimento):
+    """Adiciona o job do atendimento à sessão (o commit é de quem chama)"""
+    job = CalendarJob(atendimento_id=atendimento.id, status=STATUS_PENDENTE)
+    db.session.add(job)
+    return job
+
+
+def enfileirar_ids(atendimento_ids):
+    """Enfileira vários atendimentos com um único INSERT (o commit é de quem chama)"""
+    agora = datetime.utcnow()
+    db.session.execute(CalendarJob.__table__.insert(), [
+        {'atendimento_id': atendimento_id, 'status': STATUS_PENDENTE, 'tentativas': 0,
+         'proxima_tentativa': agora, 'criado_em': agora}
+        for atendimento_id in atendimento_ids
+    ])
+
+
+def enfileirar_pendentes():
+    """Enfileira os atendimentos futuros sem evento que ainda não estão na fila.
+
+    Retorna quantos foram enfileirados (o commit é de quem chama).
+    """
+    na_fila = db.session.query(CalendarJob.atendimento_id).filter(CalendarJob.status.in_(STATUS_ABERTOS))
+    ids = [linha[0] for linha in db.session.query(Atendimento.id).filter(
+        Atendimento.evento_calendar_id.is_(None),
+        Atendimento.status != 'cancelado',
+        Atendimento.data_atendimento >= datetime.now(),
+        Atendimento.id.notin_(na_fila)
+    ).order_by(Atendimento.id)]
+    if ids:
+        enfileirar_ids(ids)
+    return len(ids)
+
+
+def resumo_fila():
+    """Quantidade de jobs por situação (pendentes inclui os em processamento)"""
+    totais = dict(db.session.query(CalendarJob.status, db.func.count()).filter(
+        CalendarJob.status.in_(STATUS_ABERTOS + (STATUS_FALHOU,))
+    ).group_by(CalendarJob.status).all())
+    pendentes = totais.get(STATUS_PENDENTE, 0) + totais.get(STATUS_PROCESSANDO, 0)
+    return {'em_andamento': pendentes > 0, 'pendentes': pendentes, 'falharam': totais.get(STATUS_FALHOU, 0)}
+
+
+def reservar_jobs(limite):
+    """Reserva até `limite` jobs vencidos para este worker e os retorna"""
+    agora = datetime.utcnow()
+    candidatos = db.session.query(CalendarJob.id, CalendarJob.proxima_tentativa).filter(
+        CalendarJob.status.in_(STATUS_ABERTOS),
+        CalendarJob.proxima_tentativa <= agora
+    ).order_by(CalendarJob.proxima_tentativa).limit(limite).all()
+
+    reservados = []
+    for job_id, proxima_tentativa in candidatos:
+        # Só reserva se nenhum outro worker alterou o job desde a leitura
+        alterados = CalendarJob.query.filter(
+            CalendarJob.id == job_id,
+            CalendarJob.proxima_tentativa == proxima_tentativa
+        ).update({
+            'status': STATUS_PROCESSANDO,
+            'proxima_tentativa': agora + RESERVA
+        }, synchronize_session=False)
+        if alterados:
+            reservados.append(job_id)
+    db.session.commit()
+
+    if not reservados:
+        return []
+    return CalendarJob.query.filter(CalendarJob.id.in_(reservados)).all()
+
+
+def _registrar_falha(job, erro):
+    job.tentativas += 1
+    job.ultimo_erro = str(erro)[:1000]
+    if job.tentativas >= MAXIMO_TENTATIVAS:
+        job.status = STATUS_FALHOU
+    else:
+        job.status = STATUS_PENDENTE
+        job.proxima_tentativa = datetime.utcnow() + calcular_espera(job.tentativas)
+
+
+def _enviar_plano(service, plano_id, jobs, atendimentos):
+    """Cria (uma vez) o evento recorrente do plano e liga cada sessão à sua ocorrência"""
+    plano = db.session.get(PlanoTratamento, plano_id)
+    if plano.evento_calendar_id is None:
+        primeiro = plano.atendimentos.order_by(Atendimento.data_atendimento).first()
+        try:
+            plano.evento_calendar_id = calendar_sync.enviar_plano(
+                service, plano, primeiro, planos.regra_recorrencia(plano))
+        except Exception as e:
+            for job in jobs:
+                _registrar_falha(job, e)
+            return
+
+    for job in jobs:
+        atendimento = atendimentos[job.atendimento_id]
+        atendimento.evento_calendar_id = calendar_sync.id_da_instancia(
+            plano.evento_calendar_id, atendimento.data_atendimento)
+        job.status = STATUS_CONCLUIDO
+        job.ultimo_erro = None
+
+
+def processar_lote(service, limite=calendar_sync.TAMANHO_LOTE):
+    """Processa um lote da fila e retorna quantos jobs foram tratados"""
+    jobs = reservar_jobs(limite)
+    if not jobs:
+        return 0
+
+    # As observações vão na descrição do evento; as demais notas ficam no banco
+    atendimentos = {a.id: a for a in Atendimento.query.options(
+        db.joinedload(Atendimento.paciente), db.undefer(Atendimento.observacoes)
+    ).filter(Atendimento.id.in_([j.atendimento_id for j in jobs])).all()}
+
+    a_enviar = []
+    jobs_avulsos = []
+    jobs_por_plano = {}
+    for job in jobs:
+        atendimento = atendimentos.get(job.atendimento_id)
+        if atendimento is None or atendimento.evento_calendar_id or atendimento.status == 'cancelado':
+            # Atendimento removido, cancelado ou já sincronizado por outro caminho
+            job.status = STATUS_CONCLUIDO
+        elif atendimento.plano_id:
+            jobs_por_plano.setdefault(atendimento.plano_id, []).append(job)
+        else:
+            a_enviar.append(atendimento)
+            jobs_avulsos.append(job)
+
+    for plano_id, jobs_do_plano in jobs_por_plano.items():
+        _enviar_plano(service, plano_id, jobs_do_plano, atendimentos)
+
+    if a_enviar:
+        try:
+            event_ids, erros = calendar_sync.enviar_lote(service, a_enviar)
+        except Exception as e:
+            event_ids, erros = {}, {a.id: e for a in a_enviar}
+
+        for job in jobs_avulsos:
+            event_id = event_ids.get(job.atendimento_id)
+            if event_id:
+                atendimentos[job.atendimento_id].evento_calendar_id = event_id
+                job.status = STATUS_CONCLUIDO
+                job.ultimo_erro = None
+            else:
+                _registrar_falha(job, erros.get(job.atendimento_id, 'Evento não criado'))
+
+    db.session.commit()
+    return len(jobs)
+
+
+class WorkerCalendar(threading.Thread):
+    """Thread que esvazia a fila; `notificar()` a acorda logo após um enfileiramento.
+
+    `ao_processar` é chamado depois de cada rodada que tratou algum job, no
+    contexto da clínica dos jobs. `obter_servico` é chamado no mesmo contexto
+    e deve devolver o serviço da conta Google daquela clínica.
+    """
+
+    def __init__(self, app, obter_servico, intervalo=10, ao_processar=None):
+        super().__init__(name='worker-calendar', daemon=True)
+        self.app = app
+        self.obter_servico = obter_servico
+        self.intervalo = intervalo
+        self.ao_processar = ao_processar
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+
+    def notificar(self):
+        self._acordar.set()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def executar_uma_vez(self):
+        """Processa a fila (a de cada clínica, se houver várias) até esvaziá-la; retorna o total de jobs tratados"""
+        total = 0
+        for slug in clinicas.slugs(self.app):
+            if self._parar.is_set():
+                break
+            try:
+                with clinicas.contexto(self.app, slug):
+                    processados = self._esvaziar_fila()
+                    if processados and self.ao_processar:
+                        self.ao_processar()
+            except Exception:
+                # Um banco com problema não segura a fila das outras clínicas
+                if slug is None:
+                    raise
+                logger.exception('Erro no worker do Google Calendar (clínica %s)', slug)
+                continue
+            total += processados
+        return total
+
+    def _esvaziar_fila(self):
+        service = self.obter_servico()
+        if service is None:
+            return 0
+        total = 0
+        while not self._parar.is_set():
+            processados = processar_lote(service)
+            if not processados:
+                break
+            total += processados
+        return total
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                self.executar_uma_vez()
+            except Exception:
+                logger.exception('Erro no worker do Google Calendar')
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
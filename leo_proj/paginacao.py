@@ -0,0 +1,58 @@
+"""Paginação por cursor (keyset) para listagens grandes.
+
+Em vez de OFFSET, cada página começa logo depois da última linha da página
+anterior, usando os valores das colunas de ordenação. Com um índice nessas
+colunas o custo de qualquer página é o mesmo, não importa o tamanho da tabela.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_, literal, DateTime
+
+
+def codificar_cursor(valores):
+    """Serializa os valores da última linha em um token opaco para a URL"""
+    valores = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    dados = json.dumps(valores, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(dados).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, quantidade_colunas):
+    """Retorna a lista de valores do cursor; ValueError se o token for inválido"""
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+    if not isinstance(valores, list) or len(valores) != quantidade_colunas:
+        raise ValueError('Cursor inválido')
+    return valores
+
+
+def paginar(query, colunas, cursor=None, limite=30, descendente=False):
+    """Aplica a paginação por cursor à query.
+
+    Retorna (itens, proximo_cursor); proximo_cursor é None na última página.
+    As colunas devem identificar a linha de forma única (termine com o id).
+    """
+    if cursor:
+        valores = decodificar_cursor(cursor, len(colunas))
+        try:
+            valores = [datetime.fromisoformat(v) if isinstance(c.type, DateTime) else v
+                       for c, v in zip(colunas, valores)]
+        except (TypeError, ValueError):
+            raise ValueError('Cursor inválido')
+        chave = tuple_(*colunas)
+        limite_anterior = tuple_(*[literal(v, c.type) for c, v in zip(colunas, valores)])
+        query = query.filter(chave < limite_anterior if descendente else chave > limite_anterior)
+
+    ordenacao = [c.desc() if descendente else c.asc() for c in colunas]
+    itens = query.order_by(*ordenacao).limit(limite + 1).all()
+
+    proximo_cursor = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo_cursor = codificar_cursor([getattr(itens[-1], c.key) for c in colunas])
+    return itens, proximo_cursor
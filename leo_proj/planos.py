@@ -0,0 +1,109 @@
+"""Planos de tratamento: uma série de sessões criada de uma vez.
+
+O plano guarda a regra (dias da semana, horário, número de sessões) e é
+expandido em atendimentos gravados com um único INSERT em lote, junto com
+os jobs do Google Calendar. O worker cria para o plano um só evento
+recorrente (RRULE) e associa cada atendimento à sua instância, cujo id o
+Google forma como <id do evento>_<início em UTC, AAAAMMDDTHHMMSSZ>.
+"""
+from datetime import date, datetime, timedelta
+
+import agendamento
+import notas
+from models import db, Atendimento, PlanoTratamento
+
+DIAS_RRULE = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+NOMES_DIAS = ('Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom')
+MAXIMO_SESSOES = 100
+
+
+def dias_do_plano(plano):
+    return [int(d) for d in plano.dias_semana.split(',')]
+
+
+def expandir(data_inicio, dias_semana, horario, sessoes):
+    """Datas/horas das `sessoes` primeiras ocorrências a partir de data_inicio"""
+    dias = set(dias_semana)
+    if not dias or sessoes < 1:
+        return []
+    inicios = []
+    dia = data_inicio
+    while len(inicios) < sessoes:
+        if dia.weekday() in dias:
+            inicios.append(datetime.combine(dia, horario))
+        dia += timedelta(days=1)
+    return inicios
+
+
+def inicios(plano):
+    return expandir(plano.data_inicio, dias_do_plano(plano), plano.horario, plano.sessoes)
+
+
+def regra_recorrencia(plano):
+    """RRULE equivalente a expandir(); o início do evento é a primeira sessão"""
+    dias = ','.join(DIAS_RRULE[d] for d in sorted(dias_do_plano(plano)))
+    return f'RRULE:FREQ=WEEKLY;BYDAY={dias};COUNT={plano.sessoes}'
+
+
+def descrever(plano):
+    dias = ', '.join(NOMES_DIAS[d] for d in sorted(dias_do_plano(plano)))
+    return f'{plano.sessoes} sessões de {plano.tratamento} ({dias}, {plano.horario:%H:%M})'
+
+
+def ler_formulario(form, paciente_id):
+    """PlanoTratamento a partir do formulário; ValueError com a mensagem para o usuário"""
+    tratamento = form.get('tratamento', '')
+    if tratamento == 'Outros':
+        tratamento = form.get('tratamento_customizado', '').strip() or 'Outros'
+    profissional = form.get('profissional', '').strip()
+    if not tratamento or not profissional:
+        raise ValueError('Informe o tratamento e o profissional.')
+
+    dias_semana = sorted({int(d) for d in form.getlist('dias_semana') if d in ('0', '1', '2', '3', '4', '5', '6')})
+    if not dias_semana:
+        raise ValueError('Escolha ao menos um dia da semana.')
+    try:
+        data_inicio = date.fromisoformat(form.get('data_inicio', ''))
+        horario = datetime.strptime(form.get('horario', ''), '%H:%M').time()
+        sessoes = int(form.get('sessoes', ''))
+    except ValueError:
+        raise ValueError('Preencha a data de início, o horário e o número de sessões.')
+    if not 1 <= sessoes <= MAXIMO_SESSOES:
+        raise ValueError(f'O plano deve ter entre 1 e {MAXIMO_SESSOES} sessões.')
+
+    return PlanoTratamento(
+        paciente_id=paciente_id,
+        tratamento=tratamento[:100],
+        profissional=profissional[:100],
+        sala=form.get('sala', '').strip() or None,
+        duracao_minutos=agendamento.validar_duracao(form.get('duracao_minutos')),
+        data_inicio=data_inicio,
+        horario=horario,
+        dias_semana=','.join(str(d) for d in dias_semana),
+        sessoes=sessoes,
+    )
+
+
+def criar_plano(plano, observacoes=None):
+    """Grava o plano e as suas sessões; o commit é de quem chama.
+
+    Retorna os ids dos atendimentos criados, em ordem de data.
+    """
+    db.session.add(plano)
+    db.session.flush()
+
+    db.session.execute(Atendimento.__table__.insert(), [{
+        'paciente_id': plano.paciente_id,
+        'plano_id': plano.id,
+        'data_atendimento': inicio,
+        'duracao_minutos': plano.duracao_minutos,
+        'profissional': plano.profissional,
+        'sala': plano.sala,
+        'tratamento': plano.tratamento,
+        'observacoes': observacoes,
+        'observacoes_trecho': notas.trecho(observacoes),
+        'status': 'agendado',
+    } for inicio in inicios(plano)])
+    return [linha[0] for linha in db.session.query(Atendimento.id).filter(
+        Atendimento.plano_id == plano.id
+    ).order_by(Atendimento.data_atendimento)]
@@ -0,0 +1,98 @@
+"""Relatórios mensais a partir dos totais diários mantidos por triggers.
+
+resumo_atendimento_dia tem uma linha por (dia, profissional, tratamento),
+com as sessões, realizadas, faltas e cancelamentos, e resumo_cadastro_dia
+uma por dia de cadastro (migração 0008). O relatório soma essas linhas pela
+chave primária, que começa em `dia`, em vez de ler cada atendimento.
+
+Faltas: a taxa é faltas / sessões já passadas (não canceladas, antes de hoje).
+
+Para análises fora do app, `colunas_diarias()` devolve os totais em
+colunas (listas de mesmo tamanho) e `dataframe()` os entrega como um
+DataFrame do pandas, se ele estiver instalado.
+"""
+from datetime import date
+
+from models import db, ResumoAtendimentoDia, ResumoCadastroDia
+
+DIMENSOES = ('profissional', 'tratamento')
+
+COLUNAS_MENSAIS = ('mes', 'chave', 'sessoes', 'realizadas', 'faltas', 'cancelados', 'passadas', 'minutos', 'taxa_faltas')
+COLUNAS_DIARIAS = ('dia', 'profissional', 'tratamento', 'sessoes', 'realizadas', 'faltas', 'cancelados', 'minutos')
+
+
+def inicio_do_mes(dia):
+    return dia.replace(day=1)
+
+
+def mes_seguinte(dia):
+    return date(dia.year + dia.month // 12, dia.month % 12 + 1, 1)
+
+
+def sessoes_por_mes(inicio, fim, dimensao=None, hoje=None):
+    """Totais por mês em [inicio, fim), por profissional, por tratamento ou gerais.
+
+    Retorna um dicionário por (mês, chave) com as colunas de COLUNAS_MENSAIS;
+    `chave` é None sem dimensão.
+    """
+    if dimensao is not None and dimensao not in DIMENSOES:
+        raise ValueError(f'Dimensão inválida: {dimensao}')
+    hoje = hoje or date.today()
+    r = ResumoAtendimentoDia
+    mes = db.func.strftime('%Y-%m', r.dia)
+    chave = getattr(r, dimensao) if dimensao else db.literal(None)
+
+    consulta = db.session.query(
+        mes, chave,
+        db.func.sum(r.sessoes),
+        db.func.sum(r.realizadas),
+        db.func.sum(r.faltas),
+        db.func.sum(r.cancelados),
+        db.func.sum(db.case((r.dia < hoje, r.sessoes), else_=0)),
+        db.func.sum(r.minutos),
+    ).filter(r.dia >= inicio, r.dia < fim)
+    if dimensao:
+        consulta = consulta.group_by(mes, chave).order_by(mes, chave)
+    else:
+        consulta = consulta.group_by(mes).order_by(mes)
+
+    linhas = []
+    for valores in consulta:
+        linha = dict(zip(COLUNAS_MENSAIS, valores))
+        linha['taxa_faltas'] = linha['faltas'] / linha['passadas'] if linha['passadas'] else None
+        linhas.append(linha)
+    return linhas
+
+
+def pacientes_novos_por_mes(inicio, fim):
+    """[(mês 'AAAA-MM', pacientes cadastrados)] em [inicio, fim)"""
+    mes = db.func.strftime('%Y-%m', ResumoCadastroDia.dia)
+    return db.session.query(mes, db.func.sum(ResumoCadastroDia.total)).filter(
+        ResumoCadastroDia.dia >= inicio,
+        ResumoCadastroDia.dia < fim
+    ).group_by(mes).order_by(mes).all()
+
+
+def colunas_diarias(inicio, fim):
+    """Totais diários de [inicio, fim) em colunas: {'dia': [...], 'profissional': [...], ...}"""
+    r = ResumoAtendimentoDia
+    linhas = db.session.query(*[getattr(r, nome) for nome in COLUNAS_DIARIAS]).filter(
+        r.dia >= inicio, r.dia < fim
+    ).order_by(r.dia).all()
+    if not linhas:
+        return {nome: [] for nome in COLUNAS_DIARIAS}
+    return dict(zip(COLUNAS_DIARIAS, (list(coluna) for coluna in zip(*linhas))))
+
+
+def dataframe(inicio, fim):
+    """DataFrame do pandas com os totais diários (pip install pandas)"""
+    try:
+        import pandas
+    except ImportError:
+        raise RuntimeError('O pandas não está instalado: pip install pandas (ou use colunas_diarias)')
+
+    tabela = pandas.DataFrame(colunas_diarias(inicio, fim), columns=COLUNAS_DIARIAS)
+    tabela['dia'] = pandas.to_datetime(tabela['dia'])
+    for nome in ('profissional', 'tratamento'):
+        tabela[nome] = tabela[nome].astype('category')
+    return tabela
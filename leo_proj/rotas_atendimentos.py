@@ -0,0 +1,237 @@
+"""Rotas de atendimentos: registro, planos de tratamento, horários livres e agenda"""
+from datetime import datetime, date, timedelta
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+
+import agendamento
+import outbox
+import planos
+from extensoes import calendar, lembretes, dados_alterados
+from models import db, Paciente, Atendimento
+
+bp = Blueprint('atendimentos', __name__, cli_group=None)
+
+# Períodos da agenda, em dias
+PERIODOS_AGENDA = {'semana': 7, 'mes': 30}
+
+# Situações que a recepção registra depois do horário (cancelamentos vêm do Google Calendar)
+STATUS_REGISTRAVEIS = {'agendado': 'Agendado', 'realizado': 'Realizado', 'faltou': 'Faltou'}
+
+@bp.route('/novo_atendimento/<int:paciente_id>', methods=['GET', 'POST'])
+def novo_atendimento(paciente_id):
+    paciente = Paciente.query.get_or_404(paciente_id)
+    
+    if request.method == 'POST':
+        data_atendimento_str = request.form['data_atendimento']
+        data_atendimento = datetime.fromisoformat(data_atendimento_str)
+        profissional = request.form['profissional'].strip()
+        tratamento = request.form['tratamento']
+        sala = request.form.get('sala', '').strip() or None
+        
+        # Se tratamento for "Outros", pega o valor customizado
+        if tratamento == 'Outros':
+            tratamento = request.form.get('tratamento_customizado', 'Outros')
+        
+        observacoes = request.form.get('observacoes', '')
+        evolucao = request.form.get('evolucao', '')
+        agendar_google = calendar.ativa and 'agendar_google' in request.form
+        enviar_lembrete = lembretes.ativos and 'enviar_notificacao' in request.form
+
+        try:
+            duracao = agendamento.validar_duracao(request.form.get('duracao_minutos'))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('novo_atendimento.html', paciente=paciente, dados=request.form)
+
+        # Profissional ou sala já ocupados no horário: avisa e só grava se confirmado
+        conflitos = agendamento.conflitos(data_atendimento, duracao, profissional, sala)
+        if conflitos and 'ignorar_conflito' not in request.form:
+            flash('Horário em conflito com outro atendimento. Escolha outro horário ou confirme o encaixe.', 'warning')
+            return render_template('novo_atendimento.html', paciente=paciente, dados=request.form,
+                                 conflitos=[agendamento.descrever_conflito(a) for a in conflitos])
+        
+        # Criar novo atendimento
+        atendimento = Atendimento(
+            paciente_id=paciente_id,
+            data_atendimento=data_atendimento,
+            duracao_minutos=duracao,
+            profissional=profissional,
+            sala=sala,
+            tratamento=tratamento,
+            observacoes=observacoes if observacoes else None,
+            evolucao=evolucao if evolucao else None
+        )
+        
+        try:
+            db.session.add(atendimento)
+            db.session.flush()  # Para obter o ID do atendimento
+            
+            # O evento no Google Calendar é criado em segundo plano pela fila
+            if agendar_google:
+                outbox.enfileirar(atendimento)
+            # Lembretes por email/webhook, enviados pelo worker na hora certa
+            agendados = lembretes.agendar([atendimento]) if enviar_lembrete else 0
+            
+            db.session.commit()
+            dados_alterados()
+            if agendar_google:
+                calendar.notificar_worker()
+                flash('O atendimento será adicionado ao Google Calendar em instantes.', 'info')
+            if agendados:
+                lembretes.notificar_worker()
+                flash('O paciente receberá um lembrete antes do atendimento.', 'info')
+            elif enviar_lembrete:
+                flash('Lembrete não agendado: o paciente não tem contato para os canais configurados '
+                      'ou o atendimento já passou.', 'warning')
+            flash(f'Atendimento registrado com sucesso para {paciente.nome}!', 'success')
+            return redirect(url_for('pacientes.visualizar_paciente', id=paciente_id))
+            
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Erro ao registrar atendimento')
+            flash('Erro ao registrar atendimento. Tente novamente.', 'error')
+    
+    return render_template('novo_atendimento.html', paciente=paciente, dados=request.form)
+
+@bp.route('/atendimento/<int:id>/status', methods=['POST'])
+def registrar_status(id):
+    """Marca o atendimento como realizado ou falta (entra nos relatórios de faltas)"""
+    atendimento = Atendimento.query.get_or_404(id)
+    status = request.form.get('status')
+    if status not in STATUS_REGISTRAVEIS or atendimento.status == 'cancelado':
+        flash('Situação inválida para este atendimento.', 'error')
+    else:
+        atendimento.status = status
+        db.session.commit()
+        dados_alterados()
+        flash(f'Atendimento marcado como {STATUS_REGISTRAVEIS[status].lower()}.', 'success')
+    return redirect(url_for('pacientes.visualizar_paciente', id=atendimento.paciente_id))
+
+@bp.route('/novo_plano/<int:paciente_id>', methods=['GET', 'POST'])
+def novo_plano(paciente_id):
+    """Plano de tratamento: várias sessões (ex.: 10 sessões, seg e qui) em um só envio"""
+    paciente = Paciente.query.get_or_404(paciente_id)
+
+    if request.method == 'POST':
+        try:
+            plano = planos.ler_formulario(request.form, paciente_id)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('novo_plano.html', paciente=paciente, dados=request.form, nomes_dias=planos.NOMES_DIAS)
+
+        # Conflitos de todas as sessões com uma só consulta por faixa
+        conflitos = agendamento.conflitos_em_serie(planos.inicios(plano), plano.duracao_minutos, plano.profissional, plano.sala)
+        if conflitos and 'ignorar_conflito' not in request.form:
+            flash(f'{len(conflitos)} sessão(ões) em conflito com outros atendimentos. Ajuste o plano ou confirme os encaixes.', 'warning')
+            return render_template('novo_plano.html', paciente=paciente, dados=request.form, nomes_dias=planos.NOMES_DIAS,
+                                 conflitos=[agendamento.descrever_conflito(a) for a in conflitos])
+
+        agendar_google = calendar.ativa and 'agendar_google' in request.form
+        enviar_lembrete = lembretes.ativos and 'enviar_notificacao' in request.form
+        try:
+            ids = planos.criar_plano(plano, request.form.get('observacoes', '') or None)
+            if agendar_google:
+                outbox.enfileirar_ids(ids)
+            agendados = 0
+            if enviar_lembrete:
+                agendados = lembretes.agendar(Atendimento.query.options(
+                    db.joinedload(Atendimento.paciente)).filter(Atendimento.id.in_(ids)))
+            db.session.commit()
+            dados_alterados()
+            if agendar_google:
+                calendar.notificar_worker()
+                flash('As sessões serão adicionadas ao Google Calendar como um evento recorrente.', 'info')
+            if agendados:
+                lembretes.notificar_worker()
+                flash('O paciente receberá um lembrete antes de cada sessão.', 'info')
+            elif enviar_lembrete:
+                flash('Lembretes não agendados: o paciente não tem contato para os canais configurados.', 'warning')
+            flash(f'Plano criado para {paciente.nome}: {planos.descrever(plano)}.', 'success')
+            return redirect(url_for('pacientes.visualizar_paciente', id=paciente_id))
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Erro ao criar plano de tratamento')
+            flash('Erro ao criar o plano de tratamento. Tente novamente.', 'error')
+
+    return render_template('novo_plano.html', paciente=paciente, dados=request.form, nomes_dias=planos.NOMES_DIAS)
+
+@bp.route('/api/horarios_livres')
+def api_horarios_livres():
+    """Horários livres do profissional (e da sala) no dia: ?data=AAAA-MM-DD&profissional=&duracao=&sala="""
+    profissional = request.args.get('profissional', '').strip()
+    try:
+        dia = date.fromisoformat(request.args.get('data', ''))
+        duracao = agendamento.validar_duracao(request.args.get('duracao'))
+    except ValueError:
+        return jsonify({'erro': 'Parâmetros inválidos: data deve ser AAAA-MM-DD e duracao em minutos.'}), 400
+    if not profissional:
+        return jsonify({'erro': 'Informe o profissional.'}), 400
+
+    livres = agendamento.horarios_livres(dia, profissional, duracao, request.args.get('sala', '').strip() or None)
+    return jsonify({
+        'data': dia.isoformat(),
+        'profissional': profissional,
+        'duracao_minutos': duracao,
+        'horarios': [h.strftime('%H:%M') for h in livres],
+    })
+
+def carregar_agenda(inicio, fim):
+    """Carrega os atendimentos do período em uma única query e agrupa por dia.
+
+    Retorna (agenda_por_dia, resumo), com os totais já calculados.
+    """
+    atendimentos = Atendimento.query.options(db.joinedload(Atendimento.paciente)).filter(
+        Atendimento.data_atendimento >= inicio,
+        Atendimento.data_atendimento < fim,
+        Atendimento.status != 'cancelado'
+    ).order_by(Atendimento.data_atendimento).all()
+    
+    agenda_por_dia = {}
+    sincronizados = 0
+    for atendimento in atendimentos:
+        agenda_por_dia.setdefault(atendimento.data_atendimento.date(), []).append(atendimento)
+        if atendimento.evento_calendar_id:
+            sincronizados += 1
+    
+    resumo = {
+        'total': len(atendimentos),
+        'sincronizados': sincronizados,
+        'pendentes': len(atendimentos) - sincronizados,
+        'dias': len(agenda_por_dia),
+    }
+    return agenda_por_dia, resumo
+
+@bp.route('/agenda')
+def agenda():
+    periodo = request.args.get('periodo', 'mes')
+    if periodo not in PERIODOS_AGENDA:
+        periodo = 'mes'
+    try:
+        inicio = date.fromisoformat(request.args.get('inicio', ''))
+    except ValueError:
+        inicio = date.today()
+    dias = timedelta(days=PERIODOS_AGENDA[periodo])
+    fim = inicio + dias
+    
+    agenda_por_dia, resumo = carregar_agenda(
+        datetime.combine(inicio, datetime.min.time()),
+        datetime.combine(fim, datetime.min.time())
+    )
+    
+    return render_template('agenda.html',
+                         agenda_por_dia=agenda_por_dia,
+                         resumo=resumo,
+                         periodo=periodo,
+                         inicio=inicio,
+                         fim=fim - timedelta(days=1),
+                         anterior=(inicio - dias).isoformat(),
+                         proximo=fim.isoformat())
+
+@bp.cli.command('worker-lembretes')
+def worker_lembretes_command():
+    """Envia os lembretes de atendimento neste processo (sem a thread do servidor)"""
+    if not lembretes.ativos:
+        raise SystemExit('Nenhum canal de lembrete configurado: defina LEMBRETES_SMTP_HOST ou LEMBRETES_WEBHOOK_URL')
+    from aplicacao import preparar_bancos
+    preparar_bancos(current_app)
+    lembretes.criar_worker().run()
@@ -0,0 +1,275 @@
+"""Rotas do Google Calendar (registradas só com a integração ligada, ver integracao_calendar.py)"""
+import functools
+import os
+import threading
+from datetime import datetime, date
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, current_app
+
+import busca
+import calendar_import
+import calendar_sync
+import duplicados
+import outbox
+from extensoes import calendar, dados_alterados
+from integracao_calendar import SCOPES, CLIENT_SECRETS_FILE
+from models import db, Atendimento, GoogleCredentials
+
+bp = Blueprint('calendar', __name__, cli_group=None)
+
+ESPERA_VAGA_GOOGLE = 2  # segundos
+
+# Só uma leitura de alterações do Google por vez (o syncToken é um só)
+RECEBENDO_ALTERACOES = threading.Lock()
+
+def limitar_chamadas_google(view):
+    """Rotas que falam com o Google: sem vaga em ESPERA_VAGA_GOOGLE, avisa em vez de esperar"""
+    @functools.wraps(view)
+    def limitada(*args, **kwargs):
+        if not calendar.chamadas_google.acquire(timeout=ESPERA_VAGA_GOOGLE):
+            flash('O Google Calendar está ocupado com outras requisições. Tente novamente em instantes.', 'warning')
+            return redirect(url_for('calendar.calendar_status'))
+        try:
+            return view(*args, **kwargs)
+        finally:
+            calendar.chamadas_google.release()
+    return limitada
+
+# Google Calendar Routes
+@bp.route('/auth_google')
+def auth_google():
+    from google_auth_oauthlib.flow import Flow
+
+    if not os.path.exists(CLIENT_SECRETS_FILE):
+        flash('Arquivo de credenciais do Google não encontrado. Configure o Google Calendar API primeiro.', 'error')
+        return redirect(url_for('calendar.calendar_status'))
+    
+    flow = Flow.from_client_secrets_file(
+        CLIENT_SECRETS_FILE,
+        scopes=SCOPES,
+        redirect_uri=url_for('calendar.oauth2callback', _external=True)
+    )
+    
+    authorization_url, state = flow.authorization_url(
+        access_type='offline',
+        include_granted_scopes='true'
+    )
+    
+    session['state'] = state
+    return redirect(authorization_url)
+
+# Sem limitar_chamadas_google: recusada aqui, a autorização (código de uso
+# único) se perderia e o usuário teria de refazer o consentimento no Google
+@bp.route('/oauth2callback')
+def oauth2callback():
+    from google_auth_oauthlib.flow import Flow
+
+    state = session.get('state')
+    
+    flow = Flow.from_client_secrets_file(
+        CLIENT_SECRETS_FILE,
+        scopes=SCOPES,
+        state=state,
+        redirect_uri=url_for('calendar.oauth2callback', _external=True)
+    )
+    
+    flow.fetch_token(authorization_response=request.url)
+    
+    credentials = flow.credentials
+    
+    # Salvar credenciais no banco
+    cred_record = GoogleCredentials.query.first()
+    if cred_record:
+        cred_record.credentials = credentials.to_json()
+    else:
+        cred_record = GoogleCredentials(
+            user_id='default_user',
+            credentials=credentials.to_json()
+        )
+        db.session.add(cred_record)
+    
+    db.session.commit()
+    calendar.invalidar()
+    
+    flash('Google Calendar conectado com sucesso!', 'success')
+    return redirect(url_for('calendar.calendar_status'))
+
+@bp.route('/disconnect_calendar')
+def disconnect_calendar():
+    cred_record = GoogleCredentials.query.first()
+    if cred_record:
+        db.session.delete(cred_record)
+        db.session.commit()
+        calendar.invalidar()
+        flash('Google Calendar desconectado!', 'success')
+    
+    return redirect(url_for('calendar.calendar_status'))
+
+@bp.route('/calendar_status')
+def calendar_status():
+    calendar_connected = db.session.query(GoogleCredentials.id).first() is not None
+    
+    user_email = ''
+    total_eventos = 0
+    eventos_hoje = 0
+    fila = None
+    
+    if calendar_connected:
+        # Nada aqui fala com o Google: a conta vem do cache (atualizado em segundo plano)
+        user_email = calendar.estatisticas.conta() or 'Usuário conectado'
+        total_eventos, eventos_hoje = calendar.estatisticas.contadores()
+        fila = outbox.resumo_fila()
+    
+    return render_template('calendar_status.html', 
+                         calendar_connected=calendar_connected, 
+                         user_email=user_email, 
+                         total_eventos=total_eventos, 
+                         eventos_hoje=eventos_hoje,
+                         fila=fila)
+
+def receber_alteracoes(service):
+    """Traz do Google Calendar as mudanças feitas nos eventos dos atendimentos.
+
+    Usa o syncToken salvo em GoogleCredentials: só os eventos alterados desde a
+    última execução são transferidos. Retorna (movidos, cancelados), ou None
+    se a conta foi desconectada (o serviço em cache ainda pode existir).
+    """
+    cred_record = GoogleCredentials.query.first()
+    if cred_record is None:
+        return None
+    totais = {'movidos': 0, 'cancelados': 0}
+    
+    def ao_receber_pagina(eventos):
+        ids = [e['id'] for e in eventos]
+        if not ids:
+            return
+        atendimentos = Atendimento.query.filter(Atendimento.evento_calendar_id.in_(ids)).all()
+        movidos, cancelados = calendar_sync.reconciliar_eventos(
+            eventos, {a.evento_calendar_id: a for a in atendimentos})
+        totais['movidos'] += movidos
+        totais['cancelados'] += cancelados
+        db.session.commit()
+    
+    try:
+        sync_token = calendar_sync.listar_alteracoes(service, cred_record.sync_token, ao_receber_pagina)
+    except calendar_sync.SyncTokenExpirado:
+        sync_token = calendar_sync.listar_alteracoes(service, None, ao_receber_pagina)
+    
+    cred_record.sync_token = sync_token
+    db.session.commit()
+    return totais['movidos'], totais['cancelados']
+
+def enfileirar_pendentes():
+    """Coloca na fila os atendimentos sem evento; o envio fica com o worker. Retorna a quantidade"""
+    enfileirados = outbox.enfileirar_pendentes()
+    db.session.commit()
+    if enfileirados:
+        calendar.notificar_worker()
+    return enfileirados
+
+@bp.route('/sync_calendar')
+def sync_calendar():
+    """Sincroniza atendimentos pendentes com o Google Calendar (pela fila, sem esperar o Google)"""
+    if not calendar.obter_servico():
+        flash('Google Calendar não conectado!', 'error')
+        return redirect(url_for('calendar.calendar_status'))
+    
+    try:
+        enfileirados = enfileirar_pendentes()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Erro ao enfileirar atendimentos para o Google Calendar')
+        flash('Erro ao sincronizar com o Google Calendar. Tente novamente.', 'error')
+        return redirect(url_for('calendar.calendar_status'))
+    
+    if enfileirados:
+        flash(f'{enfileirados} atendimento(s) serão enviados ao Google Calendar em instantes.', 'success')
+    else:
+        flash('Nenhum atendimento pendente para sincronizar.', 'info')
+    return redirect(url_for('calendar.calendar_status'))
+
+@bp.route('/sync_bidirectional')
+@limitar_chamadas_google
+def sync_bidirectional():
+    """Envia os atendimentos pendentes (pela fila) e traz as mudanças feitas no Google Calendar"""
+    service = calendar.obter_servico()
+    if not service:
+        flash('Google Calendar não conectado!', 'error')
+        return redirect(url_for('calendar.calendar_status'))
+    
+    if not RECEBENDO_ALTERACOES.acquire(blocking=False):
+        flash('Já existe uma sincronização em andamento.', 'info')
+        return redirect(url_for('atendimentos.agenda'))
+    
+    try:
+        enfileirados = enfileirar_pendentes()
+        alteracoes = receber_alteracoes(service)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Erro ao sincronizar com o Google Calendar')
+        flash('Erro ao sincronizar com o Google Calendar. Tente novamente.', 'error')
+        return redirect(url_for('atendimentos.agenda'))
+    finally:
+        RECEBENDO_ALTERACOES.release()
+        dados_alterados()
+    
+    if alteracoes is None:
+        flash('Google Calendar não conectado!', 'error')
+        return redirect(url_for('calendar.calendar_status'))
+    movidos, cancelados = alteracoes
+    if enfileirados:
+        flash(f'{enfileirados} atendimento(s) serão enviados ao Google Calendar em instantes.', 'success')
+    if movidos or cancelados:
+        flash(f'Google Calendar: {movidos} atendimento(s) remarcado(s) e {cancelados} cancelado(s).', 'info')
+    elif not enfileirados:
+        flash('Agenda já sincronizada com o Google Calendar.', 'info')
+    
+    return redirect(url_for('atendimentos.agenda'))
+
+@bp.route('/import_calendar')
+@limitar_chamadas_google
+def import_calendar():
+    """Importa os eventos do Google Calendar como pacientes e atendimentos"""
+    service = calendar.obter_servico()
+    if not service:
+        flash('Google Calendar não conectado!', 'error')
+        return redirect(url_for('calendar.calendar_status'))
+    
+    try:
+        desde = date.fromisoformat(request.args.get('desde', ''))
+    except ValueError:
+        desde = None
+    
+    def indexar_paciente_importado(paciente_id, dados):
+        if busca.fts_ativa(db.session):
+            busca.indexar(db.session, paciente_id, dados['nome'], dados['telefone'], dados['email'])
+        duplicados.indexar(db.session, paciente_id, dados['nome'], dados['telefone'], dados['email'])
+    
+    importador = calendar_import.ImportadorCalendar(service, ao_criar_paciente=indexar_paciente_importado)
+    try:
+        totais = importador.importar(desde=datetime.combine(desde, datetime.min.time()) if desde else None)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Erro ao importar do Google Calendar')
+        flash('Erro ao importar do Google Calendar. Os lotes já gravados foram mantidos; '
+              'importe novamente para continuar.', 'error')
+        return redirect(url_for('atendimentos.agenda'))
+    finally:
+        dados_alterados()
+    
+    flash(f"Importação concluída: {totais['atendimentos']} atendimento(s) e "
+          f"{totais['pacientes']} paciente(s) novos de {totais['eventos']} evento(s).", 'success')
+    return redirect(url_for('atendimentos.agenda'))
+
+@bp.route('/api/sync_calendar/progresso')
+def progresso_sync_calendar():
+    """Situação da fila do Google Calendar (pendentes e que falharam)"""
+    return jsonify(outbox.resumo_fila())
+
+@bp.cli.command('worker-calendar')
+def worker_calendar_command():
+    """Processa a fila do Google Calendar neste processo (sem a thread do servidor)"""
+    # dados_alterados() troca a versão do cache, vista também pelo processo web
+    worker = outbox.WorkerCalendar(current_app._get_current_object(), calendar.obter_servico,
+                                   ao_processar=dados_alterados)
+    worker.run()
@@ -0,0 +1,73 @@
+"""Comandos das clínicas: cadastro e resumo de todas (registrados só com CLINICAS_ARQUIVO, ver clinicas.py).
+
+Não há rotas: a clínica de cada requisição vem do proxy, e o resumo de
+todas as clínicas fica só na linha de comando, fora do alcance do navegador.
+"""
+import os
+import time
+from datetime import date
+
+import click
+from flask import Blueprint
+
+import lembretes as fila_lembretes
+import outbox
+import relatorios
+from extensoes import clinicas
+from models import db, Paciente, GoogleCredentials
+
+bp = Blueprint('clinicas', __name__, cli_group=None)
+
+
+def resumo_da_clinica():
+    """Totais do banco da clínica atual (roda dentro de clinicas.usar)"""
+    inicio = relatorios.inicio_do_mes(date.today())
+    mes = relatorios.sessoes_por_mes(inicio, relatorios.mes_seguinte(inicio))
+    fila = outbox.resumo_fila()
+    banco = db.session.get_bind().url.database
+    return {
+        'pacientes': db.session.query(db.func.count(Paciente.id)).scalar(),
+        'sessoes_mes': mes[0]['sessoes'] if mes else 0,
+        'faltas_mes': mes[0]['faltas'] if mes else 0,
+        'fila_calendar': fila['pendentes'],
+        'falhas_calendar': fila['falharam'],
+        'lembretes_pendentes': fila_lembretes.resumo().get(fila_lembretes.STATUS_PENDENTE, 0),
+        'calendar_conectado': db.session.query(GoogleCredentials.id).first() is not None,
+        'tamanho_mb': os.path.getsize(banco) / 2 ** 20 if banco and os.path.exists(banco) else None,
+    }
+
+
+@bp.cli.command('criar-clinica')
+@click.argument('slug')
+@click.argument('nome')
+@click.option('--banco', help='URI do banco (padrão: CLINICAS_PASTA/<slug>.db)')
+def criar_clinica_command(slug, nome, banco):
+    """Cadastra uma clínica no CLINICAS_ARQUIVO e cria o banco dela"""
+    from aplicacao import preparar_banco
+
+    try:
+        clinica = clinicas.adicionar(slug, nome, banco)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    with clinicas.usar(slug):
+        preparar_banco()
+    click.echo(f"Clínica {slug} ({clinica['nome']}) criada em {clinica['banco']}")
+
+
+@bp.cli.command('resumo-clinicas')
+def resumo_clinicas_command():
+    """Totais de todas as clínicas, consultadas em paralelo"""
+    inicio = time.perf_counter()
+    resumos = clinicas.para_cada(resumo_da_clinica)
+    click.echo(f"{'clínica':20s} {'pacientes':>10s} {'sessões/mês':>12s} {'faltas/mês':>11s} "
+               f"{'fila Calendar':>14s} {'falhas':>7s} {'Calendar':>9s} {'lembretes':>10s} {'MB':>8s}")
+    for slug, resumo in resumos.items():
+        if isinstance(resumo, Exception):
+            click.echo(f'{slug:20s} erro: {resumo}')
+            continue
+        conectado = 'sim' if resumo['calendar_conectado'] else 'não'
+        tamanho = f"{resumo['tamanho_mb']:.1f}" if resumo['tamanho_mb'] is not None else '-'
+        click.echo(f"{slug:20s} {resumo['pacientes']:10d} {resumo['sessoes_mes']:12d} {resumo['faltas_mes']:11d} "
+                   f"{resumo['fila_calendar']:14d} {resumo['falhas_calendar']:7d} {conectado:>9s} "
+                   f"{resumo['lembretes_pendentes']:10d} {tamanho:>8s}")
+    click.echo(f'{len(resumos)} clínicas em {(time.perf_counter() - inicio) * 1000:.0f}ms')
@@ -0,0 +1,358 @@
+"""Rotas de pacientes: lista, cadastro, busca, histórico, importação e exportação"""
+from datetime import datetime, date
+import io
+
+import click
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app, Response, stream_with_context
+
+import busca
+import cache_respostas
+import duplicados
+import importacao
+import outbox
+from extensoes import cache, dados_alterados
+from models import db, Paciente, Atendimento, CalendarJob, PacienteResumo, PacienteTratamento
+from paginacao import paginar
+
+bp = Blueprint('pacientes', __name__, cli_group=None)
+
+# Máximo de resultados exibidos na página de busca
+LIMITE_BUSCA = 100
+
+# Paginação da lista de pacientes
+PACIENTES_POR_PAGINA = 30
+MAXIMO_POR_PAGINA = 100
+
+# Atendimentos por página no histórico do paciente
+ATENDIMENTOS_POR_PAGINA = 20
+
+# Codificações oferecidas no formulário de importação
+CODIFICACOES_IMPORTACAO = ('utf-8-sig', 'latin-1')
+
+def buscar_pacientes(query, limite):
+    """Busca pacientes por nome, telefone ou email, ordenados por relevância"""
+    if busca.fts_ativa(db.session):
+        ids = busca.buscar_ids(db.session, query, limite=limite)
+        if not ids:
+            return []
+        por_id = {p.id: p for p in Paciente.query.filter(Paciente.id.in_(ids)).all()}
+        return [por_id[i] for i in ids if i in por_id]
+
+    # Sem FTS5 no SQLite: busca sequencial com LIKE
+    return Paciente.query.filter(
+        db.or_(
+            Paciente.nome.contains(query),
+            Paciente.telefone.contains(query),
+            Paciente.email.contains(query)
+        )
+    ).limit(limite).all()
+
+# Ordenações da lista de pacientes: colunas do cursor e se é decrescente.
+# Todas usam um índice (ix_paciente_nome_id ou a chave primária).
+ORDENS_PACIENTES = {
+    'nome': ((Paciente.nome, Paciente.id), False),
+    'recentes': ((Paciente.id,), True),
+    'antigos': ((Paciente.id,), False),
+}
+
+def pagina_de_pacientes():
+    """Lê ordem, cursor e limite da query string e retorna a página de pacientes"""
+    ordem = request.args.get('ordem', 'nome')
+    if ordem not in ORDENS_PACIENTES:
+        ordem = 'nome'
+    limite = request.args.get('limite', PACIENTES_POR_PAGINA, type=int)
+    limite = max(1, min(limite, MAXIMO_POR_PAGINA))
+    colunas, descendente = ORDENS_PACIENTES[ordem]
+
+    try:
+        pacientes, proximo_cursor = paginar(
+            Paciente.query, colunas,
+            cursor=request.args.get('cursor'),
+            limite=limite,
+            descendente=descendente
+        )
+    except ValueError:
+        abort(400)
+    return pacientes, proximo_cursor, ordem, limite
+
+@bp.route('/')
+@cache.em_cache()
+def index():
+    pacientes, proximo_cursor, ordem, limite = pagina_de_pacientes()
+    return render_template('index.html',
+                         pacientes=pacientes,
+                         proximo_cursor=proximo_cursor,
+                         ordem=ordem,
+                         limite=limite,
+                         primeira_pagina=not request.args.get('cursor'))
+
+@bp.route('/api/pacientes/lista')
+@cache.em_cache()
+def api_lista_pacientes():
+    pacientes, proximo_cursor, ordem, limite = pagina_de_pacientes()
+    return jsonify({
+        'pacientes': [{
+            'id': p.id,
+            'nome': p.nome,
+            'telefone': p.telefone,
+            'email': p.email or '',
+            'data_cadastro': p.data_cadastro.isoformat() if p.data_cadastro else None
+        } for p in pacientes],
+        'proximo_cursor': proximo_cursor,
+        'ordem': ordem,
+        'limite': limite
+    })
+
+@bp.route('/novo_paciente', methods=['GET', 'POST'])
+def novo_paciente():
+    if request.method == 'POST':
+        nome = request.form['nome']
+        telefone = request.form['telefone']
+        email = request.form.get('email', '')
+        endereco = request.form.get('endereco', '')
+        observacoes_medicas = request.form.get('observacoes_medicas', '')
+        
+        # Possíveis cadastros repetidos: mostra antes de gravar
+        if 'confirmar_cadastro' not in request.form:
+            candidatos = duplicados.candidatos(nome, telefone, email)
+            if candidatos:
+                return render_template('novo_paciente.html', dados=request.form, candidatos=candidatos)
+        
+        # Criar novo paciente
+        paciente = Paciente(
+            nome=nome,
+            telefone=telefone,
+            email=email if email else None,
+            endereco=endereco if endereco else None,
+            observacoes_medicas=observacoes_medicas if observacoes_medicas else None
+        )
+        
+        try:
+            db.session.add(paciente)
+            db.session.flush()  # Para obter o ID do paciente
+            if busca.fts_ativa(db.session):
+                busca.indexar_paciente(db.session, paciente)
+            duplicados.indexar_paciente(db.session, paciente)
+            db.session.commit()
+            dados_alterados()
+            flash(f'Paciente {nome} cadastrado com sucesso!', 'success')
+            return redirect(url_for('pacientes.index'))
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Erro ao cadastrar paciente')
+            flash('Erro ao cadastrar paciente. Tente novamente.', 'error')
+            
+    return render_template('novo_paciente.html', dados=request.form)
+
+def resumo_do_paciente(paciente_id):
+    """Totais do cabeçalho do paciente, sem percorrer o histórico.
+
+    Os contadores vêm das tabelas mantidas por trigger; última e próxima
+    visita são uma busca cada no índice (paciente_id, data_atendimento).
+    """
+    resumo = db.session.get(PacienteResumo, paciente_id)
+    tratamentos = PacienteTratamento.query.filter_by(paciente_id=paciente_id).order_by(
+        PacienteTratamento.total.desc(), PacienteTratamento.tratamento
+    ).all()
+    
+    agora = datetime.now()
+    visitas = db.session.query(Atendimento.data_atendimento).filter(
+        Atendimento.paciente_id == paciente_id,
+        Atendimento.status != 'cancelado'
+    )
+    ultima = visitas.filter(Atendimento.data_atendimento < agora).order_by(
+        Atendimento.data_atendimento.desc()).limit(1).scalar()
+    proxima = visitas.filter(Atendimento.data_atendimento >= agora).order_by(
+        Atendimento.data_atendimento).limit(1).scalar()
+    
+    return {
+        'total': resumo.total_atendimentos if resumo else 0,
+        'tratamentos': tratamentos,
+        'ultima_visita': ultima,
+        'proxima_visita': proxima,
+    }
+
+@bp.route('/paciente/<int:id>')
+@cache.em_cache()
+def visualizar_paciente(id):
+    paciente = Paciente.query.options(db.undefer_group('notas')).get_or_404(id)
+    
+    # Histórico paginado, do mais recente ao mais antigo (índice paciente_id, data_atendimento)
+    try:
+        atendimentos, proximo_cursor = paginar(
+            Atendimento.query.options(db.undefer_group('notas')).filter_by(paciente_id=id),
+            (Atendimento.data_atendimento, Atendimento.id),
+            cursor=request.args.get('cursor'),
+            limite=ATENDIMENTOS_POR_PAGINA,
+            descendente=True
+        )
+    except ValueError:
+        abort(400)
+    
+    # Situação na fila do Google Calendar dos atendimentos ainda sem evento
+    sem_evento = [a.id for a in atendimentos if not a.evento_calendar_id]
+    status_calendar = {}
+    if sem_evento:
+        status_calendar = dict(db.session.query(CalendarJob.atendimento_id, CalendarJob.status).filter(
+            CalendarJob.atendimento_id.in_(sem_evento),
+            CalendarJob.status != outbox.STATUS_CONCLUIDO
+        ).all())
+    
+    resumo = resumo_do_paciente(id)
+    # Na hora da próxima visita ela passa a ser a última (e o atendimento, "não registrado")
+    cache_respostas.valido_ate(resumo['proxima_visita'])
+    return render_template('paciente.html', paciente=paciente, atendimentos=atendimentos,
+                         status_calendar=status_calendar, proximo_cursor=proximo_cursor,
+                         primeira_pagina=not request.args.get('cursor'),
+                         resumo=resumo, agora=datetime.now())
+
+@bp.route('/buscar', methods=['GET', 'POST'])
+def buscar_paciente():
+    pacientes = []
+    if request.method == 'GET' and request.args.get('q'):
+        query = request.args.get('q')
+        pacientes = buscar_pacientes(query, limite=LIMITE_BUSCA)
+    
+    return render_template('buscar_paciente.html', pacientes=pacientes)
+
+@bp.route('/editar/<int:id>', methods=['GET', 'POST'])
+def editar_paciente(id):
+    paciente = Paciente.query.get_or_404(id)
+    
+    if request.method == 'POST':
+        paciente.nome = request.form['nome']
+        paciente.telefone = request.form['telefone']
+        paciente.email = request.form.get('email', '') or None
+        paciente.endereco = request.form.get('endereco', '') or None
+        paciente.observacoes_medicas = request.form.get('observacoes_medicas', '') or None
+        
+        try:
+            if busca.fts_ativa(db.session):
+                busca.indexar_paciente(db.session, paciente)
+            duplicados.indexar_paciente(db.session, paciente)
+            db.session.commit()
+            dados_alterados()
+            flash(f'Dados de {paciente.nome} atualizados com sucesso!', 'success')
+            return redirect(url_for('pacientes.visualizar_paciente', id=id))
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Erro ao atualizar paciente %s', id)
+            flash('Erro ao atualizar dados. Tente novamente.', 'error')
+    
+    return render_template('editar_paciente.html', paciente=paciente)
+
+@bp.route('/api/pacientes')
+@cache.em_cache()
+def api_pacientes():
+    query = request.args.get('q', '')
+    if len(query) >= 2:
+        pacientes = buscar_pacientes(query, limite=10)
+        
+        return jsonify([{
+            'id': p.id,
+            'nome': p.nome,
+            'telefone': p.telefone,
+            'email': p.email or ''
+        } for p in pacientes])
+    
+    return jsonify([])
+
+def importar_arquivo_pacientes(arquivo, formato):
+    """Importa um arquivo de texto já aberto; retorna o importador (totais e erros)"""
+    importador = importacao.ImportadorPacientes(db.session, indexar_busca=busca.fts_ativa(db.session))
+    try:
+        importador.importar(importacao.ler_arquivo(arquivo, formato))
+    finally:
+        dados_alterados()
+    return importador
+
+def gerar_exportacao(formato, com_atendimentos):
+    linhas = importacao.linhas_exportacao(com_atendimentos)
+    if formato == 'jsonl':
+        return importacao.gerar_jsonl(linhas)
+    colunas = importacao.COLUNAS_EXPORTACAO if com_atendimentos else ('id',) + importacao.COLUNAS_PACIENTE
+    return importacao.gerar_csv(linhas, colunas)
+
+@bp.route('/importar_pacientes', methods=['GET', 'POST'])
+def importar_pacientes():
+    """Upload de planilha (CSV) ou JSONL de pacientes"""
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo para importar.', 'error')
+            return redirect(url_for('pacientes.importar_pacientes'))
+        
+        codificacao = request.form.get('encoding') or 'utf-8-sig'
+        if codificacao not in CODIFICACOES_IMPORTACAO:
+            flash('Codificação inválida.', 'error')
+            return redirect(url_for('pacientes.importar_pacientes'))
+
+        texto = io.TextIOWrapper(arquivo.stream, encoding=codificacao, newline='')
+        try:
+            importador = importar_arquivo_pacientes(texto, importacao.detectar_formato(arquivo.filename))
+        except UnicodeDecodeError:
+            db.session.rollback()
+            flash('Não foi possível ler o arquivo. Tente a codificação Latin-1 (Excel antigo). '
+                  'As linhas anteriores ao erro já foram importadas.', 'error')
+            return redirect(url_for('pacientes.importar_pacientes'))
+        
+        return render_template('importar_pacientes.html', totais=importador.totais, erros=importador.erros)
+    
+    return render_template('importar_pacientes.html')
+
+@bp.route('/exportar_pacientes')
+def exportar_pacientes():
+    """Exporta pacientes em CSV ou JSONL, gerados aos poucos durante o download"""
+    formato = 'jsonl' if request.args.get('formato') == 'jsonl' else 'csv'
+    com_atendimentos = request.args.get('atendimentos') == '1'
+    nome = f"pacientes{'_atendimentos' if com_atendimentos else ''}_{date.today():%Y%m%d}.{formato}"
+    return Response(
+        stream_with_context(gerar_exportacao(formato, com_atendimentos)),
+        mimetype='application/x-ndjson' if formato == 'jsonl' else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={nome}'}
+    )
+
+@bp.cli.command('importar-pacientes')
+@click.argument('caminho', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='padrão: pela extensão do arquivo')
+@click.option('--encoding', default='utf-8-sig', show_default=True)
+def importar_pacientes_command(caminho, formato, encoding):
+    """Importa pacientes (e atendimentos) de um CSV ou JSONL"""
+    from aplicacao import preparar_banco
+    preparar_banco()
+    with open(caminho, encoding=encoding, newline='') as arquivo:
+        importador = importar_arquivo_pacientes(arquivo, formato or importacao.detectar_formato(caminho))
+    for numero, mensagem in importador.erros:
+        click.echo(f'linha {numero}: {mensagem}', err=True)
+    totais = importador.totais
+    click.echo(f"{totais['linhas']} linhas: {totais['pacientes_novos']} pacientes novos, "
+               f"{totais['pacientes_existentes']} já cadastrados, {totais['atendimentos']} atendimentos, "
+               f"{totais['erros']} erros")
+
+@bp.cli.command('mesclar-duplicados')
+@click.option('--aplicar', is_flag=True, help='sem esta opção, só lista os grupos encontrados')
+def mesclar_duplicados_command(aplicar):
+    """Junta pacientes cadastrados mais de uma vez (mesmo telefone ou email e nome parecido)"""
+    from aplicacao import preparar_banco
+    preparar_banco()
+    grupos = duplicados.encontrar_grupos(db.session)
+    for grupo in grupos:
+        pacientes = {p.id: p for p in Paciente.query.filter(Paciente.id.in_(grupo))}
+        click.echo(' + '.join(f'{i} {pacientes[i].nome} ({pacientes[i].telefone})' for i in grupo))
+        if aplicar:
+            duplicados.mesclar(db.session, grupo[0], grupo[1:], indexar_busca=busca.fts_ativa(db.session))
+            db.session.commit()
+    if aplicar and grupos:
+        dados_alterados()
+    acao = 'mesclados' if aplicar else 'encontrados (use --aplicar para mesclar)'
+    click.echo(f'{len(grupos)} grupos, {sum(len(g) - 1 for g in grupos)} cadastros repetidos {acao}')
+
+@bp.cli.command('exportar-pacientes')
+@click.argument('caminho', type=click.Path(dir_okay=False, writable=True))
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='padrão: pela extensão do arquivo')
+@click.option('--atendimentos', is_flag=True, help='uma linha por atendimento')
+def exportar_pacientes_command(caminho, formato, atendimentos):
+    """Exporta pacientes (e atendimentos) para CSV ou JSONL"""
+    with open(caminho, 'w', encoding='utf-8', newline='') as saida:
+        for bloco in gerar_exportacao(formato or importacao.detectar_formato(caminho), atendimentos):
+            saida.write(bloco)
@@ -0,0 +1,61 @@
+"""Rotas de relatórios mensais (sessões, faltas e pacientes novos), ver relatorios.py"""
+from datetime import date
+
+from flask import Blueprint, render_template, request, Response
+
+import importacao
+import relatorios
+from extensoes import cache
+
+bp = Blueprint('relatorios', __name__)
+
+# Meses exibidos por padrão e o máximo aceito na query string
+MESES_RELATORIO = 12
+MAXIMO_MESES = 60
+
+def periodo_do_relatorio():
+    """Lê ?ate=AAAA-MM&meses=N; retorna (inicio, fim, meses) com fim exclusivo"""
+    try:
+        ultimo = date.fromisoformat(request.args.get('ate', '') + '-01')
+    except ValueError:
+        ultimo = date.today()
+    meses = max(1, min(request.args.get('meses', MESES_RELATORIO, type=int), MAXIMO_MESES))
+    fim = relatorios.mes_seguinte(relatorios.inicio_do_mes(ultimo))
+    inicio = fim
+    for _ in range(meses):
+        inicio = relatorios.inicio_do_mes(date.fromordinal(inicio.toordinal() - 1))
+    return inicio, fim, meses
+
+@bp.route('/relatorios')
+@cache.em_cache()
+def relatorios_mensais():
+    inicio, fim, meses = periodo_do_relatorio()
+    por = request.args.get('por')
+    if por not in relatorios.DIMENSOES:
+        por = None
+    return render_template('relatorios.html',
+                         gerais=relatorios.sessoes_por_mes(inicio, fim),
+                         detalhados=relatorios.sessoes_por_mes(inicio, fim, por) if por else [],
+                         pacientes_novos=dict(relatorios.pacientes_novos_por_mes(inicio, fim)),
+                         por=por,
+                         meses=meses,
+                         ate=date.fromordinal(fim.toordinal() - 1).strftime('%Y-%m'))
+
+@bp.route('/relatorios/exportar')
+def exportar_relatorio():
+    """CSV do relatório mensal (?por=profissional|tratamento) ou dos totais diários (?diario=1)"""
+    inicio, fim, meses = periodo_do_relatorio()
+    if request.args.get('diario') == '1':
+        colunas = relatorios.colunas_diarias(inicio, fim)
+        linhas = (dict(zip(relatorios.COLUNAS_DIARIAS, valores)) for valores in zip(*colunas.values()))
+        nomes = relatorios.COLUNAS_DIARIAS
+    else:
+        por = request.args.get('por')
+        linhas = relatorios.sessoes_por_mes(inicio, fim, por if por in relatorios.DIMENSOES else None)
+        nomes = relatorios.COLUNAS_MENSAIS
+    nome = f'relatorio_{inicio:%Y%m}_{fim:%Y%m}.csv'
+    return Response(
+        importacao.gerar_csv(linhas, nomes),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={nome}'}
+    )
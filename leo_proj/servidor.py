@@ -0,0 +1,47 @@
+"""Servidor de produção do app (no lugar de app.run(debug=True)).
+
+    python servidor.py                        # waitress, um processo com várias threads
+    gunicorn -c gunicorn.conf.py app2:app     # vários processos (Linux)
+
+Configuração por variáveis de ambiente:
+
+    HOST, PORT              endereço (padrão 0.0.0.0:8000)
+    SERVIDOR_THREADS        threads por processo (padrão 8)
+    GOOGLE_SIMULTANEOS      quantas dessas threads podem esperar o Google ao
+                            mesmo tempo (padrão 2); as demais ficam sempre
+                            livres para as rotas que só usam o banco
+    CALENDAR_WORKER=0       não roda a fila do Calendar no processo web; use
+                            `flask --app app2 worker-calendar` em separado
+    LEMBRETES_WORKER=0      idem para os lembretes (`flask --app app2 worker-lembretes`)
+    GOOGLE_CALENDAR=0       sobe sem a integração com o Google Calendar
+    CLINICAS_ARQUIVO        várias clínicas, um banco SQLite para cada (ver clinicas.py)
+
+As demais opções estão em aplicacao.py.
+
+A criação de eventos no Google não passa pelas requisições (vai para a
+fila do outbox), então só /sync_bidirectional, /import_calendar e
+/oauth2callback esperam o Google, e no máximo GOOGLE_SIMULTANEOS por vez.
+"""
+import logging
+import os
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 8000))
+THREADS = int(os.environ.get('SERVIDOR_THREADS', 8))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    try:
+        from waitress import serve
+    except ImportError:
+        raise SystemExit('O waitress não está instalado: pip install waitress '
+                         '(ou use gunicorn -c gunicorn.conf.py app2:app)')
+
+    from app2 import app
+    logging.getLogger(__name__).info('Servindo em http://%s:%d com %d threads', HOST, PORT, THREADS)
+    serve(app, host=HOST, port=PORT, threads=THREADS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Fixtures dos testes: o app num banco temporário e o Google Calendar falso.
+
+    cd leo_proj && python -m pytest -q tests
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Os módulos do app ficam soltos em leo_proj, como quando ele roda
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google_calendar  # noqa: E402
+from aplicacao import create_app, preparar_bancos  # noqa: E402
+from benchmarks.fake_calendar import iniciar_servidor  # noqa: E402
+from models import db, Paciente, Atendimento  # noqa: E402
+
+
+@pytest.fixture
+def servidor_calendar():
+    """(calendário falso, url) de um servidor local que imita a API do Google Calendar"""
+    servidor, calendario, url = iniciar_servidor()
+    yield calendario, url
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def calendario(servidor_calendar):
+    return servidor_calendar[0]
+
+
+@pytest.fixture
+def servico(servidor_calendar):
+    """Serviço do Calendar apontado para o servidor falso (sem credenciais)"""
+    return google_calendar.construir_servico(url_base=servidor_calendar[1])
+
+
+@pytest.fixture
+def app(tmp_path, servidor_calendar):
+    """App num banco novo, com o contexto aberto durante o teste"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'teste.db'}",
+        'CACHE_VERSAO_ARQUIVO': str(tmp_path / 'cache_versao'),
+        'GOOGLE_CALENDAR': True,
+        'GOOGLE_CALENDAR_API_URL': servidor_calendar[1],
+        'CALENDAR_WORKER': False,
+        'LEMBRETES_WORKER': False,
+    })
+    preparar_bancos(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def criar_atendimentos(app):
+    """criar_atendimentos(n): n atendimentos futuros de um paciente novo, um por hora"""
+    def criar(quantidade, nome='Maria Teste'):
+        paciente = Paciente(nome=nome, telefone='11987654321')
+        db.session.add(paciente)
+        db.session.flush()
+        inicio = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        atendimentos = [
+            Atendimento(paciente_id=paciente.id, data_atendimento=inicio + timedelta(hours=i),
+                        profissional='Leo', tratamento='RPG')
+            for i in range(quantidade)
+        ]
+        db.session.add_all(atendimentos)
+        db.session.commit()
+        return atendimentos
+    return criar
@@ -0,0 +1,73 @@
+"""Envio em lote (batch) dos eventos ao Google Calendar, contra o servidor falso"""
+import json
+
+import calendar_sync
+import outbox
+from models import db, Atendimento
+
+
+def recusar_atendimentos(*ids, status=500):
+    """CalendarioFalso.falhar que recusa a criação dos eventos desses atendimentos"""
+    recusados = {str(i) for i in ids}
+
+    def falhar(metodo, caminho, corpo):
+        if metodo != 'POST' or not corpo:
+            return None
+        evento = json.loads(corpo)
+        if evento.get('extendedProperties', {}).get('private', {}).get('atendimento_id') in recusados:
+            return status
+        return None
+    return falhar
+
+
+def test_lote_cria_todos_os_eventos_em_uma_requisicao(calendario, servico, criar_atendimentos):
+    atendimentos = criar_atendimentos(3)
+
+    event_ids, erros = calendar_sync.enviar_lote(servico, atendimentos)
+
+    assert erros == {}
+    assert set(event_ids) == {a.id for a in atendimentos}
+    assert set(event_ids.values()) == set(calendario.eventos['primary'])
+    assert calendario.requisicoes_batch == 1
+
+
+def test_lote_com_falhas_parciais(calendario, servico, criar_atendimentos):
+    atendimentos = criar_atendimentos(4)
+    recusado = atendimentos[1]
+    calendario.falhar = recusar_atendimentos(recusado.id)
+
+    event_ids, erros = calendar_sync.enviar_lote(servico, atendimentos)
+
+    assert set(event_ids) == {a.id for a in atendimentos} - {recusado.id}
+    assert set(erros) == {recusado.id}
+    assert erros[recusado.id].resp.status == 500
+    assert len(calendario.eventos['primary']) == 3
+
+
+def test_falha_parcial_grava_os_eventos_criados(calendario, servico, criar_atendimentos):
+    atendimentos = criar_atendimentos(3)
+    recusado = atendimentos[2]
+    calendario.falhar = recusar_atendimentos(recusado.id, status=400)
+    outbox.enfileirar_ids([a.id for a in atendimentos])
+    db.session.commit()
+
+    assert outbox.processar_lote(servico) == 3
+
+    db.session.expire_all()
+    enviados = Atendimento.query.filter(Atendimento.evento_calendar_id.isnot(None)).all()
+    assert {a.id for a in enviados} == {a.id for a in atendimentos} - {recusado.id}
+    assert outbox.resumo_fila() == {'em_andamento': True, 'pendentes': 1, 'falharam': 0}
+
+
+def test_fila_maior_que_um_lote(app, calendario, servico, criar_atendimentos):
+    atendimentos = criar_atendimentos(calendar_sync.TAMANHO_LOTE + 10)
+    outbox.enfileirar_ids([a.id for a in atendimentos])
+    db.session.commit()
+
+    worker = outbox.WorkerCalendar(app, lambda: servico)
+    assert worker.executar_uma_vez() == len(atendimentos)
+
+    assert calendario.requisicoes_batch == 2
+    assert len(calendario.eventos['primary']) == len(atendimentos)
+    db.session.expire_all()
+    assert Atendimento.query.filter(Atendimento.evento_calendar_id.is_(None)).count() == 0
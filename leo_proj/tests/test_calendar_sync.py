@@ -0,0 +1,112 @@
+"""Recebimento das alterações do Google Calendar pelo syncToken, contra o servidor falso"""
+from datetime import timedelta
+
+import pytest
+
+import calendar_sync
+import outbox
+from extensoes import calendar
+from google_calendar import FUSO_HORARIO
+from models import db, Atendimento, GoogleCredentials
+from rotas_calendar import receber_alteracoes
+
+
+@pytest.fixture
+def sincronizados(servico, criar_atendimentos):
+    """Atendimentos já enviados ao Google e a conta conectada, ainda sem syncToken"""
+    atendimentos = criar_atendimentos(3)
+    outbox.enfileirar_ids([a.id for a in atendimentos])
+    db.session.add(GoogleCredentials(user_id='default_user', credentials='{}'))
+    db.session.commit()
+    outbox.processar_lote(servico)
+    return atendimentos
+
+
+def mover(calendario, atendimento, inicio, minutos):
+    calendario.alterar('primary', atendimento.evento_calendar_id, {
+        'start': {'dateTime': inicio.isoformat(), 'timeZone': FUSO_HORARIO},
+        'end': {'dateTime': (inicio + timedelta(minutes=minutos)).isoformat(), 'timeZone': FUSO_HORARIO},
+    })
+
+
+def sync_token():
+    return GoogleCredentials.query.first().sync_token
+
+
+def test_primeira_execucao_guarda_o_sync_token(calendario, servico, sincronizados):
+    assert receber_alteracoes(servico) == (0, 0)
+    assert sync_token() == str(calendario.versao)
+
+
+def test_so_os_eventos_alterados_sao_transferidos(calendario, servico, sincronizados):
+    receber_alteracoes(servico)
+    movido = sincronizados[0]
+    mover(calendario, movido, movido.data_atendimento + timedelta(hours=3), 60)
+
+    recebidos = []
+    calendar_sync.listar_alteracoes(servico, sync_token(), recebidos.extend)
+
+    assert [e['id'] for e in recebidos] == [movido.evento_calendar_id]
+
+
+def test_evento_movido_atualiza_o_atendimento(calendario, servico, sincronizados):
+    receber_alteracoes(servico)
+    movido = sincronizados[1]
+    novo_inicio = movido.data_atendimento + timedelta(days=1, hours=2)
+    mover(calendario, movido, novo_inicio, 90)
+
+    assert receber_alteracoes(servico) == (1, 0)
+
+    db.session.refresh(movido)
+    assert movido.data_atendimento == novo_inicio
+    assert movido.duracao_minutos == 90
+    assert sync_token() == str(calendario.versao)
+
+
+def test_evento_cancelado_cancela_o_atendimento(calendario, servico, sincronizados):
+    receber_alteracoes(servico)
+    cancelado = sincronizados[2]
+    calendario.alterar('primary', cancelado.evento_calendar_id, {'status': 'cancelled'})
+
+    assert receber_alteracoes(servico) == (0, 1)
+
+    db.session.refresh(cancelado)
+    assert cancelado.status == 'cancelado'
+    # Receber de novo não conta o mesmo cancelamento outra vez
+    assert receber_alteracoes(servico) == (0, 0)
+
+
+def test_sync_token_expirado_recomeca_do_zero(calendario, servico, sincronizados):
+    receber_alteracoes(servico)
+    movido = sincronizados[0]
+    novo_inicio = movido.data_atendimento + timedelta(hours=5)
+    mover(calendario, movido, novo_inicio, 60)
+    GoogleCredentials.query.first().sync_token = 'expirado'  # o falso responde 410
+    db.session.commit()
+
+    assert receber_alteracoes(servico) == (1, 0)
+
+    db.session.refresh(movido)
+    assert movido.data_atendimento == novo_inicio
+    assert sync_token() == str(calendario.versao)
+
+
+def test_alteracoes_em_varias_paginas(calendario, servico, sincronizados, monkeypatch):
+    receber_alteracoes(servico)
+    for i, atendimento in enumerate(sincronizados):
+        mover(calendario, atendimento, atendimento.data_atendimento + timedelta(days=7), 30 + i)
+    monkeypatch.setattr(calendar_sync, 'EVENTOS_POR_PAGINA', 2)
+
+    assert receber_alteracoes(servico) == (3, 0)
+    assert sync_token() == str(calendario.versao)
+    assert Atendimento.query.filter(Atendimento.duracao_minutos < 60).count() == 3
+
+
+def test_sync_bidirectional_sem_conta_conectada(app, servico, monkeypatch):
+    # O serviço em cache pode sobreviver à desconexão da conta
+    monkeypatch.setattr(calendar, 'obter_servico', lambda: servico)
+
+    resposta = app.test_client().get('/sync_bidirectional')
+
+    assert resposta.status_code == 302
+    assert resposta.headers['Location'].endswith('/calendar_status')
@@ -0,0 +1,110 @@
+"""Fila (outbox) do Google Calendar: novas tentativas com espera exponencial"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import outbox
+from models import db, Atendimento, CalendarJob
+
+
+def recusar_tudo(metodo, caminho, corpo):
+    return 503
+
+
+def vencer(job):
+    """Antecipa a próxima tentativa do job, como se a espera tivesse passado"""
+    job.proxima_tentativa = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+@pytest.fixture
+def job(criar_atendimentos):
+    atendimento = criar_atendimentos(1)[0]
+    job = outbox.enfileirar(atendimento)
+    db.session.commit()
+    return job
+
+
+@pytest.mark.parametrize('tentativas, minimo, maximo', [
+    (1, 4, 6),
+    (2, 8, 12),
+    (4, 32, 48),
+    (20, outbox.ESPERA_MAXIMA * 0.8, outbox.ESPERA_MAXIMA * 1.2),
+])
+def test_espera_exponencial_com_teto(tentativas, minimo, maximo):
+    for _ in range(50):
+        assert minimo <= outbox.calcular_espera(tentativas).total_seconds() <= maximo
+
+
+def test_agendar_nao_fala_com_o_google(app, calendario, criar_atendimentos):
+    atendimento = criar_atendimentos(1)[0]
+    data = (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%dT%H:%M')
+
+    resposta = app.test_client().post(f'/novo_atendimento/{atendimento.paciente_id}', data={
+        'data_atendimento': data, 'profissional': 'Leo', 'tratamento': 'RPG', 'agendar_google': 'on',
+    })
+
+    assert resposta.status_code == 302
+    assert calendario.requisicoes == 0
+    assert CalendarJob.query.filter_by(status=outbox.STATUS_PENDENTE).count() == 1
+
+
+def test_falha_reagenda_com_espera(calendario, servico, job):
+    calendario.falhar = recusar_tudo
+    antes = datetime.utcnow()
+
+    assert outbox.processar_lote(servico) == 1
+
+    db.session.refresh(job)
+    assert job.status == outbox.STATUS_PENDENTE
+    assert job.tentativas == 1
+    assert '503' in job.ultimo_erro
+    espera = (job.proxima_tentativa - antes).total_seconds()
+    assert outbox.ESPERA_BASE * 0.8 <= espera <= outbox.ESPERA_BASE * 1.2 + 1
+
+    # Antes da espera acabar o job não é reservado de novo
+    assert outbox.processar_lote(servico) == 0
+    assert calendario.requisicoes_batch == 1
+
+
+def test_nova_tentativa_depois_da_espera(calendario, servico, job):
+    calendario.falhar = recusar_tudo
+    outbox.processar_lote(servico)
+    calendario.falhar = None
+    vencer(job)
+
+    assert outbox.processar_lote(servico) == 1
+
+    db.session.refresh(job)
+    assert job.status == outbox.STATUS_CONCLUIDO
+    assert job.ultimo_erro is None
+    assert db.session.get(Atendimento, job.atendimento_id).evento_calendar_id in calendario.eventos['primary']
+
+
+def test_desiste_depois_do_maximo_de_tentativas(calendario, servico, job):
+    calendario.falhar = recusar_tudo
+    esperas = []
+    for tentativa in range(1, outbox.MAXIMO_TENTATIVAS + 1):
+        inicio = datetime.utcnow()
+        assert outbox.processar_lote(servico) == 1
+        db.session.refresh(job)
+        assert job.tentativas == tentativa
+        if job.status == outbox.STATUS_PENDENTE:
+            esperas.append((job.proxima_tentativa - inicio).total_seconds())
+            vencer(job)
+
+    assert job.status == outbox.STATUS_FALHOU
+    assert esperas == sorted(esperas)
+    assert outbox.processar_lote(servico) == 0
+    assert outbox.resumo_fila() == {'em_andamento': False, 'pendentes': 0, 'falharam': 1}
+
+
+def test_reserva_vencida_volta_para_a_fila(servico, job):
+    # Worker que morreu depois de reservar: o job fica "processando" até a reserva vencer
+    assert [j.id for j in outbox.reservar_jobs(10)] == [job.id]
+    assert outbox.processar_lote(servico) == 0
+
+    vencer(job)
+    assert outbox.processar_lote(servico) == 1
+    db.session.refresh(job)
+    assert job.status == outbox.STATUS_CONCLUIDO